@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import random
+import zipfile
+
+
+def _random_bytes(rng, size):
+    return rng.getrandbits(8 * size).to_bytes(size, "little") if size else b""
+
+
+def _pak_bytes(rng, size):
+    # Half random, half repetitive, so archives compress like real paks do
+    half = size // 2
+    return _random_bytes(rng, half) + bytes(size - half)
+
+
+def _write_zip(path, files):
+    with zipfile.ZipFile(path, "w") as zip_ref:
+        for index, (name, data) in enumerate(files):
+            # Mix stored and deflated entries, mod.io uploads contain both
+            compress_type = zipfile.ZIP_STORED if index % 2 else zipfile.ZIP_DEFLATED
+            zip_ref.writestr(name, data, compress_type=compress_type)
+
+
+def _md5(path):
+    hash_md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            hash_md5.update(chunk)
+    return hash_md5.hexdigest()
+
+
+def generate_fixtures(root, mods, paks_per_mod, pak_size, seed=0):
+    """
+    Generate everything a benchmark run needs below `root`.
+
+    - `server/files`: one zip per subscription with `paks_per_mod` .pak files,
+      every fourth mod also has a nested .sav file
+    - `server/pack`: a mod pack with rmd.pack, two collections, _manual and
+      _overrides trees
+    - `game`: a fake game folder with the files the overrides replace
+    - `work`: the folder the downloader runs in, with its mods folder
+
+    Parameters
+    ----------
+    root : str
+        An empty folder to generate the fixtures in.
+    mods : int
+        The number of subscribed mods.
+    paks_per_mod : int
+        The number of .pak files in each subscription zip.
+    pak_size : int
+        The size of each .pak file in bytes.
+    seed : int
+        The seed of the generated content, runs with the same seed are
+        identical.
+
+    Returns
+    -------
+    dict
+        The generated `subscriptions` (without URLs), the `paths` used and
+        the `bytes` generated.
+    """
+    rng = random.Random(seed)
+    paths = {
+        name: os.path.join(root, *parts)
+        for name, parts in {
+            "files": ("server", "files"),
+            "pack": ("server", "pack"),
+            "game": ("game",),
+            "saves": ("saves",),
+            "work": ("work",),
+        }.items()
+    }
+    for path in paths.values():
+        os.makedirs(path, exist_ok=True)
+    total = 0
+
+    subscriptions = []
+    for mod in range(mods):
+        files = [
+            (f"Paks/bench_{mod}_{pak}.pak", _pak_bytes(rng, pak_size))
+            for pak in range(paks_per_mod)
+        ]
+        if mod % 4 == 0:
+            files.append(
+                (f"SaveGames/Nested/bench_{mod}.sav", _random_bytes(rng, 4096))
+            )
+        filename = f"bench_mod_{mod}.zip"
+        zip_path = os.path.join(paths["files"], filename)
+        _write_zip(zip_path, files)
+        total += os.path.getsize(zip_path)
+        subscriptions.append(
+            {
+                "id": mod + 1,
+                "name_id": f"bench-mod-{mod}",
+                "modfile": {
+                    "filename": filename,
+                    "filehash": {"md5": _md5(zip_path)},
+                },
+            }
+        )
+
+    pack_mods = os.path.join(paths["pack"], "mods")
+    collections = {}
+    for collection in ("Bench Maps", "Bench Weapons"):
+        folder = os.path.join(pack_mods, "_collections", collection)
+        os.makedirs(folder, exist_ok=True)
+        names = []
+        for index in range(max(1, mods // 4)):
+            name = f"{collection.split()[1].lower()}_{index}.pak"
+            with open(os.path.join(folder, name), "wb") as f:
+                f.write(_pak_bytes(rng, pak_size))
+            total += pak_size
+            names.append(name)
+        collections[collection] = {"enabled": True, "mods": names}
+
+    manual = os.path.join(pack_mods, "_manual", "Nested Folder")
+    os.makedirs(manual, exist_ok=True)
+    for index in range(max(1, mods // 4)):
+        with open(os.path.join(manual, f"manual {index}.pak"), "wb") as f:
+            f.write(_pak_bytes(rng, pak_size))
+        total += pak_size
+
+    overrides = os.path.join(pack_mods, "_overrides", "ReadyOrNot", "Content")
+    os.makedirs(overrides, exist_ok=True)
+    game_content = os.path.join(paths["game"], "ReadyOrNot", "Content")
+    os.makedirs(os.path.join(game_content, "Paks", "~mods"), exist_ok=True)
+    for index in range(3):
+        name = f"override_{index}.bin"
+        with open(os.path.join(overrides, name), "wb") as f:
+            f.write(_random_bytes(rng, 8192))
+        with open(os.path.join(game_content, name), "wb") as f:
+            f.write(_random_bytes(rng, 8192))
+
+    with open(os.path.join(paths["pack"], "rmd.pack"), "w") as f:
+        json.dump({"version": "1.0.0", "collections": collections}, f)
+
+    return {"subscriptions": subscriptions, "paths": paths, "bytes": total}
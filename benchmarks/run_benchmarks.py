@@ -0,0 +1,339 @@
+"""
+Time syncing and installing mods end to end against local stand-ins for
+mod.io and a mod pack host, at several scales.
+
+Every scale runs in its own process and temporary folder, so caches never
+carry over between scales:
+
+    python benchmarks/run_benchmarks.py --scales 10x4,50x4,200x8 --output results.json
+    python benchmarks/run_benchmarks.py --output new.json --compare results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fixtures import generate_fixtures  # noqa: E402
+from benchmarks.servers import start_servers  # noqa: E402
+
+STAGES = ("cold_sync", "warm_sync", "install", "reinstall", "uninstall")
+PACK_FOLDERS = ("_collections", "_manual", "_overrides")
+
+
+def _sync(pack_url, workers):
+    """
+    Sync subscriptions and the mod pack the way download_mods.py does.
+    """
+    from helpers.config import flush_config, read_config
+    from helpers.downloader import download_all
+    from helpers.hashing import get_md5
+    from helpers.modio import sync_subscriptions, update_subscriptions_config
+    from helpers.modpack import sync_folder
+    from helpers.store import add_to_store
+    from helpers.transfer import download_file
+
+    config = read_config()
+    subscriptions = sync_subscriptions(config)
+    config = update_subscriptions_config(subscriptions)
+
+    def is_current(info):
+        path = os.path.join("mods", info["file"])
+        return os.path.exists(path) and get_md5(path) == info["md5"]
+
+    def fetch(mod_id, position):
+        info = config["subscribed_mods"][mod_id]
+        path = os.path.join("mods", info["file"])
+        download_file(
+            info["download"],
+            path,
+            position=position,
+            leave=False,
+            expected_md5=info["md5"],
+        )
+        add_to_store(path, info["md5"])
+
+    pending = [
+        mod_id
+        for mod_id, info in config["subscribed_mods"].items()
+        if not is_current(info)
+    ]
+    results = download_all(pending, fetch, workers=workers)
+    failed = [mod_id for mod_id, result in results.items() if not result["ok"]]
+
+    for folder in PACK_FOLDERS:
+        result = sync_folder(
+            f"{pack_url}/mods/{folder}/",
+            os.path.join("mods", folder),
+            workers=workers,
+        )
+        failed += result["failed"]
+    flush_config()
+
+    if failed:
+        raise RuntimeError(f"{len(failed)} download(s) failed: {failed[:5]}")
+
+
+def _mods_dest_path(paths):
+    return os.path.join(paths["game"], "ReadyOrNot", "Content", "Paks", "~mods")
+
+
+def _install(paths, extract_workers):
+    """
+    Plan and apply an install of the mods, enabled collections and overrides
+    the way download_mods.py does.
+    """
+    from helpers.config import read_config
+    from helpers.install import gather_mods, plan_mods
+    from helpers.planner import apply_plan
+
+    operations = plan_mods(
+        gather_mods("mods"),
+        read_config()["collections"],
+        "mods",
+        paths["game"],
+        _mods_dest_path(paths),
+        paths["saves"],
+    )
+    return apply_plan(operations, workers=extract_workers)
+
+
+def _uninstall(paths):
+    """
+    Uninstall the mods and restore the overridden game files the way
+    download_mods.py does.
+    """
+    from helpers.install import uninstall_mods
+
+    uninstall_mods(_mods_dest_path(paths), "mods", paths["game"])
+
+
+def run_scale(
+    mods,
+    paks_per_mod,
+    pak_size,
+    workers,
+    extract_workers,
+    keep=False,
+    api_rate_limit=None,
+):
+    """
+    Generate fixtures for one scale and time every stage against them.
+
+    Has to run in a fresh process, the helpers keep per-process state such as
+    the cache connection and the in-memory config.
+
+    Returns
+    -------
+    dict
+        The scale, the time of each stage in seconds and the HTTP and copy
+        counters.
+    """
+    root = tempfile.mkdtemp(prefix="ron-bench-")
+    fixtures = generate_fixtures(root, mods, paks_per_mod, pak_size)
+    server, base_url = start_servers(fixtures, api_rate_limit=api_rate_limit)
+    paths = fixtures["paths"]
+
+    os.chdir(paths["work"])
+    os.makedirs("mods", exist_ok=True)
+    with open(os.path.join(paths["pack"], "rmd.pack")) as f:
+        collections = json.load(f)["collections"]
+    with open("config.json", "w") as f:
+        json.dump({"mod_pack_url": f"{base_url}/pack", "collections": collections}, f)
+    with open(".auth", "w") as f:
+        f.write("benchmark-token")
+
+    from helpers import modio
+    from helpers.fastcopy import get_copy_stats
+    from helpers.http_client import get_http_stats
+    from helpers.store import configure_store
+
+    modio.MODIO_API_URL = f"{base_url}/v1"
+    configure_store("mods")
+
+    stages = {
+        "cold_sync": lambda: _sync(f"{base_url}/pack", workers),
+        "warm_sync": lambda: _sync(f"{base_url}/pack", workers),
+        "install": lambda: _install(paths, extract_workers),
+        "reinstall": lambda: _install(paths, extract_workers),
+        "uninstall": lambda: _uninstall(paths),
+    }
+    timings = {}
+    operations = {}
+    try:
+        for stage in STAGES:
+            start = time.perf_counter()
+            result = stages[stage]()
+            timings[stage] = round(time.perf_counter() - start, 4)
+            if result:
+                operations[stage] = result
+    finally:
+        server.shutdown()
+        os.chdir(REPO_ROOT)
+        if not keep:
+            shutil.rmtree(root, ignore_errors=True)
+
+    return {
+        "mods": mods,
+        "paks_per_mod": paks_per_mod,
+        "pak_size": pak_size,
+        "fixture_bytes": fixtures["bytes"],
+        "timings": timings,
+        "operations": operations,
+        "http": get_http_stats(),
+        "copy_methods": get_copy_stats(),
+        "rate_limited": server.rate_limited,
+    }
+
+
+def _parse_scales(text):
+    scales = []
+    for scale in text.split(","):
+        mods, _, paks = scale.strip().partition("x")
+        scales.append((int(mods), int(paks or 1)))
+    return scales
+
+
+def compare(previous, current):
+    """
+    Print how each stage changed between two result files.
+    """
+    old = {(r["mods"], r["paks_per_mod"]): r for r in previous["results"]}
+    for result in current["results"]:
+        key = (result["mods"], result["paks_per_mod"])
+        print(f"{key[0]} mods x {key[1]} paks:")
+        for stage, seconds in result["timings"].items():
+            before = old.get(key, {}).get("timings", {}).get(stage)
+            if before:
+                change = (seconds - before) / before * 100
+                print(
+                    f"  {stage:<10} {before:8.3f}s -> {seconds:8.3f}s "
+                    f"({change:+.1f}%)"
+                )
+            else:
+                print(f"  {stage:<10} {seconds:8.3f}s (new)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RoN Mods Downloader benchmarks")
+    parser.add_argument(
+        "--scales",
+        default="10x4,50x4,200x8",
+        help="Comma separated MODSxPAKS scales (default: 10x4,50x4,200x8)",
+    )
+    parser.add_argument(
+        "--pak-size", type=int, default=256 * 1024, help="Size of each .pak in bytes"
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Download workers")
+    parser.add_argument(
+        "--extract-workers",
+        type=int,
+        default=min(8, os.cpu_count() or 1),
+        help="Extract workers",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="Run each scale this many times and keep the fastest time per stage",
+    )
+    parser.add_argument(
+        "--api-rate-limit",
+        type=int,
+        help="Rate limit the mod.io stand-in to this many requests per minute",
+    )
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="A previous results file to compare with")
+    parser.add_argument("--keep", action="store_true", help="Keep the fixtures")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        mods, paks = _parse_scales(args.scales)[0]
+        result = run_scale(
+            mods,
+            paks,
+            args.pak_size,
+            args.workers,
+            args.extract_workers,
+            keep=args.keep,
+            api_rate_limit=args.api_rate_limit,
+        )
+        with open(args.child, "w") as f:
+            json.dump(result, f)
+        return
+
+    results = []
+    for mods, paks in _parse_scales(args.scales):
+        runs = []
+        for _ in range(max(1, args.repeat)):
+            with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+                result_path = f.name
+            command = [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--child",
+                result_path,
+                "--scales",
+                f"{mods}x{paks}",
+                "--pak-size",
+                str(args.pak_size),
+                "--workers",
+                str(args.workers),
+                "--extract-workers",
+                str(args.extract_workers),
+            ]
+            if args.keep:
+                command.append("--keep")
+            if args.api_rate_limit:
+                command += ["--api-rate-limit", str(args.api_rate_limit)]
+            subprocess.run(
+                command,
+                check=True,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            with open(result_path) as f:
+                runs.append(json.load(f))
+            os.remove(result_path)
+
+        result = runs[0]
+        result["timings"] = {
+            stage: min(run["timings"][stage] for run in runs) for stage in STAGES
+        }
+        results.append(result)
+        timings = ", ".join(f"{k} {v:.3f}s" for k, v in result["timings"].items())
+        print(f"{mods} mods x {paks} paks: {timings}")
+
+    output = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "settings": {
+            "pak_size": args.pak_size,
+            "workers": args.workers,
+            "extract_workers": args.extract_workers,
+            "repeat": args.repeat,
+            "api_rate_limit": args.api_rate_limit,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+import email.utils
+import hashlib
+import html
+import json
+import math
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """
+    Serves a small part of the mod.io API, binary downloads and an NGINX
+    style mod pack listing from the generated fixtures.
+
+    - `/v1/me/subscribed`, `/v1/me/events` and `/v1/games/<id>/mods/events`
+      with `_limit`/`_offset` paging, filters and ETags, and
+      subscribing/unsubscribing
+    - `/v1/games/<id>/mods/<id>` for every mod in the server's `mods`
+    - optional mod.io style rate limiting of `/v1/`, with X-RateLimit
+      headers and 429 responses
+    - `/files/<name>` with Range, If-Range and conditional GET support, like
+      mod.io's binary_url, optionally dropping the connection part way through
+    - `/pack/...` as static files and directory listings
+    """
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, without this every keep-alive
+    # response waits for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass  # Keep the benchmark output readable
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_cacheable(self, body, content_type, headers=None):
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        headers = {**(headers or {}), "ETag": etag}
+        if self.headers.get("If-None-Match") == etag:
+            self._send(304, headers=headers)
+        else:
+            self._send(200, body, {**headers, "Content-Type": content_type})
+
+    def _rate_limit(self):
+        """
+        Count an API request against mod.io style per-window rate limiting.
+
+        Returns
+        -------
+        tuple
+            Whether the request is allowed and the X-RateLimit headers.
+        """
+        server = self.server
+        if not server.api_rate_limit:
+            return True, {}
+        with server.rate_lock:
+            now = time.monotonic()
+            if now - server.window_start >= server.api_rate_window:
+                server.window_start = now
+                server.window_requests = 0
+            server.window_requests += 1
+            allowed = server.window_requests <= server.api_rate_limit
+            if not allowed:
+                server.rate_limited += 1
+            reset = server.window_start + server.api_rate_window - now
+        headers = {
+            "X-RateLimit-Limit": str(server.api_rate_limit),
+            "X-RateLimit-Remaining": str(
+                max(0, server.api_rate_limit - server.window_requests)
+            ),
+        }
+        if not allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(reset)))
+        return allowed, headers
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        if path.startswith("/v1/"):
+            self._api(path[len("/v1") :], parse_qs(url.query))
+        elif path.startswith("/files/"):
+            self._file(os.path.join(self.server.files_path, path[len("/files/") :]))
+        elif path.startswith("/pack/"):
+            self._pack(path[len("/pack/") :])
+        else:
+            self._send(404)
+
+    def do_POST(self):
+        self._write_api()
+
+    def do_DELETE(self):
+        self._write_api()
+
+    def _write_api(self):
+        # Subscribing and unsubscribing always succeed, nothing is stored
+        allowed, headers = self._rate_limit()
+        if not allowed:
+            self._send(429, b'{"error": {"code": 429}}', headers)
+        elif urlsplit(self.path).path.endswith("/subscribe"):
+            self._send(201 if self.command == "POST" else 204, b"", headers)
+        else:
+            self._send(404)
+
+    def _api(self, path, query):
+        with self.server.rate_lock:
+            self.server.api_requests.append((path, query))
+        allowed, headers = self._rate_limit()
+        if not allowed:
+            self._send(429, b'{"error": {"code": 429}}', headers)
+            return
+
+        if path == "/me/subscribed":
+            results = self.server.subscriptions
+        elif path == "/me/events":
+            results = self._filter_events(self.server.user_events, query)
+        elif path.endswith("/mods/events"):
+            results = self._filter_events(self.server.mod_events, query)
+        elif path.startswith("/games/") and path.rsplit("/", 1)[-1].isdigit():
+            mod = self.server.mods.get(int(path.rsplit("/", 1)[-1]))
+            if mod is None:
+                self._send(404, b'{"error": {"code": 404}}', headers)
+            else:
+                self._send_cacheable(
+                    json.dumps(mod).encode(), "application/json", headers
+                )
+            return
+        else:
+            self._send(404)
+            return
+
+        # Like mod.io, pages never hold more than 100 results
+        limit = min(100, int(query.get("_limit", ["100"])[0]))
+        offset = int(query.get("_offset", ["0"])[0])
+        page = results[offset : offset + limit]
+        body = json.dumps(
+            {
+                "data": page,
+                "result_count": len(page),
+                "result_offset": offset,
+                "result_limit": limit,
+                "result_total": len(results),
+            }
+        ).encode()
+        self._send_cacheable(body, "application/json", headers)
+
+    @staticmethod
+    def _filter_events(events, query):
+        # The subset of mod.io's filtering the client uses
+        mod_ids = query.get("mod_id-in", [""])[0]
+        event_types = query.get("event_type-in", [""])[0]
+        since = int(query.get("date_added-min", ["0"])[0])
+        return [
+            event
+            for event in events
+            if (not mod_ids or str(event["mod_id"]) in mod_ids.split(","))
+            and (not event_types or event["event_type"] in event_types.split(","))
+            and event["date_added"] >= since
+        ]
+
+    def _file(self, file_path):
+        if ".." in file_path.split(os.sep) or not os.path.isfile(file_path):
+            self._send(404)
+            return
+
+        with open(file_path, "rb") as f:
+            data = f.read()
+        headers = {
+            "Content-Type": "application/octet-stream",
+            "Accept-Ranges": "bytes",
+            "ETag": '"' + hashlib.md5(data).hexdigest() + '"',
+            "Last-Modified": email.utils.formatdate(
+                os.path.getmtime(file_path), usegmt=True
+            ),
+        }
+        range_header = self.headers.get("Range", "")
+        if_range = self.headers.get("If-Range")
+        with self.server.rate_lock:
+            self.server.file_requests.append((range_header, if_range))
+        # Like NGINX, answer a matching validator with 304 Not Modified
+        if self.headers.get("If-None-Match") == headers["ETag"] or (
+            "If-None-Match" not in self.headers
+            and self.headers.get("If-Modified-Since") == headers["Last-Modified"]
+        ):
+            self._send(304, headers={"ETag": headers["ETag"]})
+            return
+        # A range of a different version of the file is useless, send it all
+        if if_range and if_range not in (headers["ETag"], headers["Last-Modified"]):
+            range_header = ""
+
+        if range_header.startswith("bytes="):
+            start = int(range_header[len("bytes=") :].split("-")[0] or 0)
+            if start >= len(data):
+                self._send(416, headers={"Content-Range": f"bytes */{len(data)}"})
+                return
+            headers["Content-Range"] = f"bytes {start}-{len(data) - 1}/{len(data)}"
+            status, body = 206, data[start:]
+        else:
+            status, body = 200, data
+
+        drop_after = self.server.drop_after
+        if drop_after is None or len(body) <= drop_after:
+            self._send(status, body, headers)
+            return
+        # Promise the whole body, then hang up part way through it
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body[:drop_after])
+        self.wfile.flush()
+        self.close_connection = True
+
+    def _pack(self, relative_path):
+        local_path = os.path.join(self.server.pack_path, *relative_path.split("/"))
+        if ".." in relative_path.split("/"):
+            self._send(404)
+        elif os.path.isdir(local_path):
+            self._send_cacheable(self._listing(local_path), "text/html")
+        else:
+            self._file(local_path)
+
+    def _listing(self, folder):
+        rows = ['<tr><td class="link"><a href="../">Parent directory/</a></td></tr>']
+        for entry in sorted(os.scandir(folder), key=lambda e: e.name):
+            href = quote(entry.name) + ("/" if entry.is_dir() else "")
+            size = "-" if entry.is_dir() else str(entry.stat().st_size)
+            date = email.utils.formatdate(entry.stat().st_mtime, usegmt=True)
+            rows.append(
+                f'<tr><td class="link"><a href="{href}">{html.escape(entry.name)}</a>'
+                f'</td><td class="size">{size}</td><td class="date">{date}</td></tr>'
+            )
+        return (
+            "<html><body><table><tbody>" + "".join(rows) + "</tbody></table>"
+            "</body></html>"
+        ).encode()
+
+
+def start_servers(fixtures, api_rate_limit=None, api_rate_window=60, drop_after=None):
+    """
+    Start the local stand-ins for mod.io and the mod pack host.
+
+    Parameters
+    ----------
+    fixtures : dict
+        The fixtures returned by `generate_fixtures`.
+    api_rate_limit : int, optional
+        Answer API requests beyond this many per window with HTTP 429.
+    api_rate_window : float
+        The length of the rate limit window in seconds.
+    drop_after : int, optional
+        Close the connection after sending this many bytes of a file, to test
+        resuming. Can be changed later through the server's `drop_after`.
+
+    Returns
+    -------
+    tuple
+        The running server and its base URL. Subscriptions served from
+        `/v1/me/subscribed` get a binary_url on this server. The server's
+        `subscriptions`, `mods`, `user_events` and `mod_events` can be
+        changed to act out what happened on mod.io.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInHandler)
+    server.daemon_threads = True
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    server.api_rate_limit = api_rate_limit
+    server.api_rate_window = api_rate_window
+    server.rate_lock = threading.Lock()
+    server.window_start = time.monotonic()
+    server.window_requests = 0
+    server.rate_limited = 0
+    # (path, query) of every API GET, for checking what a client asked for
+    server.api_requests = []
+    # (Range, If-Range) of every file request
+    server.file_requests = []
+    server.drop_after = drop_after
+    server.files_path = fixtures["paths"]["files"]
+    server.pack_path = fixtures["paths"]["pack"]
+    server.subscriptions = [
+        {
+            **subscription,
+            "modfile": {
+                **subscription["modfile"],
+                "download": {
+                    "binary_url": f"{base_url}/files/"
+                    + quote(subscription["modfile"]["filename"])
+                },
+            },
+        }
+        for subscription in fixtures["subscriptions"]
+    ]
+    server.mods = {mod["id"]: mod for mod in server.subscriptions}
+    server.user_events = []
+    server.mod_events = []
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, base_url
@@ -1,30 +1,76 @@
 import argparse
-import curses
-import hashlib
 import os
 import shutil
 import sys
-import zipfile
-import zlib
+
+from helpers.startup import enable_import_timing, phase, print_startup_profile
+
+# Has to happen before the imports below so they show up in the profile
+if "--startup-profile" in sys.argv:
+    enable_import_timing()
 
 import requests
-from packaging.version import parse as parse_version
-from tqdm import tqdm
 
+from helpers.archive_index import (
+    get_archive_entries,
+    prune_archive_index,
+)
+from helpers.bandwidth import (
+    PRIORITY_OPTIONAL,
+    PRIORITY_REQUIRED,
+    configure_bandwidth,
+    download_order,
+    parse_rate,
+)
 from helpers.config import (
     create_config,
+    flush_config,
     get_oauth_token,
     read_config,
     save_config,
 )
+from helpers.downloader import download_all, get_worker_count
+from helpers.extract import (
+    DEFAULT_EXTRACT_WORKERS,
+    INCOMPLETE_SUFFIXES,
+    get_extract_destination,
+    install_targets,
+    is_plan_installed,
+    plan_install,
+)
+from helpers.fastcopy import get_copy_stats
 from helpers.github import auto_update
+from helpers.hashing import get_md5, prune_hash_cache
+from helpers.http_cache import cached_get
+from helpers.http_client import configure_http, get_session
+from helpers.install import (
+    add_enabled_collections,
+    gather_mods,
+    plan_mods,
+    uninstall_mods,
+)
+from helpers.ledger import (
+    forget_install,
+    get_installed_files,
+    is_unchanged,
+    prune_ledger,
+)
 from helpers.modio import (
     get_subscriptions,
     subscribe_to_mod,
+    sync_subscriptions,
     update_subscriptions_config,
     unsubscribe_from_mod,
 )
-from helpers.modpack import download_folder, list_folder
+from helpers.planner import (
+    ADD,
+    DELETE,
+    REPLACE,
+    SKIP,
+    apply_plan,
+    plan_operations,
+    print_plan,
+)
 from helpers.print_colored import (
     CYAN,
     GREEN,
@@ -34,194 +80,106 @@ from helpers.print_colored import (
     print_colored,
     print_colored_bold,
 )
+from helpers.store import (
+    add_to_store,
+    configure_store,
+    prune_store,
+    restore_from_store,
+)
 from helpers.steam import get_game_install_path
+from helpers.trace import enable_tracing, span
 
 REPO = "SavageCore/RoNModsDownloader"
 CURRENT_VERSION = "0.7.2"
 APP_PATH = os.path.dirname(os.path.abspath(sys.executable))
 
-print("\033[H\033[J")
-print_colored_bold(f"\nRoN Mods Downloader ({CURRENT_VERSION})", GREEN)
-print("-" * 40)
-
-parser = argparse.ArgumentParser(description="RoN Mods Downloader")
-parser.add_argument(
-    "--skip-download",
-    action="store_true",
-    help="Skip downloading mods after checking for updates",
-    default=False,
-)
-parser.add_argument(
-    "--purge",
-    action="store_true",
-    help="Skip downloading mods after checking for updates",
-    default=False,
-)
-args = parser.parse_args()
-
-skip_download = args.skip_download
+# Set up by main() and shared with the functions below
+args = None
+config = None
+extract_workers = None
+game_path = None
+mods_dest_path = None
+mods_down_path = None
+savegames_dest_path = None
+subscriptions = None
 
-# If --purge is passed as an argument, remove all mods
-if args.purge:
-    print_colored("Purging mods...", CYAN)
-    # Remove mods/
-    if os.path.exists("mods"):
-        shutil.rmtree("mods")
 
-        # Recreate mods/ directory
-        os.makedirs("mods", exist_ok=True)
-
-
-# Normalize paths to ensure consistency
-def normalize_path(path):
-    return os.path.normpath(path).replace("\\", "/")
-
-
-def get_md5(file_path):
+def download_mod(mod_id, position=None):
     """
-    Calculate the MD5 hash of a file.
+    Download a mod from mod.io.
 
     Parameters
     ----------
-    file_path : str
-        The path to the file.
+    mod_id : int
+        The ID of the mod to download.
+    position : int, optional
+        The line to draw the progress bar on when downloading concurrently.
 
     Returns
     -------
-    str
-        The MD5 hash of the file.
-    None
-        If the file does not exist.
+    list of str
+        The contents of the downloaded archive.
     """
-    if not os.path.exists(file_path):
-        return None
-
-    with open(file_path, "rb") as f:
-        md5 = hashlib.md5()
-        while chunk := f.read(8192):
-            md5.update(chunk)
-        return md5.hexdigest()
-
+    from helpers.transfer import download_file
 
-def get_crc(file_path):
-    """
-    Calculate the CRC32 hash of a file.
+    mod_info = config["subscribed_mods"][mod_id]
+    download_url = mod_info["download"]
+    file_path = os.path.join(mods_down_path, mod_info["file"])
 
-    Parameters
-    ----------
-    file_path : str
-        The path to the file.
+    # Make directory if it doesn't exist
+    os.makedirs(mods_down_path, exist_ok=True)
 
-    Returns
-    -------
-    str
-        The CRC32 hash of the file.
-    None
-        If the file does not exist.
-    """
-    if not os.path.exists(file_path):
-        return None
+    # Download the file in chunks, showing progress
+    download_file(
+        download_url,
+        file_path,
+        desc="  " + mod_info["file"],
+        position=position,
+        leave=position is None,
+        expected_md5=mod_info["md5"],
+        size=mod_info.get("size"),
+    )
+    add_to_store(file_path, mod_info["md5"])
 
-    with open(file_path, "rb") as f:
-        crc = 0
-        while chunk := f.read(8192):
-            crc = zlib.crc32(chunk, crc)
-        return crc
+    # Get zip file contents, this also indexes the new archive
+    return [entry.filename for entry in get_archive_entries(file_path)]
 
 
-def download_mod(mod_id):
+def save_mod_contents(mod_id, contents):
     """
-    Download a mod from mod.io.
+    Record the contents of a downloaded mod in the config file.
 
     Parameters
     ----------
     mod_id : int
-        The ID of the mod to download.
+        The ID of the downloaded mod.
+    contents : list of str
+        The contents of the downloaded archive.
     """
-    if mod_id in config["subscribed_mods"]:
-        mod_info = config["subscribed_mods"][mod_id]
-        download_url = mod_info["download"]
-        file_path = os.path.join(mods_down_path, mod_info["file"])
+    config["subscribed_mods"][mod_id]["contents"] = contents
+    save_config(config)
 
-        # Make directory if it doesn't exist
-        os.makedirs(mods_down_path, exist_ok=True)
 
-        # Download the file in chunks, showing progress
-        with requests.get(download_url, stream=True) as r:
-            r.raise_for_status()
-            total_size = int(r.headers.get("content-length", 0))
-            chunk_size = 8192
-            with open(file_path, "wb") as f, tqdm(
-                desc="  " + mod_info["file"],
-                total=total_size,
-                unit="iB",
-                unit_scale=True,
-                unit_divisor=1024,
-            ) as bar:
-                for chunk in r.iter_content(chunk_size=chunk_size):
-                    size = f.write(chunk)
-                    bar.update(size)
-
-            contents = []
-
-            # Get zip file contents
-            with zipfile.ZipFile(file_path, "r") as zip_ref:
-                for entry in zip_ref.infolist():
-                    contents.append(entry.filename)
-
-            # Save contents to config
-            mod_info["contents"] = contents
-
-            # Update the config file
-            config["subscribed_mods"][mod_id] = mod_info
-            save_config(config)
+def verify_download(download):
+    """
+    Check a downloaded mod against its mod.io hash and plan its install.
+
+    Parameters
+    ----------
+    download : tuple
+        The mod file, relative to `mods_down_path`, and its expected MD5 hash.
 
+    Returns
+    -------
+    dict
+        The install plan of the mod, as returned by `plan_install`.
+    """
+    from helpers.transfer import ChecksumMismatchError
 
-def extract_mod(file_path, mods_dest_path, savegames_dest_path):
-    # Open the zip file and check if any files are not extracted
-    with zipfile.ZipFile(file_path, "r") as zip_ref:
-        entries = zip_ref.infolist()
-        for entry in entries:
-            if entry.is_dir():
-                continue  # Skip directories
-
-            # Determine destination based on file extension
-            if entry.filename.endswith(".pak"):
-                dst = os.path.join(mods_dest_path, os.path.basename(entry.filename))
-            elif entry.filename.endswith(".sav"):
-                dst = os.path.join(
-                    savegames_dest_path, os.path.basename(entry.filename)
-                )
-            else:
-                # Check if the file is nested and contains .pak or .sav files
-                parts = entry.filename.split("/")
-                if len(parts) > 1 and parts[-1].endswith(".pak"):
-                    dst = os.path.join(mods_dest_path, parts[-1])
-                elif len(parts) > 1 and parts[-1].endswith(".sav"):
-                    dst = os.path.join(savegames_dest_path, parts[-1])
-                else:
-                    continue  # Skip non-.pak and non-.sav files
-
-            # Check if the file needs to be extracted
-            if not os.path.exists(dst) or get_crc(dst) != entry.CRC:
-                with zip_ref.open(entry) as source, open(dst, "wb") as target:
-                    total_size = entry.file_size
-                    with tqdm(
-                        total=total_size,
-                        desc=f"    Extracting {entry.filename}",
-                        unit="iB",
-                        unit_scale=True,
-                        unit_divisor=1024,
-                    ) as file_bar:
-                        for chunk in iter(lambda: source.read(8192), b""):
-                            target.write(chunk)
-                            file_bar.update(len(chunk))
-            else:
-                print_colored(
-                    f"    Skipping {entry.filename} (already extracted and hash matches)",
-                    YELLOW,
-                )
-        print("")
+    mod_file, md5 = download
+    if get_md5(os.path.join(mods_down_path, mod_file)) != md5:
+        raise ChecksumMismatchError(f"{mod_file} does not match its mod.io hash")
+    return plan_install([mod_file], mods_down_path, mods_dest_path, savegames_dest_path)
 
 
 def remove_unsubscribed_mods():
@@ -245,27 +203,8 @@ def remove_unsubscribed_mods():
 
             if os.path.exists(mod_path):
                 print(f"  Removing {mod_file}")
-                # If the mod is a zip file, extract it and remove the zip file
-                if mod_file.endswith(".zip"):
-                    with zipfile.ZipFile(mod_path, "r") as zip_ref:
-                        print("    Searching for extracted files to remove...")
-                        dst = ""
-                        for entry in zip_ref.infolist():
-                            # Check if the file is a .pak or .sav file
-                            if entry.filename.endswith(".pak"):
-                                dst = os.path.join(mods_dest_path, entry.filename)
-                            elif entry.filename.endswith(".sav"):
-                                dst = os.path.join(savegames_dest_path, entry.filename)
-                            if os.path.exists(dst):
-                                print(f"      Removing {entry.filename}")
-                                if os.path.isdir(dst):
-                                    shutil.rmtree(dst)
-                                else:
-                                    os.remove(dst)
-                            # # Remove the containing folder if it is empty
-                            # folder = os.path.dirname(dst)
-                            # if not os.listdir(folder):
-                            #     os.rmdir(folder)
+                # Remove the files it installed
+                remove_installed_mod(mod_path)
 
                 # Remove the mod file
                 os.remove(mod_path)
@@ -274,53 +213,25 @@ def remove_unsubscribed_mods():
             print("")
 
 
-def get_mod_files(mods_down_path):
-    mod_files = os.listdir(mods_down_path)
-    # Remove directories from mod_files
-    mod_files = [
-        f for f in mod_files if not os.path.isdir(os.path.join(mods_down_path, f))
-    ]
-
-    return mod_files
-
-
 def display_menu():
     print_colored("Loading mods...", CYAN)
-    mod_files = get_mod_files(mods_down_path)
-    existing_mods = os.listdir(mods_dest_path)
-    mods_match_status = mods_match(mod_files, mods_dest_path)
-    # Get the number of mods to install not including WorldGen or gitkeep files
-    mods_quantity = 0
-    for mod_file in mod_files:
-        if ".gitkeep" in mod_file:
-            continue
-
-        if "rmd.pack" in mod_file:
-            continue
-
-        if "WorldGen" in mod_file:
-            continue
-
-        # If the file is a zip, count the number of .pak files inside
-        if mod_file.endswith(".zip"):
-            with zipfile.ZipFile(
-                os.path.join(mods_down_path, mod_file), "r"
-            ) as zip_ref:
-                entries = zip_ref.infolist()
-                for entry in entries:
-                    if entry.is_dir() or not entry.filename.endswith(".pak"):
-                        continue
-                    mods_quantity += 1
-        else:
-            mods_quantity += 1
-
-    mods_installed = len(existing_mods)
+    # Answered from the installed files ledger, nothing is opened or hashed
+    targets = plan_install(
+        add_enabled_collections(
+            gather_mods(mods_down_path), read_config()["collections"]
+        ),
+        mods_down_path,
+        mods_dest_path,
+        savegames_dest_path,
+        report_conflicts=False,
+    )
+    installed = bool(targets) and is_plan_installed(targets)
 
     print("\033[H\033[J")
     print("")
     print_colored_bold("Menu", WHITE)
     print("-" * 40)
-    if mods_match_status and mods_quantity == mods_installed:
+    if installed:
         print("1. Reinstall Mods")
     else:
         print("1. Install Mods")
@@ -331,6 +242,8 @@ def display_menu():
 
 
 def view_collections(collections):
+    import curses
+
     def draw_menu(stdscr, selected_row_idx, scroll_position):
         stdscr.clear()
         max_y, max_x = stdscr.getmaxyx()
@@ -416,212 +329,252 @@ def view_collections(collections):
     curses.wrapper(main)
 
 
-def gather_mods(mods_down_path):
-    mod_files = get_mod_files(mods_down_path)
+def install_mods(mod_files, mods_dest_path, mods_down_path):
+    with span("plan install", "install"):
+        operations = plan_mods(
+            mod_files,
+            read_config()["collections"],
+            mods_down_path,
+            game_path,
+            mods_dest_path,
+            savegames_dest_path,
+        )
 
-    # Add files in mods_down_path/_manual to mod_files
-    manual_path = os.path.join(mods_down_path, "_manual")
-    if os.path.exists(manual_path):
-        manual_files = []
-        for root, dirs, files in os.walk(manual_path):
-            for file in files:
-                # Construct the relative path from the manual_path
-                relative_path = os.path.relpath(
-                    os.path.join(root, file), mods_down_path
-                )
-                manual_files.append(relative_path)
+    print_colored("Installing mods...", CYAN)
+    with span("install mods", "install"):
+        counts = apply_plan(operations, workers=extract_workers)
+    print(
+        f"  {counts[ADD]} added, {counts[REPLACE]} replaced, "
+        f"{counts[DELETE]} removed, {counts[SKIP]} unchanged"
+    )
+    copy_stats = get_copy_stats()
+    if copy_stats:
+        print(
+            "  Install methods: "
+            + ", ".join(f"{name} {n}" for name, n in sorted(copy_stats.items()))
+        )
+    print("")
 
-        # Ensure mod_files has the path with subdirectory when extending
-        mod_files.extend(manual_files)
 
-    return mod_files
+def remove_installed_mod(mod_path):
+    """
+    Remove the files a local mod installed into ~mods and SaveGames.
 
+    Save games the game has written to since they were installed are kept.
 
-def install_mods(mod_files, mods_dest_path, mods_down_path):
-    config = read_config()
-    collections = config["collections"]
+    Parameters
+    ----------
+    mod_path : str
+        The path to the local .zip or .pak file.
+    """
+    installed_files = get_installed_files(mod_path)
+    if installed_files:
+        for dst in installed_files:
+            if os.path.exists(dst) and (not dst.endswith(".sav") or is_unchanged(dst)):
+                print(f"  Removing {os.path.basename(dst)}")
+                os.remove(dst)
+            forget_install(dst)
+        return
 
-    # Add any enabled collections to the mod_files list
-    for collection in collections:
-        if collections[collection]["enabled"]:
-            for mod in collections[collection]["mods"]:
-                collection_path = os.path.join("_collections", collection)
-                # Check if the mod is a zip file and add the .pak files to mod_files
-                if mod.endswith(".zip"):
-                    with zipfile.ZipFile(
-                        os.path.join(mods_down_path, collection_path, mod), "r"
-                    ) as zip_ref:
-                        entries = zip_ref.infolist()
-                        for entry in entries:
-                            if entry.is_dir() or not entry.filename.endswith(".pak"):
-                                continue
-                            mod_files.append(os.path.join(collection_path, mod))
-                else:
-                    mod_files.append(os.path.join(collection_path, mod))
+    # Not in the ledger, work out what the mod would have installed. Without
+    # the ledger there's no telling if a save game is still the mod's, so they
+    # are left alone
+    if mod_path.endswith(".zip"):
+        destinations = [
+            get_extract_destination(entry.filename, mods_dest_path, savegames_dest_path)
+            for entry in get_archive_entries(mod_path) or []
+            if not entry.is_dir() and not entry.filename.endswith(".sav")
+        ]
+    else:
+        destinations = [os.path.join(mods_dest_path, os.path.basename(mod_path))]
+
+    for dst in destinations:
+        if dst and os.path.exists(dst):
+            print(f"  Removing {os.path.basename(dst)}")
+            os.remove(dst)
+
+
+def restore_override(relative_path):
+    """
+    Put back the original game file replaced by an override.
+
+    Parameters
+    ----------
+    relative_path : str
+        The path of the override relative to the game folder.
+    """
+    dst = os.path.join(game_path, *relative_path.split("/"))
+    if os.path.exists(dst + ".ron_mods_backup"):
+        if os.path.exists(dst):
+            os.remove(dst)
+        print(f"  Restoring backup of {relative_path}")
+        shutil.move(dst + ".ron_mods_backup", dst)
+
+
+def apply_local_changes(paths):
+    """
+    Install, update or remove only what is affected by changed files in the
+    local _manual, _collections and _overrides folders.
+
+    Parameters
+    ----------
+    paths : set of str
+        The changed files and folders, as reported by `watch`.
+    """
+    collections = config["collections"]
+    mods_root = os.path.abspath(mods_down_path)
+
+    # Folders stand for everything in them, e.g. a collection that was copied in
+    files = set()
+    gone = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, folder_files in os.walk(path):
+                files.update(os.path.join(root, file) for file in folder_files)
+        elif os.path.exists(path):
+            files.add(path)
         else:
-            for mod in collections[collection]["mods"]:
-                # If the mod is a zip file, remove the .pak files from mod_files
-                if mod.endswith(".zip"):
-                    file_path = os.path.join(
-                        mods_down_path, "_collections", collection, mod
-                    )
-                    with zipfile.ZipFile(
-                        file_path,
-                        "r",
-                    ) as zip_ref:
-                        entries = zip_ref.infolist()
-                        for entry in entries:
-                            if entry.is_dir() or not entry.filename.endswith(".pak"):
-                                continue
-                            # Remove the mod from destination path
-                            mod_path = os.path.join(mods_dest_path, entry.filename)
-                            if os.path.exists(mod_path):
-                                os.remove(mod_path)
-                else:
-                    # Check if the mod is in mods_dest_path and remove it
-                    mod_path = os.path.join(mods_dest_path, mod)
-                    if os.path.exists(mod_path):
-                        os.remove(mod_path)
-
-    print_colored("Extracting mods...", CYAN)
-    for mod_file in mod_files:
-
-        # Skip .gitkeep files and also _manual\.gitkeep files
-        if ".gitkeep" in mod_file:
+            gone.add(path)
+
+    mod_files = []
+    overrides = {}
+    removable = []
+    for path in sorted(files | gone):
+        relative_path = os.path.relpath(os.path.abspath(path), mods_root)
+        parts = relative_path.split(os.sep)
+        name = parts[-1]
+        if ".gitkeep" in name or name.endswith(INCOMPLETE_SUFFIXES):
             continue
 
-        if "rmd.pack" in mod_file:
+        if parts[0] == "_overrides":
+            override_path = "/".join(parts[1:])
+            if path in gone:
+                restore_override(override_path)
+            else:
+                overrides[os.path.join(game_path, *parts[1:])] = path
             continue
 
-        print_colored_bold(f" {mod_file}", WHITE)
-        mod_path = os.path.join(mods_down_path, mod_file)
-        if mod_file.endswith(".zip"):
-            extract_mod(mod_path, mods_dest_path, savegames_dest_path)
-        else:
-            mod_name = os.path.basename(mod_file)
+        if parts[0] == "_collections":
+            if len(parts) != 3 or parts[1] not in collections:
+                continue
+            collection = collections[parts[1]]
+            if path in gone:
+                if name in collection["mods"]:
+                    collection["mods"].remove(name)
+            elif name not in collection["mods"]:
+                collection["mods"].append(name)
+            save_config(config)
+            if not collection["enabled"]:
+                continue
+        elif parts[0] != "_manual":
+            continue
 
-            existing_mods = {
-                os.path.basename(f.path): get_crc(f.path)
-                for f in os.scandir(mods_dest_path)
-                if f.is_file() and f.name.endswith(".pak")
-            }
+        if path in gone:
+            if name.endswith((".zip", ".pak")):
+                remove_installed_mod(path)
+            continue
 
-            if (
-                mod_name not in existing_mods
-                or get_crc(mod_path) != existing_mods[mod_name]
-            ):
-                shutil.copy(mod_path, mods_dest_path)
-            else:
-                print_colored(
-                    f"    Skipping {mod_name} (already copied and hash matches)", YELLOW
-                )
-                print("")
+        mod_files.append(relative_path)
+        # Files that were in an older version of the mod
+        removable += get_installed_files(path)
+
+    flush_config()
+
+    targets = plan_install(
+        mod_files, mods_down_path, mods_dest_path, savegames_dest_path
+    )
+    operations = plan_operations(targets, overrides, removable)
+    counts = apply_plan(operations, workers=extract_workers)
+    if counts[ADD] or counts[REPLACE] or counts[DELETE]:
+        print(
+            f"  {counts[ADD]} added, {counts[REPLACE]} replaced, "
+            f"{counts[DELETE]} removed, {counts[SKIP]} unchanged"
+        )
 
-    overrides_path = os.path.join(mods_down_path, "_overrides")
 
-    if os.path.exists(overrides_path):
-        print("")
-        print_colored("Replacing overrides...", CYAN)
-        for root, _, files in os.walk(overrides_path):
-            for file in files:
-                if ".gitkeep" in file:
-                    continue
-
-                src = os.path.join(root, file)
-                dst = os.path.join(
-                    game_path, os.path.relpath(src, start=overrides_path)
-                )
+def collection_priority(relative_path):
+    """
+    Download the files of enabled collections before those of disabled ones.
 
-                print_colored_bold(f" {os.path.relpath(dst, start=game_path)}", WHITE)
-
-                # Backup the file if it exists, unless it's already backed up
-                if os.path.exists(dst) and not os.path.exists(dst + ".ron_mods_backup"):
-                    print(f"  Backing up {os.path.relpath(dst, start=game_path)}")
-                    shutil.move(dst, dst + ".ron_mods_backup")
-                # Replace the file if it doesn't exist or the hash doesn't match
-                if not os.path.exists(dst) or get_crc(src) != get_crc(dst):
-                    print(f"  Replacing {os.path.relpath(dst, start=game_path)}")
-                    shutil.copy(src, dst)
-                else:
-                    print_colored(
-                        f"  Skipping {os.path.relpath(dst, start=game_path)} (already replaced and hash matches)",
-                        YELLOW,
-                    )
-                print("")
-        print("")
+    Parameters
+    ----------
+    relative_path : str
+        The path of the file below _collections, using "/".
+
+    Returns
+    -------
+    int
+        The file's download priority.
+    """
+    collection = relative_path.split("/")[0]
+    if config.get("collections", {}).get(collection, {}).get("enabled"):
+        return PRIORITY_REQUIRED
+    return PRIORITY_OPTIONAL
 
 
-def uninstall_mods(mods_dest_path, mods_down_path, game_path):
-    existing_mods = os.listdir(mods_dest_path)
+def sync_mod_pack(mod_pack_url, mp_json_data):
+    """
+    Bring the local _collections, _manual and _overrides folders in line with
+    the mod pack, cleaning up installed files of anything that was removed.
 
-    if not existing_mods:
-        print_colored("No mods installed, nothing to do.", YELLOW)
-    else:
-        print_colored("Uninstalling mods...", CYAN)
-        for mod_file in existing_mods:
-            print(f"  Removing {mod_file}")
-            dst = os.path.join(mods_dest_path, mod_file)
-            os.remove(dst)
+    If rmd.pack lists its files, the update is planned from that list alone,
+    otherwise the pack's directory listings are crawled.
 
-    # Uninstall overrides
-    overrides_path = os.path.join(mods_down_path, "_overrides")
-    if os.path.exists(overrides_path):
-        print_colored("Restoring overrides...", CYAN)
-        for root, _, files in os.walk(overrides_path):
-            for file in files:
-                if ".gitkeep" in file:
-                    continue
-
-                dst = os.path.join(
-                    game_path,
-                    os.path.relpath(os.path.join(root, file), start=overrides_path),
-                )
+    Parameters
+    ----------
+    mod_pack_url : str
+        The URL of the mod pack.
+    mp_json_data : dict
+        The contents of rmd.pack.
+    """
+    from helpers.modpack import manifest_tree, sync_folder
 
-                if os.path.exists(dst + ".ron_mods_backup"):
-                    if os.path.exists(dst):
-                        print(f"  Removing {os.path.relpath(dst, start=game_path)}")
-                        os.remove(dst)
+    manifest_files = mp_json_data.get("files")
 
-                    print(
-                        f"  Restoring backup of {os.path.relpath(dst, start=game_path)}"
-                    )
-                    shutil.move(dst + ".ron_mods_backup", dst)
-        print("")
+    for folder in ("_collections", "_manual", "_overrides"):
+        print_colored(f"Syncing {folder}...", CYAN)
 
+        if folder == "_overrides":
 
-def mods_match(mod_files, mods_dest_path):
-    """Check if the mods in the destination path match the mod files."""
-    existing_mods = {
-        os.path.basename(f.path): get_crc(f.path)
-        for f in os.scandir(mods_dest_path)
-        if f.is_file() and f.name.endswith(".pak")
-    }
-    for mod_file in mod_files:
-        if ".gitkeep" in os.path.basename(mod_file):
-            continue
+            def on_delete(relative_path, local_path):
+                restore_override(relative_path)
 
-        if mod_file.endswith(".zip"):
-            with zipfile.ZipFile(
-                os.path.join(mods_down_path, mod_file), "r"
-            ) as zip_ref:
-                entries = zip_ref.infolist()
-                for entry in entries:
-                    if entry.is_dir() or not entry.filename.endswith(".pak"):
-                        continue
-                    mod_name = os.path.basename(entry.filename)
-                    if mod_name not in existing_mods:
-                        return False
         else:
-            mod_name = os.path.basename(mod_file)
-            if mod_name not in existing_mods:
-                return False
-    return True
+
+            def on_delete(relative_path, local_path):
+                remove_installed_mod(local_path)
+
+        remote_files = None
+        if manifest_files is not None:
+            remote_files = manifest_tree(mod_pack_url, manifest_files, folder)
+
+        try:
+            result = sync_folder(
+                f"{mod_pack_url}/mods/{folder}/",
+                os.path.join(mods_down_path, folder),
+                remote_files=remote_files,
+                on_delete=on_delete,
+                workers=get_worker_count(config, args.workers),
+                priority=collection_priority if folder == "_collections" else None,
+            )
+        except requests.exceptions.RequestException as e:
+            print_colored(f"  Failed to sync {folder}: {e}", RED)
+            continue
+
+        print(
+            f"  {len(result['downloaded'])} downloaded, "
+            f"{len(result['deleted'])} removed, "
+            f"{len(result['unchanged'])} unchanged"
+        )
+        for relative_path in result["failed"]:
+            print_colored(f"  Failed to download {relative_path}", RED)
+    print("")
 
 
 def is_valid_mod_pack_url(url):
     """Check if the mod pack url is valid."""
     try:
-        response = requests.get(f"{url}/rmd.pack")
+        response = get_session().get(f"{url}/rmd.pack")
         if response.status_code == 200:
             return True
         else:
@@ -631,390 +584,563 @@ def is_valid_mod_pack_url(url):
         return False
 
 
-# Get game install path
-game_path = get_game_install_path("1144200")
-if not game_path:
-    print_colored("Ready or Not not found in Steam library.", RED)
-    exit()
-
-mods_dest_path = os.path.join(game_path, "ReadyOrNot", "Content", "Paks", "~mods")
-savegames_dest_path = os.path.join(
-    os.getenv("LOCALAPPDATA"), "ReadyOrNot", "Saved", "SaveGames"
-)
-# Make directory if it doesn't exist
-os.makedirs(mods_dest_path, exist_ok=True)
+def main():
+    """
+    Run the downloader: find the game, sync the mod pack and subscriptions,
+    then show the menu.
+    """
+    global args, config, extract_workers, game_path, mods_dest_path
+    global mods_down_path, savegames_dest_path, subscriptions
 
-mods_down_path = "mods"
+    print("\033[H\033[J")
+    print_colored_bold(f"\nRoN Mods Downloader ({CURRENT_VERSION})", GREEN)
+    print("-" * 40)
 
-# If the mods directory doesn't exist, look for "zips" directory instead
-if not os.path.exists(mods_down_path):
-    mods_down_path = "zips"
+    parser = argparse.ArgumentParser(description="RoN Mods Downloader")
+    parser.add_argument(
+        "--skip-download",
+        action="store_true",
+        help="Skip downloading mods after checking for updates",
+        default=False,
+    )
+    parser.add_argument(
+        "--purge",
+        action="store_true",
+        help="Skip downloading mods after checking for updates",
+        default=False,
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of mods to download at once (default: 4)",
+        default=None,
+    )
+    parser.add_argument(
+        "--extract-workers",
+        type=int,
+        help="Number of archives to extract at once (default: number of CPUs, up to 8)",
+        default=None,
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Print what installing the downloaded mods would change and exit without downloading or changing anything",
+        default=False,
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Install each mod as soon as it is downloaded, then finish the install before showing the menu",
+        default=False,
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and apply changes to mods/_manual, mods/_collections and mods/_overrides as they happen",
+        default=False,
+    )
+    parser.add_argument(
+        "--full-sync",
+        action="store_true",
+        help="Fetch the complete subscription list instead of only what changed",
+        default=False,
+    )
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="Print how long imports and each startup step take, then exit",
+        default=False,
+    )
+    parser.add_argument(
+        "--limit-rate",
+        metavar="RATE",
+        help="Limit the combined download speed, e.g. 500K or 2M (bytes per second)",
+        default=None,
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        help="Time syncing, hashing, downloading and installing, write a Chrome trace to FILE and print the slowest operations at exit",
+        default=None,
+    )
+    args = parser.parse_args()
+
+    if args.trace:
+        enable_tracing(args.trace)
+
+    skip_download = args.skip_download
+
+    # If --purge is passed as an argument, remove all mods
+    if args.purge:
+        print_colored("Purging mods...", CYAN)
+        # Remove mods/
+        if os.path.exists("mods"):
+            shutil.rmtree("mods")
+
+            # Recreate mods/ directory
+            os.makedirs("mods", exist_ok=True)
+
+    # Get game install path
+    with phase("find game"):
+        game_path = get_game_install_path("1144200")
+    if not game_path:
+        print_colored("Ready or Not not found in Steam library.", RED)
+        sys.exit(1)
+
+    mods_dest_path = os.path.join(game_path, "ReadyOrNot", "Content", "Paks", "~mods")
+    savegames_dest_path = os.path.join(
+        os.getenv("LOCALAPPDATA"), "ReadyOrNot", "Saved", "SaveGames"
+    )
+    # Make directory if it doesn't exist
+    os.makedirs(mods_dest_path, exist_ok=True)
 
-if not os.path.exists(mods_down_path):
     mods_down_path = "mods"
-    os.makedirs(mods_down_path, exist_ok=True)
 
-# If read_config returns False, create a new config file
-if not read_config():
-    create_config()
+    # If the mods directory doesn't exist, look for "zips" directory instead
+    if not os.path.exists(mods_down_path):
+        mods_down_path = "zips"
 
-config = read_config()
+    if not os.path.exists(mods_down_path):
+        mods_down_path = "mods"
+        os.makedirs(mods_down_path, exist_ok=True)
 
-token = get_oauth_token()
+    with phase("read config"):
+        # If read_config returns False, create a new config file
+        if not read_config():
+            create_config()
 
-print_colored("Checking for downloader updates...", CYAN)
-auto_update(REPO, CURRENT_VERSION, APP_PATH, config)
+        config = read_config()
 
-if "mod_pack_url" not in config:
-    mod_pack_url = input("Enter the URL of the mod pack (Leave blank to not use one): ")
-    config["mod_pack_url"] = mod_pack_url or False
-    save_config(config)
+        configure_http(
+            timeout=config.get("http_timeout"), retries=config.get("http_retries")
+        )
+        try:
+            configure_bandwidth(
+                rate=parse_rate(args.limit_rate or config.get("limit_rate")),
+                per_host=config.get("downloads_per_host"),
+            )
+        except ValueError as e:
+            print_colored(str(e), RED)
+            sys.exit(1)
+
+    with phase("prune caches"):
+        # Forget cached hashes and archive indexes of files that were removed or changed since last run
+        prune_hash_cache()
+        prune_archive_index()
+        prune_ledger()
+
+        # Identical content is only downloaded and kept once, in mods/_store
+        configure_store(mods_down_path)
+        prune_store()
+
+    # Everything after this talks to the network or waits for the user
+    if args.startup_profile:
+        sys.exit(0 if print_startup_profile() else 1)
+
+    # Only show what installing the downloaded mods would do, before the mod
+    # pack and subscription syncs get to download or delete anything
+    if args.plan:
+        print_colored("Install plan:", CYAN)
+        operations = plan_mods(
+            gather_mods(mods_down_path),
+            config.get("collections", {}),
+            mods_down_path,
+            game_path,
+            mods_dest_path,
+            savegames_dest_path,
+        )
+        print_plan(operations, game_path)
+        sys.exit()
 
-if config["mod_pack_url"]:
-    print_colored("Checking for mod pack updates...\n", CYAN)
-    # If mod_pack_version is not in config, set it to 0.0.0
-    if "mod_pack_version" not in config:
-        config["mod_pack_version"] = "0.0.0"
+    token = get_oauth_token()
 
-    # Check if the mod pack version is different from the current version
-    existing = parse_version(config["mod_pack_version"])
+    print_colored("Checking for downloader updates...", CYAN)
+    auto_update(REPO, CURRENT_VERSION, APP_PATH, config)
 
-    modPackValid = True
-    response = None
+    if "mod_pack_url" not in config:
+        mod_pack_url = input(
+            "Enter the URL of the mod pack (Leave blank to not use one): "
+        )
+        config["mod_pack_url"] = mod_pack_url or False
+        save_config(config)
+        flush_config()
 
-    # Get the latest release from the mod pack URL
-    try:
-        response = requests.get(f"{config['mod_pack_url']}/rmd.pack")
-    except requests.exceptions.RequestException as e:
-        print_colored(f"Failed to check for mod pack updates: {e}", RED)
-        modPackValid = False
-
-    if response and response.status_code == 200:
-        mp_json_data = response.json()
-        latest = parse_version(mp_json_data["version"])
-
-        # If the latest version is greater than the existing version, download the mod pack
-        # Also download if the local mods directory is empty
-        if latest > existing or not os.listdir(mods_down_path):
-            print_colored(
-                f"New mod pack version available: {latest} (Current: {existing}). Downloading...\n",
-                YELLOW,
-            )
+    if config["mod_pack_url"]:
+        print_colored("Checking for mod pack updates...\n", CYAN)
+        from packaging.version import parse as parse_version
 
-            # Update subscriptions
-            # Example of json_data:
-            # {
-            #   "https://mod.io/g/readyornot/m/fairfax-residence-remake",
-            #   "https://mod.io/g/readyornot/m/lustful-remorse",
-            # }
-            # lustful-remorse is the mod_id
-            pack_subscriptions = mp_json_data["subscriptions"]
-            subscriptions = get_subscriptions()
-
-            # For each subscription, check if it is already subscribed to
-            for sub in pack_subscriptions:
-                mod_id = sub.split("/")[-1]
-                if mod_id not in [s["name_id"] for s in subscriptions]:
-                    # Subscribe to the mod
-                    subscribed = subscribe_to_mod(mod_id)
-                    if not subscribed:
-                        print_colored(f"    Failed to subscribe to {mod_id}", RED)
-                        print("")
-                        sys.exit()
-
-            # Unsubscribe from any mods that are not in the mod pack
-            for sub in subscriptions:
-                mod_id = sub["name_id"]
-                if mod_id not in [url.split("/")[-1] for url in pack_subscriptions]:
-                    unsubscribed = unsubscribe_from_mod(mod_id)
-                    if not unsubscribed:
-                        print_colored(f"    Failed to unsubscribe from {mod_id}", RED)
-                        print("")
-                        sys.exit()
-
-            # Download the mod folders
-            # config['mod_pack_url']}/mods/_collections
-            # config['mod_pack_url']}/mods/_manual
-            # config['mod_pack_url']}/mods/_overrides
-
-            # Download the collections
-            collections_path = os.path.join(mods_down_path, "_collections")
-            if not os.path.exists(collections_path):
-                os.makedirs(collections_path, exist_ok=True)
-
-            collections_url = f"{config['mod_pack_url']}/mods/_collections/"
-            download_folder(collections_url, collections_path)
-
-            # Ensure the collections are in the config file
-            if "collections" not in config:
-                config["collections"] = {}
-
-            # Create a list of collections to delete
-            collections_to_delete = [
-                collection
-                for collection in config["collections"]
-                if collection not in mp_json_data["collections"]
-            ]
-
-            # Delete the collections from the config file
-            for collection in collections_to_delete:
-                del config["collections"][collection]
-
-                # Remove the collection folder
-                collection_path = os.path.join(collections_path, collection)
-                if os.path.exists(collection_path):
-                    shutil.rmtree(collection_path)
-
-            # Compare mp_json_data with config["collections"], ensure the files are the same
-            for collection in mp_json_data["collections"]:
-                # Check if the collection is in the config file, if not add it
-                if collection not in config["collections"]:
-                    config["collections"][collection] = {"enabled": False, "mods": []}
-
-                    # Ensure the enabled key matches the mod pack
-                    if collection in mp_json_data["collections"]:
-                        config["collections"][collection]["enabled"] = mp_json_data[
-                            "collections"
-                        ][collection]["enabled"]
-
-                    # Add the mods to the collection
-                    for mod in mp_json_data["collections"][collection]["mods"]:
-                        if mod not in config["collections"][collection]["mods"]:
-                            config["collections"][collection]["mods"].append(mod)
-                else:
-                    # Remove any mods from the collection if the file no longer exists
-                    for mod in config["collections"][collection]["mods"]:
-                        if mod not in mp_json_data["collections"][collection]["mods"]:
-                            config["collections"][collection]["mods"].remove(mod)
-
-            # Download the manual mods
-            manual_path = os.path.join(mods_down_path, "_manual")
-            if not os.path.exists(manual_path):
-                os.makedirs(manual_path, exist_ok=True)
-
-            manual_url = f"{config['mod_pack_url']}/mods/_manual/"
-            mod_pack_files = list_folder(manual_url, "_manual")
-            download_folder(manual_url, manual_path)
-
-            # Download the overrides
-            overrides_path = os.path.join(mods_down_path, "_overrides")
-            if not os.path.exists(overrides_path):
-                os.makedirs(overrides_path, exist_ok=True)
-
-            overrides_url = f"{config['mod_pack_url']}/mods/_overrides/"
-            download_folder(overrides_url, overrides_path)
-
-            # Update the mod pack version in the config file
-            config["mod_pack_version"] = str(latest)
-            save_config(config)
+        # If mod_pack_version is not in config, set it to 0.0.0
+        if "mod_pack_version" not in config:
+            config["mod_pack_version"] = "0.0.0"
 
-            print_colored("\nMod pack updated successfully.\n", GREEN)
+        # Check if the mod pack version is different from the current version
+        existing = parse_version(config["mod_pack_version"])
 
-        else:
-            print_colored("No new mod pack updates found.\n", GREEN)
-
-        manual_path = os.path.join(mods_down_path, "_manual")
-        manual_url = f"{config['mod_pack_url']}/mods/_manual/"
-        mod_pack_files = list_folder(manual_url, "_manual")
-        # Remove any manual mods that are no longer in the mod pack
-        for root, dirs, files in os.walk(manual_path):
-            for mod in files:
-                mod_path = os.path.join(root, mod)
-                relative_mod_path = os.path.relpath(mod_path, manual_path)
-                normalized_mod_path = normalize_path(
-                    "mods/_manual/" + relative_mod_path
-                )
-                # print(f"Checking {normalized_mod_path}")
-                if normalized_mod_path not in mod_pack_files:
-                    # print(f"Removing {mod_path}")
-                    os.remove(mod_path)
-
-                    # Ensure it's removed from ~mods as well
-                    # Need to check if it's a zip file and remove the extracted files
-                    mod_path = os.path.join(mods_dest_path, mod)
-                    if os.path.exists(mod_path):
-                        print(f"  Removing {mod}")
-                        if mod.endswith(".zip"):
-                            with zipfile.ZipFile(mod_path, "r") as zip_ref:
-                                for entry in zip_ref.infolist():
-                                    if entry.is_dir():
-                                        continue
-                                    mod_path = os.path.join(
-                                        mods_dest_path, entry.filename
-                                    )
-                                    if os.path.exists(mod_path):
-                                        os.remove(mod_path)
-                        else:
-                            os.remove(mod_path)
-
-        # Remove any collection mods that are no longer in the mod pack, unlike above the mod files are in a subdirectories
-        collections_path = os.path.join(mods_down_path, "_collections")
-        collections_url = f"{config['mod_pack_url']}/mods/_collections/"
-        collection_pack_files = list_folder(collections_url, "_collections")
-        for root, dirs, files in os.walk(collections_path):
-            for mod in files:
-                mod_path = os.path.join(root, mod)
-                relative_mod_path = os.path.relpath(mod_path, collections_path)
-                normalized_mod_path = normalize_path(
-                    "mods/_collections/" + relative_mod_path
+        modPackValid = True
+        pack_updated = False
+        response = None
+
+        # Get the latest release from the mod pack URL
+        try:
+            response = cached_get(f"{config['mod_pack_url']}/rmd.pack")
+        except requests.exceptions.RequestException as e:
+            print_colored(f"Failed to check for mod pack updates: {e}", RED)
+            modPackValid = False
+
+        if response and response.status_code == 200:
+            mp_json_data = response.json()
+            latest = parse_version(mp_json_data["version"])
+
+            # If the latest version is greater than the existing version, download the mod pack
+            # Also download if the local mods directory is empty
+            if latest > existing or not os.listdir(mods_down_path):
+                print_colored(
+                    f"New mod pack version available: {latest} (Current: {existing}). Downloading...\n",
+                    YELLOW,
                 )
-                # print(f"Checking {normalized_mod_path}")
-                if normalized_mod_path not in collection_pack_files:
-                    # print(f"Removing {mod_path}")
-                    os.remove(mod_path)
-
-                    # Ensure it's removed from ~mods as well
-                    mod_path = os.path.join(mods_dest_path, mod)
-                    if os.path.exists(mod_path):
-                        print(f"  Removing {mod}")
-                        if mod.endswith(".zip"):
-                            with zipfile.ZipFile(mod_path, "r") as zip_ref:
-                                for entry in zip_ref.infolist():
-                                    if entry.is_dir():
-                                        continue
-                                    mod_path = os.path.join(
-                                        mods_dest_path, entry.filename
-                                    )
-                                    if os.path.exists(mod_path):
-                                        os.remove(mod_path)
-                        else:
-                            os.remove(mod_path)
-    else:
-        modPackValid = False
 
+                # Update subscriptions
+                # Example of json_data:
+                # {
+                #   "https://mod.io/g/readyornot/m/fairfax-residence-remake",
+                #   "https://mod.io/g/readyornot/m/lustful-remorse",
+                # }
+                # lustful-remorse is the mod_id
+                pack_subscriptions = mp_json_data["subscriptions"]
+                try:
+                    subscriptions = get_subscriptions()
+                except requests.exceptions.RequestException as e:
+                    print_colored(f"    Failed to get subscriptions: {e}", RED)
+                    print("")
+                    sys.exit()
+
+                # For each subscription, check if it is already subscribed to
+                for sub in pack_subscriptions:
+                    mod_id = sub.split("/")[-1]
+                    if mod_id not in [s["name_id"] for s in subscriptions]:
+                        # Subscribe to the mod
+                        subscribed = subscribe_to_mod(mod_id)
+                        if not subscribed:
+                            print_colored(f"    Failed to subscribe to {mod_id}", RED)
+                            print("")
+                            sys.exit()
+
+                # Unsubscribe from any mods that are not in the mod pack
+                for sub in subscriptions:
+                    mod_id = sub["name_id"]
+                    if mod_id not in [url.split("/")[-1] for url in pack_subscriptions]:
+                        unsubscribed = unsubscribe_from_mod(mod_id)
+                        if not unsubscribed:
+                            print_colored(
+                                f"    Failed to unsubscribe from {mod_id}", RED
+                            )
+                            print("")
+                            sys.exit()
+
+                collections_path = os.path.join(mods_down_path, "_collections")
+
+                # Ensure the collections are in the config file
+                if "collections" not in config:
+                    config["collections"] = {}
+
+                # Create a list of collections to delete
+                collections_to_delete = [
+                    collection
+                    for collection in config["collections"]
+                    if collection not in mp_json_data["collections"]
+                ]
+
+                # Delete the collections from the config file
+                for collection in collections_to_delete:
+                    del config["collections"][collection]
+
+                    # Remove the collection folder
+                    collection_path = os.path.join(collections_path, collection)
+                    if os.path.exists(collection_path):
+                        shutil.rmtree(collection_path)
+
+                # Compare mp_json_data with config["collections"], ensure the files are the same
+                for collection in mp_json_data["collections"]:
+                    # Check if the collection is in the config file, if not add it
+                    if collection not in config["collections"]:
+                        config["collections"][collection] = {
+                            "enabled": False,
+                            "mods": [],
+                        }
+
+                        # Ensure the enabled key matches the mod pack
+                        if collection in mp_json_data["collections"]:
+                            config["collections"][collection]["enabled"] = mp_json_data[
+                                "collections"
+                            ][collection]["enabled"]
+
+                        # Add the mods to the collection
+                        for mod in mp_json_data["collections"][collection]["mods"]:
+                            if mod not in config["collections"][collection]["mods"]:
+                                config["collections"][collection]["mods"].append(mod)
+                    else:
+                        # Remove any mods from the collection if the file no longer exists
+                        for mod in config["collections"][collection]["mods"]:
+                            if (
+                                mod
+                                not in mp_json_data["collections"][collection]["mods"]
+                            ):
+                                config["collections"][collection]["mods"].remove(mod)
+
+                pack_updated = True
+
+            else:
+                print_colored("No new mod pack updates found.\n", GREEN)
 
-subscriptions = get_subscriptions()
+            # Download new and changed pack files, and remove the ones that are gone
+            with span("sync mod pack", "modpack"):
+                sync_mod_pack(config["mod_pack_url"], mp_json_data)
 
-# Remove any files that are no longer subscribed to
-remove_unsubscribed_mods()
-config = update_subscriptions_config(subscriptions)
+            if pack_updated:
+                # Update the mod pack version in the config file
+                config["mod_pack_version"] = str(latest)
+                save_config(config)
+                flush_config()
 
-if not skip_download:
-    # Download new mods, checking if they are already downloaded
-    print_colored("Downloading mods from mod.io...", CYAN)
-    print("")
-    for sub in subscriptions:
-        mod_id = sub["name_id"]
-        mod_file = sub["modfile"]["filename"]
-        mod_md5 = sub["modfile"]["filehash"]["md5"]
-        mod_file_path = os.path.join(mods_down_path, mod_file)
-
-        if mod_file not in os.listdir(mods_down_path) or mod_md5 != get_md5(
-            mod_file_path
-        ):
-            download_mod(mod_id)
+                print_colored("\nMod pack updated successfully.\n", GREEN)
         else:
-            print_colored(
-                f"  Skipping download of {mod_file} (already downloaded and hash matches)",
-                YELLOW,
+            modPackValid = False
+
+    with span("sync subscriptions", "modio"):
+        subscriptions = sync_subscriptions(config, force_full=args.full_sync)
+
+    # Remove any files that are no longer subscribed to
+    remove_unsubscribed_mods()
+    config = update_subscriptions_config(subscriptions)
+
+    extract_workers = get_worker_count(
+        config,
+        args.extract_workers,
+        key="extract_workers",
+        default=DEFAULT_EXTRACT_WORKERS,
+    )
+
+    pipeline = None
+    if not skip_download:
+        # Download new mods, checking if they are already downloaded
+        print_colored("Downloading mods from mod.io...", CYAN)
+        print("")
+        pending = []
+        for sub in subscriptions:
+            mod_id = sub["name_id"]
+            mod_file = sub["modfile"]["filename"]
+            mod_md5 = sub["modfile"]["filehash"]["md5"]
+            mod_file_path = os.path.join(mods_down_path, mod_file)
+
+            if mod_file in os.listdir(mods_down_path) and mod_md5 == get_md5(
+                mod_file_path
+            ):
+                add_to_store(mod_file_path, mod_md5)
+                print_colored(
+                    f"  Skipping download of {mod_file} (already downloaded and hash matches)",
+                    YELLOW,
+                )
+            elif restore_from_store(mod_md5, mod_file_path):
+                # e.g. the modfile was renamed on mod.io but its content is the same
+                save_mod_contents(
+                    mod_id,
+                    [entry.filename for entry in get_archive_entries(mod_file_path)],
+                )
+                print_colored(
+                    f"  Skipping download of {mod_file} (same content already stored)",
+                    YELLOW,
+                )
+            else:
+                pending.append(mod_id)
+
+        if args.pipeline:
+            # Verify and install each archive while the others are still downloading
+            from helpers.pipeline import Pipeline
+
+            pipeline = Pipeline(
+                [
+                    ("verify", verify_download, 1),
+                    (
+                        "install",
+                        lambda targets: install_targets(
+                            targets, workers=1, show_progress=False
+                        ),
+                        extract_workers,
+                    ),
+                ]
             )
-    print("")
 
-# Check if "_collections" directory exists
-collections_path = os.path.join(mods_down_path, "_collections")
+        def on_downloaded(mod_id, contents):
+            save_mod_contents(mod_id, contents)
+            if pipeline is not None:
+                mod_info = config["subscribed_mods"][mod_id]
+                pipeline.put((mod_info["file"], mod_info["md5"]))
+
+        with span("download mods", "download", mods=len(pending)):
+            results = download_all(
+                pending,
+                download_mod,
+                workers=get_worker_count(config, args.workers),
+                on_success=on_downloaded,
+                # Smallest first, so the first mods are ready to play sooner
+                order=lambda mod_id: download_order(
+                    PRIORITY_REQUIRED, config["subscribed_mods"][mod_id].get("size")
+                ),
+            )
+        flush_config()
+        print("")
+
+        if pipeline is not None:
+            for (mod_file, _), stage, error in pipeline.close():
+                print_colored(f"Failed to {stage} {mod_file}: {error}", RED)
 
-if not os.path.exists(collections_path):
-    os.makedirs(collections_path, exist_ok=True)
+        failed = {mod_id: r for mod_id, r in results.items() if not r["ok"]}
+        if failed:
+            print_colored(f"Failed to download {len(failed)} mod(s):", RED)
+            for mod_id, result in failed.items():
+                print_colored(
+                    f"  {config['subscribed_mods'][mod_id]['file']}: {result['error']}",
+                    RED,
+                )
+            print("")
 
-# Get the list of collections
-collections = os.listdir(collections_path)
+    # Check if "_collections" directory exists
+    collections_path = os.path.join(mods_down_path, "_collections")
 
-# Ensure "collections" key exists in the config
-if "collections" not in config:
-    config["collections"] = {}
+    if not os.path.exists(collections_path):
+        os.makedirs(collections_path, exist_ok=True)
 
-# Iterate through the collections
-for collection in collections:
-    # Ignore .gitkeep files
-    if ".gitkeep" in collection:
-        continue
+    # Get the list of collections
+    collections = os.listdir(collections_path)
 
-    # Get the list of mods in the collection
-    collection_mods = os.listdir(os.path.join(collections_path, collection))
+    # Ensure "collections" key exists in the config
+    if "collections" not in config:
+        config["collections"] = {}
 
-    # Check if the collection is in the config file, if not add it
-    if collection not in config["collections"]:
-        config["collections"][collection] = {"enabled": False, "mods": []}
+    # Iterate through the collections
+    for collection in collections:
+        # Ignore .gitkeep files
+        if ".gitkeep" in collection:
+            continue
 
-    # Ensure the enabled key matches the mod pack
-    if config["mod_pack_url"] and modPackValid:
-        collections_data = mp_json_data["collections"]
-        if collection in collections_data:
-            config["collections"][collection]["enabled"] = collections_data[collection][
-                "enabled"
-            ]
+        # Get the list of mods in the collection
+        collection_mods = os.listdir(os.path.join(collections_path, collection))
 
-    # Add the mods to the collection
-    for mod in collection_mods:
-        if mod not in config["collections"][collection]["mods"]:
-            config["collections"][collection]["mods"].append(mod)
+        # Check if the collection is in the config file, if not add it
+        if collection not in config["collections"]:
+            config["collections"][collection] = {"enabled": False, "mods": []}
 
-    # Remove any mods from the collection if the file no longer exists
-    for mod in config["collections"][collection]["mods"]:
-        if mod not in collection_mods:
-            config["collections"][collection]["mods"].remove(mod)
+        # Ensure the enabled key matches the mod pack
+        if config["mod_pack_url"] and modPackValid:
+            collections_data = mp_json_data["collections"]
+            if collection in collections_data:
+                config["collections"][collection]["enabled"] = collections_data[
+                    collection
+                ]["enabled"]
 
+        # Add the mods to the collection
+        for mod in collection_mods:
+            if mod not in config["collections"][collection]["mods"]:
+                config["collections"][collection]["mods"].append(mod)
 
-# Update the config file
-save_config(config)
+        # Remove any mods from the collection if the file no longer exists
+        for mod in config["collections"][collection]["mods"]:
+            if mod not in collection_mods:
+                config["collections"][collection]["mods"].remove(mod)
 
-# Return the list of collections
-collections = config["collections"]
+    # Update the config file
+    save_config(config)
+    flush_config()
 
-mod_files = gather_mods(mods_down_path)
+    # Return the list of collections
+    collections = config["collections"]
 
-# If there are no mods to install, exit
-if not mod_files:
-    print_colored("No mods found, nothing to do, exiting...", YELLOW)
-    sys.exit()
+    mod_files = gather_mods(mods_down_path)
 
-# Add a menu to choose whether to install or uninstall mods
-while True:
-    display_menu()
-    choice = input("\nEnter your choice [and press enter]: ")
+    # If there are no mods to install, exit
+    if not mod_files:
+        print_colored("No mods found, nothing to do, exiting...", YELLOW)
+        sys.exit()
 
-    if choice == "1":
-        print("\033[H\033[J")
+    # Finish what the pipeline started, e.g. manual mods, collections and overrides
+    if pipeline is not None:
         install_mods(mod_files, mods_dest_path, mods_down_path)
-        input("Press any key to continue...")
-        print("\033[H\033[J")
-    elif choice == "2":
-        print("\033[H\033[J")
-        uninstall_mods(mods_dest_path, mods_down_path, game_path)
-        input("Press any key to continue...")
-        print("\033[H\033[J")
-    elif choice == "3":
-        print("\033[H\033[J")
-        view_collections(collections)
-        mod_files = gather_mods(mods_down_path)
-    elif choice == "4":
-        print("\033[H\033[J")
-        mod_pack_url = input("Enter the URL of the mod pack: ")
-
-        if is_valid_mod_pack_url(mod_pack_url):
-            print_colored("Valid mod pack URL, updating config...", GREEN)
-        else:
-            print_colored("Invalid mod pack URL, please try again.", RED)
-            continue
 
-        config["mod_pack_url"] = mod_pack_url
-        config["mod_pack_version"] = "0.0.0"
-        save_config(config)
+    if args.watch:
+        from helpers.watch import watch
 
-        # Uninstall all mods ready for the new mod pack
-        uninstall_mods(mods_dest_path, mods_down_path, game_path)
+        watched = [
+            os.path.join(mods_down_path, folder)
+            for folder in ("_manual", "_collections", "_overrides")
+        ]
+        for folder in watched:
+            os.makedirs(folder, exist_ok=True)
 
-        # Remove local mods
-        shutil.rmtree(mods_down_path)
+        def on_change(paths):
+            print_colored(f"Applying {len(paths)} change(s)...", CYAN)
+            apply_local_changes(paths)
+
+        print_colored(
+            "Watching mods/_manual, mods/_collections and mods/_overrides "
+            "(press Ctrl+C to stop)...",
+            CYAN,
+        )
+        watch(watched, on_change)
+        sys.exit()
+
+    # Add a menu to choose whether to install or uninstall mods
+    while True:
+        display_menu()
+        choice = input("\nEnter your choice [and press enter]: ")
+
+        if choice == "1":
+            print("\033[H\033[J")
+            install_mods(mod_files, mods_dest_path, mods_down_path)
+            input("Press any key to continue...")
+            print("\033[H\033[J")
+        elif choice == "2":
+            print("\033[H\033[J")
+            uninstall_mods(mods_dest_path, mods_down_path, game_path)
+            input("Press any key to continue...")
+            print("\033[H\033[J")
+        elif choice == "3":
+            print("\033[H\033[J")
+            view_collections(collections)
+            flush_config()
+            mod_files = gather_mods(mods_down_path)
+        elif choice == "4":
+            print("\033[H\033[J")
+            mod_pack_url = input("Enter the URL of the mod pack: ")
+
+            if is_valid_mod_pack_url(mod_pack_url):
+                print_colored("Valid mod pack URL, updating config...", GREEN)
+            else:
+                print_colored("Invalid mod pack URL, please try again.", RED)
+                continue
+
+            config["mod_pack_url"] = mod_pack_url
+            config["mod_pack_version"] = "0.0.0"
+            save_config(config)
+            flush_config()
+
+            # Uninstall all mods ready for the new mod pack
+            uninstall_mods(mods_dest_path, mods_down_path, game_path)
+
+            # Remove local mods
+            shutil.rmtree(mods_down_path)
+
+            # Press any button to quit
+            print("Press any key to quit (then restart afterwards)...")
+            input()
+            break
+        elif choice == "5":
+            break
+        else:
+            print("\033[H\033[J")
+            print_colored("Invalid choice, please try again.", RED)
+
+    # input("Press Enter to exit...")
 
-        # Press any button to quit
-        print("Press any key to quit (then restart afterwards)...")
-        input()
-        break
-    elif choice == "5":
-        break
-    else:
-        print("\033[H\033[J")
-        print_colored("Invalid choice, please try again.", RED)
 
-# input("Press Enter to exit...")
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import json
+import zipfile
+from collections import namedtuple
+
+from helpers.cache import (
+    cache_key,
+    cache_lock,
+    file_signature,
+    get_connection,
+    register_table,
+)
+
+_ArchiveEntryBase = namedtuple(
+    "ArchiveEntry",
+    [
+        "filename",
+        "file_size",
+        "compress_size",
+        "CRC",
+        "compress_type",
+        "header_offset",
+    ],
+)
+
+
+class ArchiveEntry(_ArchiveEntryBase):
+    """
+    A zip entry as recorded in the archive index.
+
+    Mirrors the `zipfile.ZipInfo` attributes the downloader uses, so it can be
+    used in place of one without reopening the archive.
+    """
+
+    __slots__ = ()
+
+    def is_dir(self):
+        return self.filename.endswith("/")
+
+
+# Parsed entries for this run, keyed like the database rows
+_memory = {}
+register_table(
+    """
+    CREATE TABLE IF NOT EXISTS archive_index (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        inode INTEGER NOT NULL,
+        entries TEXT NOT NULL
+    )
+    """,
+)
+
+
+def _read_entries(file_path):
+    """
+    Parse the central directory of a zip file.
+    """
+    with zipfile.ZipFile(file_path, "r") as zip_ref:
+        return [
+            ArchiveEntry(
+                info.filename,
+                info.file_size,
+                info.compress_size,
+                info.CRC,
+                info.compress_type,
+                info.header_offset,
+            )
+            for info in zip_ref.infolist()
+        ]
+
+
+def get_archive_entries(file_path):
+    """
+    Get the entries of a zip file, parsing its central directory only if the
+    archive is new or has changed since it was last indexed.
+
+    Parameters
+    ----------
+    file_path : str
+        The path to the zip file.
+
+    Returns
+    -------
+    list of ArchiveEntry
+        The entries of the archive.
+    None
+        If the file does not exist.
+    """
+    key = cache_key(file_path)
+    signature = file_signature(file_path)
+    if signature is None:
+        return None
+
+    cached = _memory.get(key)
+    if cached and cached[0] == signature:
+        return cached[1]
+
+    with cache_lock():
+        row = (
+            get_connection()
+            .execute(
+                "SELECT size, mtime_ns, inode, entries FROM archive_index WHERE path = ?",
+                (key,),
+            )
+            .fetchone()
+        )
+    if row and tuple(row[:3]) == signature:
+        entries = [ArchiveEntry(*entry) for entry in json.loads(row[3])]
+    else:
+        entries = _read_entries(file_path)
+        with cache_lock():
+            connection = get_connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO archive_index (path, size, mtime_ns, inode, entries)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, *signature, json.dumps(entries)),
+            )
+            connection.commit()
+
+    _memory[key] = (signature, entries)
+    return entries
+
+
+def get_pak_entries(file_path):
+    """
+    Get the .pak file entries of a zip file.
+
+    Parameters
+    ----------
+    file_path : str
+        The path to the zip file.
+
+    Returns
+    -------
+    list of ArchiveEntry
+        The .pak entries of the archive, empty if the file does not exist.
+    """
+    return [
+        entry
+        for entry in get_archive_entries(file_path) or []
+        if not entry.is_dir() and entry.filename.endswith(".pak")
+    ]
+
+
+def prune_archive_index():
+    """
+    Evict indexed archives that are gone or have changed on disk.
+
+    Returns
+    -------
+    int
+        The number of entries removed.
+    """
+    with cache_lock():
+        connection = get_connection()
+        rows = connection.execute(
+            "SELECT path, size, mtime_ns, inode FROM archive_index"
+        ).fetchall()
+        stale = [
+            (path,)
+            for path, *signature in rows
+            if file_signature(path) != tuple(signature)
+        ]
+        connection.executemany("DELETE FROM archive_index WHERE path = ?", stale)
+        connection.commit()
+    for (path,) in stale:
+        _memory.pop(path, None)
+    return len(stale)
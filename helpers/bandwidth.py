@@ -0,0 +1,198 @@
+import heapq
+import itertools
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+# How many downloads may run against one host at once
+DEFAULT_PER_HOST = 4
+
+# Lower values are downloaded first: the updater, then the mods the game
+# needs (subscriptions and enabled collections), then everything else
+PRIORITY_UPDATE = 0
+PRIORITY_REQUIRED = 1
+PRIORITY_OPTIONAL = 2
+
+# The rate limit may be exceeded by up to this many seconds worth of data
+# after a pause, so short bursts don't stall on every chunk
+BURST_SECONDS = 0.5
+
+_RATE_UNITS = {"": 1, "K": 1024, "M": 1024**2, "G": 1024**3}
+
+
+class _TokenBucket:
+    """
+    Limit the combined rate of every download to `rate` bytes per second.
+    """
+
+    def __init__(self):
+        self.rate = None
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate):
+        with self._lock:
+            self.rate = rate
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+
+    def consume(self, amount):
+        with self._lock:
+            if not self.rate:
+                return
+            now = time.monotonic()
+            self._tokens = min(
+                self.rate * BURST_SECONDS,
+                self._tokens + (now - self._updated) * self.rate,
+            )
+            self._updated = now
+            # Take the bytes now and sleep off the debt outside the lock, so
+            # concurrent downloads share the rate instead of queueing
+            self._tokens -= amount
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+        if delay:
+            time.sleep(delay)
+
+
+class _HostSlots:
+    """
+    Limit the downloads running against each host, handing free slots to
+    the waiting download with the lowest priority value first.
+    """
+
+    def __init__(self):
+        self.per_host = DEFAULT_PER_HOST
+        self._active = {}
+        self._waiting = {}
+        self._order = itertools.count()
+        self._condition = threading.Condition()
+
+    def set_per_host(self, per_host):
+        with self._condition:
+            self.per_host = per_host
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, host, priority):
+        ticket = (*priority, next(self._order))
+        with self._condition:
+            waiting = self._waiting.setdefault(host, [])
+            heapq.heappush(waiting, ticket)
+            while waiting[0] != ticket or self._active.get(host, 0) >= max(
+                1, self.per_host
+            ):
+                self._condition.wait()
+            heapq.heappop(waiting)
+            self._active[host] = self._active.get(host, 0) + 1
+            # The next waiter may fit in a free slot too
+            self._condition.notify_all()
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._active[host] -= 1
+                self._condition.notify_all()
+
+
+_bucket = _TokenBucket()
+_slots = _HostSlots()
+
+
+def parse_rate(text):
+    """
+    Parse a download rate such as "500K" or "2.5M" (bytes per second).
+
+    Parameters
+    ----------
+    text : str or int or None
+        The rate, a plain number is in bytes per second.
+
+    Returns
+    -------
+    int or None
+        The rate in bytes per second, or None for no limit.
+
+    Raises
+    ------
+    ValueError
+        If the rate can't be parsed.
+    """
+    if text is None or text == "":
+        return None
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMG]?)I?B?(?:/S)?\s*", str(text).upper())
+    if not match:
+        raise ValueError(f"Invalid download rate: {text}")
+    rate = int(float(match.group(1)) * _RATE_UNITS[match.group(2)])
+    return rate or None
+
+
+def configure_bandwidth(rate=None, per_host=None):
+    """
+    Set the global download rate limit and the downloads allowed per host.
+
+    Parameters
+    ----------
+    rate : int, optional
+        The combined download rate in bytes per second, None for no limit.
+    per_host : int, optional
+        How many downloads may run against one host at once.
+    """
+    _bucket.set_rate(rate)
+    if per_host:
+        _slots.set_per_host(int(per_host))
+
+
+@contextmanager
+def download_slot(url, priority=PRIORITY_REQUIRED, size=None):
+    """
+    Wait for a free download slot on the URL's host.
+
+    When several downloads are waiting for the same host, the one with the
+    lowest priority value goes first, and smaller files before larger ones
+    (see `download_order`).
+
+    Parameters
+    ----------
+    url : str
+        The URL about to be downloaded.
+    priority : int
+        One of the `PRIORITY_*` values.
+    size : int, optional
+        The expected size of the file in bytes.
+    """
+    with _slots.slot(urlsplit(url).netloc, download_order(priority, size)):
+        yield
+
+
+def throttle(amount):
+    """
+    Account for downloaded bytes, sleeping if the rate limit is exceeded.
+
+    Parameters
+    ----------
+    amount : int
+        The number of bytes just received.
+    """
+    _bucket.consume(amount)
+
+
+def download_order(priority, size=None):
+    """
+    The sort key that puts downloads in the order they should start in.
+
+    Parameters
+    ----------
+    priority : int
+        One of the `PRIORITY_*` values.
+    size : int, optional
+        The expected size of the file in bytes, unknown sizes go last.
+
+    Returns
+    -------
+    tuple
+        A key to sort jobs by.
+    """
+    return (priority, size is None, size or 0)
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import threading
+
+# Lives next to config.json
+CACHE_PATH = "cache.db"
+
+_connection = None
+_lock = threading.RLock()
+# CREATE statements of every table, run on each new connection
+_schema = []
+
+
+def get_connection():
+    """
+    Get the shared connection to the on-disk cache database.
+
+    The connection is created on first use, along with every registered
+    table, and shared between threads. Callers must hold `cache_lock()` while
+    using it.
+
+    Returns
+    -------
+    sqlite3.Connection
+        The cache database connection.
+    """
+    global _connection
+    with _lock:
+        if _connection is None:
+            _connection = sqlite3.connect(CACHE_PATH, check_same_thread=False)
+            _connection.execute("PRAGMA journal_mode=WAL")
+            _connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in _schema:
+                _connection.execute(statement)
+            _connection.commit()
+        return _connection
+
+
+def register_table(*statements):
+    """
+    Register the statements that create a table and its indexes.
+
+    Modules register their tables when imported, the statements run whenever
+    a connection is opened, or right away if one already is.
+
+    Parameters
+    ----------
+    *statements : str
+        `CREATE ... IF NOT EXISTS` statements.
+    """
+    with _lock:
+        _schema.extend(statements)
+        if _connection is not None:
+            for statement in statements:
+                _connection.execute(statement)
+            _connection.commit()
+
+
+def cache_lock():
+    """
+    Get the lock guarding the shared cache connection.
+
+    Returns
+    -------
+    threading.RLock
+        The lock.
+    """
+    return _lock
+
+
+def cache_key(file_path):
+    """
+    Normalize a path so the same file always maps to the same cache row.
+
+    Parameters
+    ----------
+    file_path : str
+        The path to the file.
+
+    Returns
+    -------
+    str
+        The absolute, normalized path.
+    """
+    return os.path.normcase(os.path.abspath(file_path))
+
+
+def file_signature(file_path):
+    """
+    Get the stat data used to tell whether a file changed since it was cached.
+
+    Parameters
+    ----------
+    file_path : str
+        The path to the file.
+
+    Returns
+    -------
+    tuple of int
+        The size, modification time in nanoseconds and inode of the file.
+    None
+        If the file does not exist.
+    """
+    try:
+        st = os.stat(file_path)
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
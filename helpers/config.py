@@ -1,17 +1,24 @@
+import atexit
 import json
+import os
+import tempfile
+import threading
 
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
+CONFIG_PATH = "config.json"
+
+# The config is kept in memory, save_config() only marks it dirty and
+# flush_config() writes it out at defined points and at exit
+_config = None
+_dirty = False
+_lock = threading.RLock()
 
 
 def read_config():
     """
     Read the configuration file.
 
+    The file is only read from disk once, later calls return the in-memory copy.
+
     Returns
     -------
     dict
@@ -19,12 +26,15 @@ def read_config():
     False
         If the configuration file does not exist.
     """
-    try:
-        with open("config.json", "r") as f:
-            config = json.load(f)
-            return config
-    except FileNotFoundError:
-        return False
+    global _config
+    with _lock:
+        if _config is None:
+            try:
+                with open(CONFIG_PATH, "r") as f:
+                    _config = json.load(f)
+            except FileNotFoundError:
+                return False
+        return _config
 
 
 def create_config():
@@ -38,6 +48,7 @@ def create_config():
     # Create the configuration file
     config = {"subscribed_mods": []}
     save_config(config)
+    flush_config()
     # Clear the screen
     print("\033[H\033[J")
 
@@ -46,13 +57,50 @@ def save_config(config):
     """
     Save the configuration file.
 
+    The change is kept in memory until the next `flush_config()`, so repeated
+    saves in a loop don't each rewrite the file.
+
     Parameters
     ----------
     config : dict
         The configuration file as a dictionary.
     """
-    with open("config.json", "w") as f:
-        json.dump(config, f, indent=4)
+    global _config, _dirty
+    with _lock:
+        _config = config
+        _dirty = True
+
+
+def flush_config():
+    """
+    Write the configuration file to disk if it has unsaved changes.
+
+    The file is written to a temporary file first and then renamed over
+    config.json, so a crash never leaves a half-written config behind.
+    """
+    global _dirty
+    with _lock:
+        if not _dirty or _config is None:
+            return
+
+        directory = os.path.dirname(os.path.abspath(CONFIG_PATH))
+        fd, temp_path = tempfile.mkstemp(
+            prefix=".config-", suffix=".tmp", dir=directory
+        )
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(_config, f, indent=4)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, CONFIG_PATH)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        _dirty = False
+
+
+atexit.register(flush_config)
 
 
 def get_oauth_token():
@@ -143,6 +191,15 @@ def create_oauth_token():
         "Getting OAuth token, you'll see a browser window open, please log in manually and wait for the token to be created.\n"
     )
     print("Do not worry, no password is stored, only the OAuth token is saved.\n")
+
+    # Selenium is slow to import and only needed here
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.webdriver.support.ui import WebDriverWait
+
     chrome_options = Options()
     chrome_options.add_experimental_option(
         "excludeSwitches", ["enable-logging"]
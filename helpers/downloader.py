@@ -0,0 +1,118 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+DEFAULT_WORKERS = 4
+
+
+def get_worker_count(
+    config, override=None, key="download_workers", default=DEFAULT_WORKERS
+):
+    """
+    Resolve the number of concurrent workers.
+
+    Parameters
+    ----------
+    config : dict
+        The configuration file as a dictionary.
+    override : int, optional
+        A worker count passed on the command line, takes precedence over the config.
+    key : str
+        The config key holding the worker count.
+    default : int
+        The worker count to use when neither is set.
+
+    Returns
+    -------
+    int
+        The number of workers, always at least 1.
+    """
+    workers = override or config.get(key, default)
+    try:
+        return max(1, int(workers))
+    except (TypeError, ValueError):
+        return default
+
+
+def download_all(
+    jobs,
+    download_fn,
+    workers=DEFAULT_WORKERS,
+    on_success=None,
+    desc="  Overall",
+    unit="mod",
+    order=None,
+):
+    """
+    Run downloads concurrently with a bounded number of workers.
+
+    One overall progress bar tracks finished jobs, each worker gets its own
+    progress bar line below it for the file it is currently transferring.
+
+    Parameters
+    ----------
+    jobs : list
+        Job keys (e.g. mod IDs) passed to `download_fn`.
+    download_fn : callable
+        Called as `download_fn(key, position)` from a worker thread, where
+        `position` is the tqdm line reserved for that worker's progress bar.
+        Its return value is stored in the result.
+    workers : int
+        The maximum number of downloads running at once.
+    on_success : callable, optional
+        Called as `on_success(key, value)` on the calling thread once a job
+        finishes, so shared state such as the config can be updated safely.
+    desc : str
+        The label of the overall progress bar.
+    unit : str
+        The unit counted by the overall progress bar.
+    order : callable, optional
+        Called as `order(key)` to get a sort key, such as one built with
+        `helpers.bandwidth.download_order`. Jobs are started in that order
+        instead of as given.
+
+    Returns
+    -------
+    dict
+        A dictionary keyed by job with `{"ok": bool, "value": ..., "error": str}`.
+    """
+    from tqdm import tqdm
+
+    results = {}
+    if not jobs:
+        return results
+
+    workers = max(1, min(workers, len(jobs)))
+    if order is not None:
+        jobs = sorted(jobs, key=order)
+
+    # Line 0 is the overall bar, lines 1..workers are handed out to workers
+    free_positions = list(range(workers, 0, -1))
+    positions_lock = threading.Lock()
+
+    def run(key):
+        with positions_lock:
+            position = free_positions.pop()
+        try:
+            return download_fn(key, position)
+        finally:
+            with positions_lock:
+                free_positions.append(position)
+
+    with tqdm(
+        total=len(jobs), desc=desc, unit=unit, position=0
+    ) as overall, ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(run, key): key for key in jobs}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                value = future.result()
+            except Exception as err:
+                results[key] = {"ok": False, "value": None, "error": str(err)}
+            else:
+                results[key] = {"ok": True, "value": value, "error": None}
+                if on_success:
+                    on_success(key, value)
+            overall.update(1)
+
+    return results
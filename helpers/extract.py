@@ -0,0 +1,338 @@
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from helpers.archive_index import get_archive_entries
+from helpers.fastcopy import (
+    TEMP_SUFFIX,
+    destination_lock,
+    fast_copy,
+    get_stored_data_offset,
+    make_temp_path,
+)
+from helpers.hashing import get_crc, record_crc
+from helpers.ledger import is_installed, record_install
+from helpers.print_colored import YELLOW, print_colored
+from helpers.trace import span
+
+# zlib releases the GIL while decompressing, so threads scale with cores
+DEFAULT_EXTRACT_WORKERS = min(8, os.cpu_count() or 1)
+
+# Downloads and copies still in progress, never installed
+INCOMPLETE_SUFFIXES = (".part", TEMP_SUFFIX)
+
+
+def get_extract_destination(filename, mods_dest_path, savegames_dest_path):
+    """
+    Work out where an archive entry is extracted to.
+
+    Parameters
+    ----------
+    filename : str
+        The name of the entry inside the archive.
+    mods_dest_path : str
+        The game's ~mods folder.
+    savegames_dest_path : str
+        The game's SaveGames folder.
+
+    Returns
+    -------
+    str
+        The destination path.
+    None
+        If the entry is not a .pak or .sav file.
+    """
+    # .pak and .sav files are flattened into their destination folder
+    basename = filename.split("/")[-1]
+    if basename.endswith(".pak"):
+        return os.path.join(mods_dest_path, basename)
+    elif basename.endswith(".sav"):
+        return os.path.join(savegames_dest_path, basename)
+    return None
+
+
+def plan_install(
+    mod_files,
+    mods_down_path,
+    mods_dest_path,
+    savegames_dest_path,
+    report_conflicts=True,
+):
+    """
+    Map every destination file to the archive entry or loose file it comes from.
+
+    When several mods provide the same destination file, the one listed last
+    in `mod_files` wins, exactly as if they were installed one after another.
+
+    Parameters
+    ----------
+    mod_files : list of str
+        The mod files to install, relative to `mods_down_path`.
+    mods_down_path : str
+        The local mods folder.
+    mods_dest_path : str
+        The game's ~mods folder.
+    savegames_dest_path : str
+        The game's SaveGames folder.
+    report_conflicts : bool
+        Whether to print which mod wins when several provide the same file.
+
+    Returns
+    -------
+    dict
+        Destination path -> `(source_path, entry)`, where `entry` is the
+        `ArchiveEntry` to extract or None for a loose file that is copied.
+    """
+    targets = {}
+    for mod_file in mod_files:
+        # Skip .gitkeep files and also _manual\.gitkeep files
+        if ".gitkeep" in mod_file:
+            continue
+
+        if "rmd.pack" in mod_file:
+            continue
+
+        if mod_file.endswith(INCOMPLETE_SUFFIXES):
+            continue
+
+        mod_path = os.path.join(mods_down_path, mod_file)
+        if mod_file.endswith(".zip"):
+            for entry in get_archive_entries(mod_path) or []:
+                if entry.is_dir():
+                    continue  # Skip directories
+
+                dst = get_extract_destination(
+                    entry.filename, mods_dest_path, savegames_dest_path
+                )
+                if dst is None:
+                    continue  # Skip non-.pak and non-.sav files
+
+                _add_target(targets, dst, (mod_path, entry), report_conflicts)
+        else:
+            dst = os.path.join(mods_dest_path, os.path.basename(mod_file))
+            _add_target(targets, dst, (mod_path, None), report_conflicts)
+
+    return targets
+
+
+def _add_target(targets, dst, source, report_conflicts=True):
+    """
+    Add a destination to the plan, reporting when it replaces another mod's file.
+    """
+    previous = targets.pop(dst, None)
+    if report_conflicts and previous and previous[0] != source[0]:
+        print_colored(
+            f"    {os.path.basename(dst)} is provided by both "
+            f"{os.path.basename(previous[0])} and {os.path.basename(source[0])}, "
+            f"using {os.path.basename(source[0])}",
+            YELLOW,
+        )
+    # Re-insert so the dictionary keeps the order the files win in
+    targets[dst] = source
+
+
+def _expected_crc(source_path, entry):
+    return get_crc(source_path) if entry is None else entry.CRC
+
+
+def is_target_installed(dst, source_path, entry):
+    """
+    Check if a planned file is already installed with the right content.
+
+    The ledger is checked first, files it doesn't know about are hashed once.
+
+    Parameters
+    ----------
+    dst : str
+        The destination path.
+    source_path : str
+        The local .zip or .pak file it comes from.
+    entry : ArchiveEntry or None
+        The archive entry, or None for a loose file.
+
+    Returns
+    -------
+    bool
+        True if the file is in place and its hash matches.
+    """
+    crc = _expected_crc(source_path, entry)
+    if is_installed(dst, source_path, crc):
+        return True
+    # Not in the ledger yet (e.g. installed by an older version), hash it once
+    if os.path.exists(dst) and get_crc(dst) == crc:
+        record_install(dst, source_path, crc)
+        return True
+    return False
+
+
+def is_plan_installed(targets):
+    """
+    Check if every file of an install plan is installed and untouched, using
+    the installed files ledger and stat calls only.
+
+    Parameters
+    ----------
+    targets : dict
+        The plan returned by `plan_install`.
+
+    Returns
+    -------
+    bool
+        True if installing the plan would not change anything.
+    """
+    return all(
+        is_installed(dst, source_path, _expected_crc(source_path, entry))
+        for dst, (source_path, entry) in targets.items()
+    )
+
+
+def install_targets(targets, workers=DEFAULT_EXTRACT_WORKERS, show_progress=True):
+    """
+    Extract and copy planned files in parallel.
+
+    Each archive is handled by a single worker so it is only opened once, and
+    loose files are copied by their own worker. Loose files and stored
+    (uncompressed) entries are placed with `fast_copy`. Files that are already
+    installed with a matching hash are skipped, and every installed file is
+    recorded in the installed files ledger. Concurrent calls that install the
+    same destination, e.g. two mods with the same .pak, take turns on it.
+
+    Parameters
+    ----------
+    targets : dict
+        The plan returned by `plan_install`.
+    workers : int
+        The maximum number of archives extracted at once.
+    show_progress : bool
+        Whether to draw a progress bar, e.g. not while downloads draw theirs.
+
+    Returns
+    -------
+    dict
+        Counts of `extracted`, `copied` and `skipped` files.
+    """
+    from tqdm import tqdm
+
+    archives = {}
+    loose = []
+    for dst, (source_path, entry) in targets.items():
+        if entry is None:
+            loose.append((dst, source_path))
+        else:
+            archives.setdefault(source_path, []).append((entry, dst))
+
+    counts = {"extracted": 0, "copied": 0, "skipped": 0}
+    counts_lock = threading.Lock()
+
+    def count(key):
+        with counts_lock:
+            counts[key] += 1
+
+    total_size = sum(
+        entry.file_size if entry else os.path.getsize(source_path)
+        for source_path, entry in targets.values()
+    )
+
+    with tqdm(
+        total=total_size,
+        desc="  Installing",
+        unit="iB",
+        unit_scale=True,
+        unit_divisor=1024,
+        disable=not show_progress,
+    ) as bar:
+
+        def extract_archive(archive_path, entries):
+            with span("extract", "install", path=archive_path) as details:
+                details["bytes"] = _extract_archive(archive_path, entries)
+
+        def _extract_archive(archive_path, entries):
+            # Returns the number of bytes written, for the trace
+            written = 0
+            zip_ref = None
+            try:
+                for entry, dst in entries:
+                    # Another mod may be installing the same file right now
+                    with destination_lock(dst):
+                        if is_target_installed(dst, archive_path, entry):
+                            count("skipped")
+                            bar.update(entry.file_size)
+                            continue
+
+                        # Stored entries are plain bytes in the archive, copy them
+                        # in the kernel instead of streaming through zipfile
+                        if entry.compress_type == zipfile.ZIP_STORED:
+                            data_offset = get_stored_data_offset(
+                                archive_path, entry.header_offset
+                            )
+                            if data_offset is not None:
+                                fast_copy(
+                                    archive_path,
+                                    dst,
+                                    offset=data_offset,
+                                    length=entry.file_size,
+                                )
+                                record_crc(dst, entry.CRC)
+                                record_install(dst, archive_path, entry.CRC)
+                                count("extracted")
+                                bar.update(entry.file_size)
+                                written += entry.file_size
+                                continue
+
+                        if zip_ref is None:
+                            zip_ref = zipfile.ZipFile(archive_path, "r")
+                        # dst may be a hardlink shared with a downloaded file, so
+                        # never write into it
+                        temp_path = make_temp_path(dst)
+                        try:
+                            with zip_ref.open(entry.filename) as source, open(
+                                temp_path, "wb"
+                            ) as target:
+                                for chunk in iter(
+                                    lambda: source.read(1024 * 1024), b""
+                                ):
+                                    target.write(chunk)
+                                    bar.update(len(chunk))
+                            os.replace(temp_path, dst)
+                        except BaseException:
+                            # e.g. a corrupt entry, don't leave half of it behind
+                            if os.path.exists(temp_path):
+                                os.remove(temp_path)
+                            raise
+                        record_crc(dst, entry.CRC)
+                        record_install(dst, archive_path, entry.CRC)
+                        count("extracted")
+                        written += entry.file_size
+                return written
+            finally:
+                if zip_ref is not None:
+                    zip_ref.close()
+
+        def copy_file(dst, source_path):
+            size = os.path.getsize(source_path)
+            with destination_lock(dst):
+                if is_target_installed(dst, source_path, None):
+                    count("skipped")
+                else:
+                    with span("copy", "install", path=source_path, bytes=size):
+                        fast_copy(source_path, dst)
+                    crc = get_crc(source_path)
+                    record_crc(dst, crc)
+                    record_install(dst, source_path, crc)
+                    count("copied")
+            bar.update(size)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            futures = [
+                executor.submit(extract_archive, archive_path, entries)
+                for archive_path, entries in archives.items()
+            ]
+            futures += [
+                executor.submit(copy_file, dst, source_path)
+                for dst, source_path in loose
+            ]
+            for future in futures:
+                future.result()
+
+    return counts
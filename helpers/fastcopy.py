@@ -0,0 +1,250 @@
+import os
+import shutil
+import struct
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# ioctl number of FICLONE on Linux (_IOW(0x94, 9, int))
+FICLONE = 0x40049409
+
+# Cheapest first, the buffered copy always works
+STRATEGIES = ("hardlink", "reflink", "copy_file_range", "sendfile", "copy")
+
+# Files being written end with this until they're moved into place
+TEMP_SUFFIX = ".ron_mods_tmp"
+
+_lock = threading.Lock()
+# (source device, destination device) -> strategies known not to work there
+_unsupported = {}
+_stats = {}
+# Normalized destination path -> lock held while it is written
+_destination_locks = {}
+
+
+def _record(strategy):
+    with _lock:
+        _stats[strategy] = _stats.get(strategy, 0) + 1
+
+
+def destination_lock(dst):
+    """
+    Get the lock that serializes writes to a destination path.
+
+    Mods installed at the same time can provide the same file, holding this
+    lock while checking and writing it lets only one of them in at a time.
+
+    Parameters
+    ----------
+    dst : str
+        The destination path.
+
+    Returns
+    -------
+    threading.RLock
+        The lock for `dst`, the same one for every spelling of the path.
+    """
+    key = os.path.normcase(os.path.abspath(dst))
+    with _lock:
+        return _destination_locks.setdefault(key, threading.RLock())
+
+
+def make_temp_path(dst):
+    """
+    Create an empty temporary file next to `dst` that no other writer uses.
+
+    Parameters
+    ----------
+    dst : str
+        The destination path.
+
+    Returns
+    -------
+    str
+        The path of the temporary file, ending with `TEMP_SUFFIX`.
+    """
+    fd, temp_path = tempfile.mkstemp(
+        prefix=os.path.basename(dst) + ".",
+        suffix=TEMP_SUFFIX,
+        dir=os.path.dirname(dst) or ".",
+    )
+    os.close(fd)
+    return temp_path
+
+
+def _devices(src, dst):
+    return (os.stat(src).st_dev, os.stat(os.path.dirname(dst) or ".").st_dev)
+
+
+def _reflink(src, dst):
+    if fcntl is None:
+        raise OSError("reflinks are not supported on this platform")
+    with open(src, "rb") as source, open(dst, "wb") as target:
+        fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+
+
+def _copy_range(src, dst, offset, length, use_sendfile=False):
+    """
+    Copy `length` bytes starting at `offset` of `src` into a new file `dst`
+    inside the kernel, with copy_file_range or sendfile.
+    """
+    if use_sendfile:
+        if not hasattr(os, "sendfile"):
+            raise OSError("sendfile is not supported on this platform")
+    elif not hasattr(os, "copy_file_range"):
+        raise OSError("copy_file_range is not supported on this platform")
+
+    with open(src, "rb") as source, open(dst, "wb") as target:
+        remaining = length
+        while remaining:
+            if use_sendfile:
+                sent = os.sendfile(target.fileno(), source.fileno(), offset, remaining)
+            else:
+                sent = os.copy_file_range(
+                    source.fileno(), target.fileno(), remaining, offset
+                )
+            if sent == 0:
+                raise OSError(f"Unexpected end of {src}")
+            offset += sent
+            remaining -= sent
+
+
+def _buffered_copy_range(src, dst, offset, length):
+    with open(src, "rb") as source, open(dst, "wb") as target:
+        source.seek(offset)
+        remaining = length
+        while remaining:
+            chunk = source.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                raise OSError(f"Unexpected end of {src}")
+            target.write(chunk)
+            remaining -= len(chunk)
+
+
+def _place(src, temp_path, strategy, offset, length, whole_file):
+    if strategy == "hardlink":
+        os.link(src, temp_path)
+    elif strategy == "reflink":
+        _reflink(src, temp_path)
+    elif strategy == "copy_file_range":
+        _copy_range(src, temp_path, offset, length)
+    elif strategy == "sendfile":
+        _copy_range(src, temp_path, offset, length, use_sendfile=True)
+    elif whole_file:
+        shutil.copyfile(src, temp_path)
+    else:
+        _buffered_copy_range(src, temp_path, offset, length)
+
+
+def fast_copy(src, dst, allow_hardlink=True, offset=0, length=None):
+    """
+    Put a copy of a file (or a byte range of it) at `dst` as cheaply as the
+    filesystems allow.
+
+    Tries a hardlink, then a reflink (FICLONE), then an in-kernel copy with
+    copy_file_range or sendfile, and finally a buffered copy. Strategies that
+    fail are remembered per pair of filesystems so they aren't retried.
+    `dst` is replaced atomically, copies to the same `dst` from several
+    threads take turns.
+
+    Parameters
+    ----------
+    src : str
+        The file to copy.
+    dst : str
+        The destination path.
+    allow_hardlink : bool
+        Whether `dst` may share its data with `src`. Disable this for files
+        other programs may modify in place, e.g. game files.
+    offset : int
+        Where the data to copy starts in `src`.
+    length : int, optional
+        How many bytes to copy, the rest of the file if not given.
+
+    Returns
+    -------
+    str
+        The strategy that was used.
+    """
+    size = os.path.getsize(src)
+    if length is None:
+        length = size - offset
+    whole_file = offset == 0 and length == size
+
+    devices = _devices(src, dst)
+    with destination_lock(dst):
+        temp_path = make_temp_path(dst)
+
+        for strategy in STRATEGIES:
+            if strategy == "hardlink" and not allow_hardlink:
+                continue
+            # Links always share the whole file
+            if strategy in ("hardlink", "reflink") and not whole_file:
+                continue
+            with _lock:
+                if strategy in _unsupported.get(devices, ()):
+                    continue
+
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            try:
+                _place(src, temp_path, strategy, offset, length, whole_file)
+            except OSError:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                if strategy == "copy":
+                    raise
+                with _lock:
+                    _unsupported.setdefault(devices, set()).add(strategy)
+                continue
+
+            os.replace(temp_path, dst)
+            _record(strategy)
+            return strategy
+
+
+def get_stored_data_offset(archive_path, header_offset):
+    """
+    Find where the data of an uncompressed (stored) zip entry starts.
+
+    Parameters
+    ----------
+    archive_path : str
+        The path to the zip file.
+    header_offset : int
+        The offset of the entry's local file header.
+
+    Returns
+    -------
+    int
+        The offset of the entry's data.
+    None
+        If the entry is encrypted or the header is not valid.
+    """
+    with open(archive_path, "rb") as f:
+        f.seek(header_offset)
+        header = f.read(30)
+    if len(header) < 30 or header[:4] != b"PK\x03\x04":
+        return None
+
+    flags, name_length, extra_length = struct.unpack("<6xH18xHH", header)
+    if flags & 0x1:
+        return None  # Encrypted entries have to go through zipfile
+    return header_offset + 30 + name_length + extra_length
+
+
+def get_copy_stats():
+    """
+    Get how many files each copy strategy placed during this run.
+
+    Returns
+    -------
+    dict
+        Strategy name -> number of files.
+    """
+    with _lock:
+        return dict(_stats)
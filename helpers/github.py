@@ -3,16 +3,17 @@ import subprocess
 import sys
 from datetime import datetime, timedelta
 
-import requests
 import semver
 
-from helpers.config import save_config
+from helpers.bandwidth import PRIORITY_UPDATE
+from helpers.config import flush_config, save_config
+from helpers.http_client import get_session
 from helpers.print_colored import GREEN, RED, YELLOW, print_colored
 
 
 def check_for_update(repo):
     url = f"https://api.github.com/repos/{repo}/releases/latest"
-    response = requests.get(url)
+    response = get_session().get(url)
     if response.status_code == 200:
         latest_release = response.json()
         return (
@@ -23,11 +24,14 @@ def check_for_update(repo):
 
 
 def download_update(download_url, output_path):
-    response = requests.get(download_url, stream=True)
-    with open(output_path, "wb") as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            if chunk:
-                f.write(chunk)
+    from helpers.transfer import download_file
+
+    download_file(
+        download_url,
+        output_path,
+        desc=os.path.basename(output_path),
+        priority=PRIORITY_UPDATE,
+    )
 
 
 def auto_update(repo, current_version, app_path, config):
@@ -84,6 +88,7 @@ def auto_update(repo, current_version, app_path, config):
         print_colored("Update downloaded. Restarting...", GREEN)
         config["last_update_check"] = datetime.now().isoformat()
         save_config(config)
+        flush_config()
 
         subprocess.Popen([updater_path, temp_path])
         sys.exit(0)
@@ -0,0 +1,203 @@
+import hashlib
+import zlib
+
+from helpers.cache import (
+    cache_key,
+    cache_lock,
+    file_signature,
+    get_connection,
+    register_table,
+)
+from helpers.trace import span
+
+register_table(
+    """
+    CREATE TABLE IF NOT EXISTS file_hashes (
+        path TEXT PRIMARY KEY,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        inode INTEGER NOT NULL,
+        md5 TEXT,
+        crc INTEGER
+    )
+    """,
+)
+
+
+def _lookup(file_path, column):
+    """
+    Look up a cached hash, returning it only if the file is unchanged.
+
+    Returns
+    -------
+    tuple
+        The cache key, the current stat signature and the cached value (or None).
+    """
+    key = cache_key(file_path)
+    signature = file_signature(file_path)
+    if signature is None:
+        return key, None, None
+
+    with cache_lock():
+        row = (
+            get_connection()
+            .execute(
+                f"SELECT size, mtime_ns, inode, {column} FROM file_hashes WHERE path = ?",
+                (key,),
+            )
+            .fetchone()
+        )
+    if row and tuple(row[:3]) == signature:
+        return key, signature, row[3]
+    return key, signature, None
+
+
+def _store(key, signature, column, value):
+    """
+    Store a hash, dropping the other cached hash if the stat data changed.
+    """
+    with cache_lock():
+        connection = get_connection()
+        row = connection.execute(
+            "SELECT size, mtime_ns, inode FROM file_hashes WHERE path = ?", (key,)
+        ).fetchone()
+        if row and tuple(row) == signature:
+            connection.execute(
+                f"UPDATE file_hashes SET {column} = ? WHERE path = ?", (value, key)
+            )
+        else:
+            connection.execute(
+                f"INSERT OR REPLACE INTO file_hashes (path, size, mtime_ns, inode, {column})"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, *signature, value),
+            )
+        connection.commit()
+
+
+def get_md5(file_path):
+    """
+    Calculate the MD5 hash of a file.
+
+    The result is cached on disk and reused until the file's size, modification
+    time or inode changes.
+
+    Parameters
+    ----------
+    file_path : str
+        The path to the file.
+
+    Returns
+    -------
+    str
+        The MD5 hash of the file.
+    None
+        If the file does not exist.
+    """
+    key, signature, md5 = _lookup(file_path, "md5")
+    if signature is None:
+        return None
+    if md5 is not None:
+        return md5
+
+    with span("md5", "hash", path=file_path, bytes=signature[0]), open(
+        file_path, "rb"
+    ) as f:
+        hasher = hashlib.md5()
+        while chunk := f.read(1024 * 1024):
+            hasher.update(chunk)
+        md5 = hasher.hexdigest()
+
+    _store(key, signature, "md5", md5)
+    return md5
+
+
+def get_crc(file_path):
+    """
+    Calculate the CRC32 hash of a file.
+
+    The result is cached on disk and reused until the file's size, modification
+    time or inode changes.
+
+    Parameters
+    ----------
+    file_path : str
+        The path to the file.
+
+    Returns
+    -------
+    int
+        The CRC32 hash of the file.
+    None
+        If the file does not exist.
+    """
+    key, signature, crc = _lookup(file_path, "crc")
+    if signature is None:
+        return None
+    if crc is not None:
+        return crc
+
+    with span("crc", "hash", path=file_path, bytes=signature[0]), open(
+        file_path, "rb"
+    ) as f:
+        crc = 0
+        while chunk := f.read(1024 * 1024):
+            crc = zlib.crc32(chunk, crc)
+
+    _store(key, signature, "crc", crc)
+    return crc
+
+
+def record_md5(file_path, md5):
+    """
+    Record an MD5 hash that was computed elsewhere, e.g. while downloading.
+
+    Parameters
+    ----------
+    file_path : str
+        The path to the file.
+    md5 : str
+        The MD5 hash of the file as it is now on disk.
+    """
+    signature = file_signature(file_path)
+    if signature is not None:
+        _store(cache_key(file_path), signature, "md5", md5)
+
+
+def record_crc(file_path, crc):
+    """
+    Record a CRC32 hash that is already known, e.g. from a zip entry.
+
+    Parameters
+    ----------
+    file_path : str
+        The path to the file.
+    crc : int
+        The CRC32 hash of the file as it is now on disk.
+    """
+    signature = file_signature(file_path)
+    if signature is not None:
+        _store(cache_key(file_path), signature, "crc", crc)
+
+
+def prune_hash_cache():
+    """
+    Evict cached hashes for files that are gone or have changed on disk.
+
+    Returns
+    -------
+    int
+        The number of entries removed.
+    """
+    with cache_lock():
+        connection = get_connection()
+        rows = connection.execute(
+            "SELECT path, size, mtime_ns, inode FROM file_hashes"
+        ).fetchall()
+        stale = [
+            (path,)
+            for path, *signature in rows
+            if file_signature(path) != tuple(signature)
+        ]
+        connection.executemany("DELETE FROM file_hashes WHERE path = ?", stale)
+        connection.commit()
+    return len(stale)
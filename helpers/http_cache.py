@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from helpers.cache import cache_lock, get_connection, register_table
+from helpers.http_client import get_session
+
+# Response bodies live here, their validators in cache.db
+CACHE_DIR = ".http_cache"
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+# Headers worth replaying when a response is served from disk
+_KEPT_HEADERS = ("content-type", "etag", "last-modified")
+
+register_table(
+    """
+    CREATE TABLE IF NOT EXISTS http_cache (
+        key TEXT PRIMARY KEY,
+        url TEXT NOT NULL,
+        etag TEXT,
+        last_modified TEXT,
+        headers TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        last_used REAL NOT NULL
+    )
+    """,
+)
+
+
+def _body_path(key):
+    return os.path.join(CACHE_DIR, key)
+
+
+def _cache_key(url, headers):
+    # Responses fetched with different credentials are cached separately
+    auth = (headers or {}).get("Authorization", "")
+    return hashlib.sha1(f"{url}\n{auth}".encode()).hexdigest()
+
+
+def _cached_response(url, headers, body):
+    response = requests.Response()
+    response.status_code = 200
+    response.url = url
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = body
+    response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+    response.from_cache = True
+    return response
+
+
+def _evict(connection):
+    """
+    Drop least recently used responses until the cache fits its size limit.
+    """
+    total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache")
+    total = total.fetchone()[0]
+    if total <= MAX_CACHE_BYTES:
+        return
+
+    for key, size in connection.execute(
+        "SELECT key, size FROM http_cache ORDER BY last_used"
+    ).fetchall():
+        connection.execute("DELETE FROM http_cache WHERE key = ?", (key,))
+        if os.path.exists(_body_path(key)):
+            os.remove(_body_path(key))
+        total -= size
+        if total <= MAX_CACHE_BYTES:
+            break
+
+
+def cached_get(url, params=None, headers=None):
+    """
+    GET a URL, revalidating a locally cached copy with If-None-Match and
+    If-Modified-Since.
+
+    A 304 Not Modified is answered from disk, so an unchanged resource costs
+    a single small request. Only successful responses that carry an ETag or
+    Last-Modified header are stored.
+
+    Parameters
+    ----------
+    url : str
+        The URL to fetch.
+    params : dict, optional
+        Query string parameters.
+    headers : dict, optional
+        Extra request headers.
+
+    Returns
+    -------
+    requests.Response
+        The response, with `from_cache` set to True when served from disk.
+    """
+    full_url = requests.Request("GET", url, params=params).prepare().url
+    key = _cache_key(full_url, headers)
+    request_headers = dict(headers or {})
+
+    with cache_lock():
+        row = (
+            get_connection()
+            .execute(
+                "SELECT etag, last_modified, headers FROM http_cache WHERE key = ?",
+                (key,),
+            )
+            .fetchone()
+        )
+    if row and os.path.exists(_body_path(key)):
+        etag, last_modified, _ = row
+        if etag:
+            request_headers["If-None-Match"] = etag
+        if last_modified:
+            request_headers["If-Modified-Since"] = last_modified
+    else:
+        row = None
+
+    response = get_session().get(full_url, headers=request_headers)
+
+    if response.status_code == 304 and row:
+        with open(_body_path(key), "rb") as f:
+            body = f.read()
+        with cache_lock():
+            connection = get_connection()
+            connection.execute(
+                "UPDATE http_cache SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            connection.commit()
+        cached_headers = json.loads(row[2])
+        # Rate limit headers describe this request, not the cached one
+        cached_headers.update(
+            (name, value)
+            for name, value in response.headers.items()
+            if name.lower().startswith("x-ratelimit")
+        )
+        return _cached_response(full_url, cached_headers, body)
+
+    etag = response.headers.get("etag")
+    last_modified = response.headers.get("last-modified")
+    if response.status_code == 200 and (etag or last_modified):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        temp_path = _body_path(key) + ".tmp"
+        with open(temp_path, "wb") as f:
+            f.write(response.content)
+        os.replace(temp_path, _body_path(key))
+
+        kept_headers = {
+            name: response.headers[name]
+            for name in _KEPT_HEADERS
+            if name in response.headers
+        }
+        with cache_lock():
+            connection = get_connection()
+            connection.execute(
+                "INSERT OR REPLACE INTO http_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    full_url,
+                    etag,
+                    last_modified,
+                    json.dumps(kept_headers),
+                    len(response.content),
+                    time.time(),
+                ),
+            )
+            _evict(connection)
+            connection.commit()
+
+    response.from_cache = False
+    return response
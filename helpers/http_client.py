@@ -0,0 +1,137 @@
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (10, 60)
+DEFAULT_RETRIES = 3
+
+# Enough keep-alive connections per host for the parallel downloaders
+POOL_MAXSIZE = 16
+
+USER_AGENT = "RoNModsDownloader"
+
+_session = None
+_adapter = None
+_lock = threading.Lock()
+_stats = {"requests": 0, "connections_opened": 0}
+
+
+def _count(key):
+    with _lock:
+        _stats[key] += 1
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _count("connections_opened")
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _count("connections_opened")
+        return super()._new_conn()
+
+
+class _PooledAdapter(HTTPAdapter):
+    """
+    An adapter that applies a default timeout, counts requests and counts the
+    connections its pools open.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, **kwargs):
+        self.timeout = timeout
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+    def send(self, request, timeout=None, **kwargs):
+        _count("requests")
+        return super().send(request, timeout=timeout or self.timeout, **kwargs)
+
+
+def _build_retry(retries):
+    # Only idempotent requests are retried, subscribe/unsubscribe are not.
+    # 429s are left to the caller instead of sleeping for however long
+    # Retry-After says inside the request, the mod.io client waits for them
+    # with a bound and for every request at once
+    return Retry(
+        total=retries,
+        backoff_factor=0.5,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD", "OPTIONS"}),
+        raise_on_status=False,
+        respect_retry_after_header=False,
+    )
+
+
+def get_session():
+    """
+    Get the HTTP session shared by every helper.
+
+    Connections are pooled and kept alive per host, requests get a default
+    timeout and idempotent requests are retried with backoff.
+
+    Returns
+    -------
+    requests.Session
+        The shared session.
+    """
+    global _session, _adapter
+    with _lock:
+        if _session is None:
+            _adapter = _PooledAdapter(
+                max_retries=_build_retry(DEFAULT_RETRIES),
+                pool_connections=8,
+                pool_maxsize=POOL_MAXSIZE,
+            )
+            _session = requests.Session()
+            _session.headers["User-Agent"] = USER_AGENT
+            _session.mount("http://", _adapter)
+            _session.mount("https://", _adapter)
+        return _session
+
+
+def configure_http(timeout=None, retries=None):
+    """
+    Change the default timeout and retry count of the shared session.
+
+    Parameters
+    ----------
+    timeout : float or tuple, optional
+        The timeout in seconds, or a `(connect, read)` tuple.
+    retries : int, optional
+        How many times idempotent requests are retried.
+    """
+    get_session()
+    if timeout:
+        _adapter.timeout = tuple(timeout) if isinstance(timeout, list) else timeout
+    if retries is not None:
+        _adapter.max_retries = _build_retry(int(retries))
+
+
+def get_http_stats():
+    """
+    Get the connection counters of the shared session.
+
+    Returns
+    -------
+    dict
+        The number of `requests` sent, `connections_opened` and
+        `connections_reused`.
+    """
+    with _lock:
+        stats = dict(_stats)
+    stats["connections_reused"] = max(
+        0, stats["requests"] - stats["connections_opened"]
+    )
+    return stats
@@ -0,0 +1,255 @@
+import os
+import shutil
+
+from helpers.extract import INCOMPLETE_SUFFIXES, plan_install
+from helpers.ledger import forget_install, get_installed_files, is_unchanged
+from helpers.planner import BACKUP_SUFFIX, plan_operations
+from helpers.print_colored import CYAN, YELLOW, print_colored
+
+
+def get_mod_files(mods_down_path):
+    """
+    List the mod files directly in the local mods folder.
+
+    Parameters
+    ----------
+    mods_down_path : str
+        The local mods folder.
+
+    Returns
+    -------
+    list of str
+        The file names, without folders and unfinished downloads.
+    """
+    mod_files = os.listdir(mods_down_path)
+    # Remove directories from mod_files
+    mod_files = [
+        f
+        for f in mod_files
+        if not os.path.isdir(os.path.join(mods_down_path, f))
+        and not f.endswith(INCOMPLETE_SUFFIXES)
+    ]
+
+    return mod_files
+
+
+def gather_mods(mods_down_path):
+    """
+    List the subscribed and manually added mod files.
+
+    Parameters
+    ----------
+    mods_down_path : str
+        The local mods folder.
+
+    Returns
+    -------
+    list of str
+        The mod files, relative to `mods_down_path`.
+    """
+    mod_files = get_mod_files(mods_down_path)
+
+    # Add files in mods_down_path/_manual to mod_files
+    manual_path = os.path.join(mods_down_path, "_manual")
+    if os.path.exists(manual_path):
+        manual_files = []
+        for root, dirs, files in os.walk(manual_path):
+            for file in files:
+                if file.endswith(INCOMPLETE_SUFFIXES):
+                    continue
+
+                # Construct the relative path from the manual_path
+                relative_path = os.path.relpath(
+                    os.path.join(root, file), mods_down_path
+                )
+                manual_files.append(relative_path)
+
+        # Ensure mod_files has the path with subdirectory when extending
+        mod_files.extend(manual_files)
+
+    return mod_files
+
+
+def add_enabled_collections(mod_files, collections):
+    """
+    Add the mods of every enabled collection to a list of mod files.
+
+    Parameters
+    ----------
+    mod_files : list of str
+        The mod files, relative to `mods_down_path`.
+    collections : dict
+        The collections from the config file.
+
+    Returns
+    -------
+    list of str
+        A new list with the collections' mods appended.
+    """
+    mod_files = list(mod_files)
+    for collection in collections:
+        if collections[collection]["enabled"]:
+            collection_path = os.path.join("_collections", collection)
+            for mod in collections[collection]["mods"]:
+                mod_files.append(os.path.join(collection_path, mod))
+    return mod_files
+
+
+def get_overrides(mods_down_path, game_path):
+    """
+    Map every game file replaced by an override to the override.
+
+    Parameters
+    ----------
+    mods_down_path : str
+        The local mods folder.
+    game_path : str
+        The game's install folder.
+
+    Returns
+    -------
+    dict
+        Game file path -> override file path.
+    """
+    overrides = {}
+    overrides_path = os.path.join(mods_down_path, "_overrides")
+    for root, _, files in os.walk(overrides_path):
+        for file in files:
+            if ".gitkeep" in file or file.endswith(INCOMPLETE_SUFFIXES):
+                continue
+
+            src = os.path.join(root, file)
+            dst = os.path.join(game_path, os.path.relpath(src, start=overrides_path))
+            overrides[dst] = src
+    return overrides
+
+
+def plan_mods(
+    mod_files,
+    collections,
+    mods_down_path,
+    game_path,
+    mods_dest_path,
+    savegames_dest_path,
+):
+    """
+    Work out what installing the mods would change in the game folders.
+
+    Parameters
+    ----------
+    mod_files : list of str
+        The mod files, relative to `mods_down_path`.
+    collections : dict
+        The collections from the config file, the enabled ones are installed.
+    mods_down_path : str
+        The local mods folder.
+    game_path : str
+        The game's install folder, overrides are relative to it.
+    mods_dest_path : str
+        The game's ~mods folder.
+    savegames_dest_path : str
+        The game's SaveGames folder.
+
+    Returns
+    -------
+    list of Operation
+        The plan returned by `plan_operations`.
+    """
+    targets = plan_install(
+        add_enabled_collections(mod_files, collections),
+        mods_down_path,
+        mods_dest_path,
+        savegames_dest_path,
+    )
+
+    # Installed files nothing provides anymore. Save games are only removed if
+    # the game hasn't written to them since
+    removable = get_installed_files(folder=mods_dest_path)
+    removable += [
+        path
+        for path in get_installed_files(folder=savegames_dest_path)
+        if is_unchanged(path)
+    ]
+    # Disabled collections may have been installed before the ledger existed.
+    # Their save games are never removed that way, they're in the ledger if
+    # they're ours
+    disabled = [
+        os.path.join("_collections", collection, mod)
+        for collection in collections
+        if not collections[collection]["enabled"]
+        for mod in collections[collection]["mods"]
+    ]
+    removable += [
+        dst
+        for dst in plan_install(
+            disabled,
+            mods_down_path,
+            mods_dest_path,
+            savegames_dest_path,
+            report_conflicts=False,
+        )
+        if os.path.dirname(dst) == mods_dest_path
+    ]
+
+    overrides = get_overrides(mods_down_path, game_path)
+    return plan_operations(targets, overrides, removable)
+
+
+def uninstall_mods(mods_dest_path, mods_down_path, game_path):
+    """
+    Remove the installed mods from ~mods and restore the overridden game files.
+
+    Save games are left alone, the game may have written to them since.
+
+    Parameters
+    ----------
+    mods_dest_path : str
+        The game's ~mods folder.
+    mods_down_path : str
+        The local mods folder.
+    game_path : str
+        The game's install folder.
+    """
+    installed_files = get_installed_files(folder=mods_dest_path)
+
+    if installed_files:
+        print_colored("Uninstalling mods...", CYAN)
+        for dst in installed_files:
+            if os.path.exists(dst):
+                print(f"  Removing {os.path.basename(dst)}")
+                os.remove(dst)
+            forget_install(dst)
+    elif os.listdir(mods_dest_path):
+        # Installed by a version without the ledger, so we can't tell which
+        # files are ours
+        print_colored("Uninstalling mods...", CYAN)
+        for mod_file in os.listdir(mods_dest_path):
+            print(f"  Removing {mod_file}")
+            os.remove(os.path.join(mods_dest_path, mod_file))
+    else:
+        print_colored("No mods installed, nothing to do.", YELLOW)
+
+    # Uninstall overrides
+    overrides_path = os.path.join(mods_down_path, "_overrides")
+    if os.path.exists(overrides_path):
+        print_colored("Restoring overrides...", CYAN)
+        for root, _, files in os.walk(overrides_path):
+            for file in files:
+                if ".gitkeep" in file:
+                    continue
+
+                dst = os.path.join(
+                    game_path,
+                    os.path.relpath(os.path.join(root, file), start=overrides_path),
+                )
+
+                if os.path.exists(dst + BACKUP_SUFFIX):
+                    if os.path.exists(dst):
+                        print(f"  Removing {os.path.relpath(dst, start=game_path)}")
+                        os.remove(dst)
+
+                    print(
+                        f"  Restoring backup of {os.path.relpath(dst, start=game_path)}"
+                    )
+                    shutil.move(dst + BACKUP_SUFFIX, dst)
+        print("")
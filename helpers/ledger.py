@@ -0,0 +1,180 @@
+import os
+
+from helpers.cache import (
+    cache_key,
+    cache_lock,
+    file_signature,
+    get_connection,
+    register_table,
+)
+
+# Each row is a file installed into ~mods or SaveGames, the mod file it came
+# from, its CRC32 and the stat data it had right after it was installed
+register_table(
+    """
+    CREATE TABLE IF NOT EXISTS installed_files (
+        path TEXT PRIMARY KEY,
+        source TEXT NOT NULL,
+        crc INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL,
+        inode INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS installed_files_source ON installed_files (source)",
+)
+
+
+def record_install(file_path, source_path, crc):
+    """
+    Record that a file was installed from a mod file.
+
+    Parameters
+    ----------
+    file_path : str
+        The installed file.
+    source_path : str
+        The local .zip or .pak file it came from.
+    crc : int
+        The CRC32 hash of the installed file.
+    """
+    signature = file_signature(file_path)
+    if signature is None:
+        return
+    with cache_lock():
+        connection = get_connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO installed_files VALUES (?, ?, ?, ?, ?, ?)",
+            (cache_key(file_path), cache_key(source_path), crc, *signature),
+        )
+        connection.commit()
+
+
+def forget_install(file_path):
+    """
+    Forget an installed file, e.g. after removing it.
+
+    Parameters
+    ----------
+    file_path : str
+        The installed file.
+    """
+    with cache_lock():
+        connection = get_connection()
+        connection.execute(
+            "DELETE FROM installed_files WHERE path = ?", (cache_key(file_path),)
+        )
+        connection.commit()
+
+
+def is_installed(file_path, source_path, crc):
+    """
+    Check if a file was installed from a mod file and is untouched since.
+
+    Only the ledger and a stat call are used, nothing is hashed.
+
+    Parameters
+    ----------
+    file_path : str
+        The installed file.
+    source_path : str
+        The local .zip or .pak file it should come from.
+    crc : int
+        The CRC32 hash it should have.
+
+    Returns
+    -------
+    bool
+        True if the ledger matches and the file has not changed on disk.
+    """
+    with cache_lock():
+        row = (
+            get_connection()
+            .execute(
+                "SELECT source, crc, size, mtime_ns, inode FROM installed_files"
+                " WHERE path = ?",
+                (cache_key(file_path),),
+            )
+            .fetchone()
+        )
+    return (
+        row is not None
+        and row[0] == cache_key(source_path)
+        and row[1] == crc
+        and tuple(row[2:]) == file_signature(file_path)
+    )
+
+
+def is_unchanged(file_path):
+    """
+    Check if an installed file still has the stat data it had after install.
+
+    Parameters
+    ----------
+    file_path : str
+        The installed file.
+
+    Returns
+    -------
+    bool
+        True if the file is in the ledger and hasn't changed on disk.
+    """
+    with cache_lock():
+        row = (
+            get_connection()
+            .execute(
+                "SELECT size, mtime_ns, inode FROM installed_files WHERE path = ?",
+                (cache_key(file_path),),
+            )
+            .fetchone()
+        )
+    return row is not None and tuple(row) == file_signature(file_path)
+
+
+def get_installed_files(source_path=None, folder=None):
+    """
+    Get the files recorded as installed.
+
+    Parameters
+    ----------
+    source_path : str, optional
+        Only return the files installed from this mod file.
+    folder : str, optional
+        Only return the files installed directly into this folder.
+
+    Returns
+    -------
+    list of str
+        The paths of the installed files.
+    """
+    with cache_lock():
+        connection = get_connection()
+        if source_path is None:
+            rows = connection.execute("SELECT path FROM installed_files")
+        else:
+            rows = connection.execute(
+                "SELECT path FROM installed_files WHERE source = ?",
+                (cache_key(source_path),),
+            )
+        paths = [path for (path,) in rows.fetchall()]
+    if folder is not None:
+        paths = [path for path in paths if os.path.dirname(path) == cache_key(folder)]
+    return paths
+
+
+def prune_ledger():
+    """
+    Forget installed files that were removed outside of the downloader.
+
+    Returns
+    -------
+    int
+        The number of entries removed.
+    """
+    with cache_lock():
+        connection = get_connection()
+        rows = connection.execute("SELECT path FROM installed_files").fetchall()
+        stale = [(path,) for (path,) in rows if not os.path.exists(path)]
+        connection.executemany("DELETE FROM installed_files WHERE path = ?", stale)
+        connection.commit()
+    return len(stale)
@@ -1,46 +1,371 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
 
 from helpers.config import create_oauth_token, get_oauth_token, read_config, save_config
+from helpers.http_cache import cached_get
+from helpers.http_client import get_session
+from helpers.trace import span
 
-MODIO_API_URL = "https://api.mod.io/v1"
+# Overridable so the client can be pointed at a local stand-in of the API
+MODIO_API_URL = os.environ.get("MODIO_API_URL", "https://api.mod.io/v1")
+GAME_ID = 3791
 
+# mod.io caps _limit at 100 results per page
+SUBSCRIPTIONS_PAGE_SIZE = 100
+SUBSCRIPTIONS_PAGE_WORKERS = 4
 
-def get_subscriptions():
+# How often the incremental sync is backed up by a full subscription fetch
+FULL_SYNC_INTERVAL_HOURS = 24
+# Allowance for clock differences between us and mod.io when asking for events
+EVENTS_CLOCK_SKEW = 5 * 60
+
+USER_EVENT_TYPES = ("USER_SUBSCRIBE", "USER_UNSUBSCRIBE")
+MOD_EVENT_TYPES = ("MODFILE_CHANGED", "MOD_UNAVAILABLE", "MOD_DELETED")
+
+# Requests per minute until mod.io's X-RateLimit-Limit header says otherwise
+DEFAULT_REQUESTS_PER_MINUTE = 60
+# The period X-RateLimit-Limit counts requests over
+RATE_LIMIT_WINDOW = 60
+# How often a rate limited (HTTP 429) request is tried in total
+MAX_ATTEMPTS = 4
+# Wait this long after a 429 without a Retry-After header
+DEFAULT_RETRY_AFTER = 60
+# Give up instead of waiting longer than this for the rate limit to reset
+MAX_RETRY_AFTER = 120
+
+UNAUTHORIZED_MESSAGE = "Unauthorized access. Please update your OAuth token."
+UNAUTHORIZED_WRITE_MESSAGE = (
+    "Unauthorized access. Please update your token and make sure it has write access."
+)
+
+
+class ModioError(requests.exceptions.HTTPError):
     """
-    Retrieves the list of subscribed mods from the mod.io API.
+    A mod.io API request failed, `response` holds the error response, or None
+    if the request was never sent.
+    """
+
+
+class ModioAuthError(ModioError):
+    """mod.io rejected the OAuth token (HTTP 401)."""
+
+
+class ModioRateLimitError(ModioError):
+    """
+    mod.io kept rate limiting a request (HTTP 429) after every retry, or asked
+    to wait longer than `MAX_RETRY_AFTER` seconds.
+    """
+
+
+def _header_int(response, name):
+    value = response.headers.get(name, "").strip()
+    return int(value) if value.isdigit() else None
+
+
+class _RateLimiter:
+    """
+    A token bucket shared by every mod.io request.
+
+    The bucket starts at `DEFAULT_REQUESTS_PER_MINUTE` and follows the
+    X-RateLimit-Limit and X-RateLimit-Remaining headers of each response.
+    A 429, or no requests remaining, pauses every request until the time
+    given by Retry-After or X-RateLimit-RetryAfter has passed, unless that
+    is more than `MAX_RETRY_AFTER` seconds away.
+    """
+
+    def __init__(self, per_minute=DEFAULT_REQUESTS_PER_MINUTE):
+        self._capacity = per_minute
+        self._tokens = float(per_minute)
+        self._updated = time.monotonic()
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self, request=""):
+        """
+        Wait until a request may be sent.
+
+        Parameters
+        ----------
+        request : str
+            What is about to be sent, for the error message.
+
+        Raises
+        ------
+        ModioRateLimitError
+            If requests are paused for longer than `MAX_RETRY_AFTER` seconds.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self._capacity,
+                    self._tokens
+                    + (now - self._updated) * self._capacity / RATE_LIMIT_WINDOW,
+                )
+                self._updated = now
+                wait = self._resume_at - now
+                if wait > MAX_RETRY_AFTER:
+                    raise ModioRateLimitError(
+                        f"Rate limited by mod.io, retry in {wait:.0f}s: {request}"
+                    )
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) * RATE_LIMIT_WINDOW / self._capacity
+            time.sleep(wait)
+
+    def update(self, response):
+        """
+        Adapt to the rate limit headers of a response.
+
+        Returns
+        -------
+        float
+            How many seconds requests are paused for, 0 if they aren't.
+        """
+        limit = _header_int(response, "X-RateLimit-Limit")
+        remaining = _header_int(response, "X-RateLimit-Remaining")
+        retry_after = _header_int(response, "Retry-After")
+        if retry_after is None:
+            retry_after = _header_int(response, "X-RateLimit-RetryAfter")
+
+        with self._lock:
+            now = time.monotonic()
+            if limit:
+                self._capacity = limit
+            if remaining is not None:
+                # mod.io knows best, e.g. when other clients share the token
+                self._tokens = float(min(remaining, self._capacity))
+            if response.status_code == 429 or remaining == 0:
+                if retry_after is None:
+                    retry_after = DEFAULT_RETRY_AFTER if remaining is None else 1
+                self._resume_at = max(self._resume_at, now + retry_after)
+            return max(0.0, self._resume_at - now)
+
+
+_limiter = _RateLimiter()
+
+
+def _error_message(response):
+    try:
+        return response.json()["error"]["message"]
+    except (ValueError, KeyError, TypeError):
+        return response.reason
+
+
+def _request(method, path, oauth_token, params=None, headers=None, cached=False):
+    """
+    Send a request to the mod.io API, waiting for the rate limit.
+
+    Rate limited requests are retried up to `MAX_ATTEMPTS` times, as long as
+    mod.io asks to wait no longer than `MAX_RETRY_AFTER` seconds.
+
+    Parameters
+    ----------
+    method : str
+        The HTTP method.
+    path : str
+        The endpoint path, e.g. "/me/subscribed".
+    oauth_token : str
+        The OAuth token.
+    params : dict, optional
+        Query string parameters.
+    headers : dict, optional
+        Extra request headers.
+    cached : bool
+        Revalidate a cached copy of the response instead of fetching it
+        again, only for GET requests.
 
     Returns
     -------
-    list of dict
-        A list of dictionaries containing information about the subscribed mods.
+    requests.Response
+        The successful response.
+
+    Raises
+    ------
+    ModioAuthError
+        If the OAuth token was rejected.
+    ModioRateLimitError
+        If the request was still rate limited after every attempt.
+    ModioError
+        If mod.io answered with any other error.
+    requests.exceptions.RequestException
+        If mod.io couldn't be reached.
     """
-    oauth_token = get_oauth_token()
+    url = f"{MODIO_API_URL}{path}"
+    headers = {"Authorization": f"Bearer {oauth_token}", **(headers or {})}
+
+    for attempt in range(MAX_ATTEMPTS):
+        _limiter.acquire(f"{method} {path}")
+        if cached:
+            response = cached_get(url, params=params, headers=headers)
+        else:
+            response = get_session().request(
+                method, url, params=params, headers=headers
+            )
+        wait = _limiter.update(response)
+
+        if response.status_code == 429:
+            if attempt + 1 < MAX_ATTEMPTS and wait <= MAX_RETRY_AFTER:
+                continue  # acquire() waits until the limit resets
+            raise ModioRateLimitError(
+                f"Rate limited by mod.io, retry in {wait:.0f}s: {method} {path}",
+                response=response,
+            )
+        if response.status_code == 401:
+            raise ModioAuthError(
+                f"401 Unauthorized: {_error_message(response)}", response=response
+            )
+        if not response.ok:
+            raise ModioError(
+                f"{response.status_code} {_error_message(response)}: {method} {path}",
+                response=response,
+            )
+        return response
+
 
+def _with_login(call, message=UNAUTHORIZED_MESSAGE):
+    """
+    Call `call(oauth_token)`, logging in again once if the token is rejected.
+    """
     try:
-        response = requests.get(
-            f"{MODIO_API_URL}/me/subscribed?game_id=3791",
-            headers={"Authorization": f"Bearer {oauth_token}"},
+        return call(get_oauth_token())
+    except ModioAuthError:
+        print("")
+        print(message)
+        oauth_token = create_oauth_token()
+        # Clear the screen
+        print("\033[H\033[J")
+        return call(oauth_token)
+
+
+def _get_page(path, oauth_token, params, offset, cached=True):
+    """
+    Fetch a single page of a paginated mod.io endpoint.
+
+    Parameters
+    ----------
+    path : str
+        The endpoint path, e.g. "/me/subscribed".
+    oauth_token : str
+        The OAuth token.
+    params : dict
+        The filters to apply.
+    offset : int
+        The `_offset` of the first result on the page.
+    cached : bool
+        Revalidate a cached copy of the page. Queries that differ on every
+        call, like events since the last sync, would only fill the cache.
+
+    Returns
+    -------
+    dict
+        The decoded response, including `data` and the `result_*` fields.
+    """
+    with span("fetch page", "modio", url=path, offset=offset) as details:
+        response = _request(
+            "GET",
+            path,
+            oauth_token,
+            params={**params, "_limit": SUBSCRIPTIONS_PAGE_SIZE, "_offset": offset},
+            cached=cached,
         )
-        response.raise_for_status()
-    except requests.exceptions.HTTPError as http_err:
-        if response.status_code == 401:
-            print("")
-            print("Unauthorized access. Please update your OAuth token.")
-            create_oauth_token()
-            # Clear the screen
-            print("\033[H\033[J")
-            # Retry the request
-            return get_subscriptions()
-        else:
-            print(f"HTTP error occurred: {http_err}")
-        return []
-    except Exception as err:
-        print(f"An error occurred: {err}")
-        return []
+        details["bytes"] = len(response.content)
+        return response.json()
 
-    subscriptions = response.json()["data"]
 
-    return subscriptions
+def _iter_paginated(path, oauth_token, params, cached=True):
+    """
+    Yields every result of a paginated mod.io endpoint.
+
+    The first page is fetched to learn `result_total`, the remaining pages are
+    then fetched concurrently and yielded in order as soon as each one arrives.
+    `cached` is passed on to `_get_page`.
+    """
+    first_page = _get_page(path, oauth_token, params, 0, cached)
+    seen = set()
+
+    def unseen(results):
+        # Pages can shift if results change mid-fetch, skip duplicates
+        for result in results:
+            if result["id"] not in seen:
+                seen.add(result["id"])
+                yield result
+
+    yield from unseen(first_page["data"])
+
+    total = first_page.get("result_total", len(first_page["data"]))
+    limit = first_page.get("result_limit") or SUBSCRIPTIONS_PAGE_SIZE
+    offsets = range(limit, total, limit)
+    if not offsets:
+        return
+
+    with ThreadPoolExecutor(
+        max_workers=min(SUBSCRIPTIONS_PAGE_WORKERS, len(offsets))
+    ) as executor:
+        pages = [
+            executor.submit(_get_page, path, oauth_token, params, offset, cached)
+            for offset in offsets
+        ]
+        for page in pages:
+            yield from unseen(page.result()["data"])
+
+
+def iter_subscriptions(oauth_token=None):
+    """
+    Yields the subscribed mods from the mod.io API, page by page.
+
+    The first page is fetched to learn `result_total`, the remaining pages are
+    then fetched concurrently and yielded in order as soon as each one arrives.
+
+    Parameters
+    ----------
+    oauth_token : str, optional
+        The OAuth token, read from the .auth file if not given.
+
+    Yields
+    ------
+    dict
+        Information about a subscribed mod.
+
+    Raises
+    ------
+    ModioError
+        If mod.io answered any page with an error.
+    requests.exceptions.RequestException
+        If any page could not be fetched.
+    """
+    if oauth_token is None:
+        oauth_token = get_oauth_token()
+
+    yield from _iter_paginated("/me/subscribed", oauth_token, {"game_id": GAME_ID})
+
+
+def get_subscriptions():
+    """
+    Retrieves the list of subscribed mods from the mod.io API.
+
+    If the OAuth token is rejected, a new one is created once and the
+    request retried.
+
+    Returns
+    -------
+    list of dict
+        A list of dictionaries containing information about the subscribed mods.
+
+    Raises
+    ------
+    ModioError
+        If mod.io answered with an error, e.g. it kept rate limiting us.
+    requests.exceptions.RequestException
+        If mod.io couldn't be reached.
+    """
+    return _with_login(lambda oauth_token: list(iter_subscriptions(oauth_token)))
 
 
 def subscribe_to_mod(mod_id):
@@ -57,37 +382,28 @@ def subscribe_to_mod(mod_id):
     bool
         True if the subscription was successful, False otherwise.
     """
-    oauth_token = get_oauth_token()
 
-    try:
-        response = requests.post(
-            f"{MODIO_API_URL}/games/@readyornot/mods/@{mod_id}/subscribe",
+    def subscribe(oauth_token):
+        _request(
+            "POST",
+            f"/games/@readyornot/mods/@{mod_id}/subscribe",
+            oauth_token,
             headers={
-                "Authorization": f"Bearer {oauth_token}",
                 "Content-Type": "application/x-www-form-urlencoded",
                 "Accept": "application/json",
             },
         )
-        response.raise_for_status()
+
+    try:
+        _with_login(subscribe, UNAUTHORIZED_WRITE_MESSAGE)
         return True
-    except requests.exceptions.HTTPError as http_err:
-        if response.status_code == 401:
-            print("")
-            print(
-                "Unauthorized access. Please update your token and make sure it has write access."
-            )
-            create_oauth_token()
-            # Clear the screen
-            print("\033[H\033[J")
-            # Retry the request
-            return subscribe_to_mod(mod_id)
+    except ModioError as err:
         # 403 can happen when the mod is either "hidden" or there was a DMCA takedown request
         # Just continue if this happens
-        elif response.status_code == 403:
+        if err.response is not None and err.response.status_code == 403:
             return True
-        else:
-            print(f"HTTP error occurred: {http_err}")
-    except Exception as err:
+        print(f"HTTP error occurred: {err}")
+    except requests.exceptions.RequestException as err:
         print(f"An error occurred: {err}")
 
     return False
@@ -107,44 +423,198 @@ def unsubscribe_from_mod(mod_id):
     bool
         True if the unsubscription was successful, False otherwise.
     """
-    oauth_token = get_oauth_token()
 
-    try:
-        response = requests.delete(
-            f"{MODIO_API_URL}/games/@readyornot/mods/@{mod_id}/subscribe",
-            headers={
-                "Authorization": f"Bearer {oauth_token}",
-                "Content-Type": "application/x-www-form-urlencoded",
-            },
+    def unsubscribe(oauth_token):
+        _request(
+            "DELETE",
+            f"/games/@readyornot/mods/@{mod_id}/subscribe",
+            oauth_token,
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
         )
-        response.raise_for_status()
+
+    try:
+        _with_login(unsubscribe, UNAUTHORIZED_WRITE_MESSAGE)
         return True
-    except requests.exceptions.HTTPError as http_err:
-        if response.status_code == 401:
-            print("")
-            print(
-                "Unauthorized access. Please update your token and make sure it has write access."
-            )
-            create_oauth_token()
-            # Clear the screen
-            print("\033[H\033[J")
-            # Retry the request
-            return unsubscribe_from_mod(mod_id)
+    except ModioError as err:
         # If error 400, "The requested user is not currently subscribed to the requested mod." so we can return True
-        elif response.status_code == 400:
+        if err.response is not None and err.response.status_code == 400:
             return True
-        else:
-            print(f"HTTP error occurred: {http_err}")
-    except Exception as err:
+        print(f"HTTP error occurred: {err}")
+    except requests.exceptions.RequestException as err:
         print(f"An error occurred: {err}")
 
     return False
 
 
+def _get_mod(oauth_token, mod_id):
+    """
+    Fetch a single mod, including its current modfile.
+    """
+    return _request("GET", f"/games/{GAME_ID}/mods/{mod_id}", oauth_token).json()
+
+
+def _subscription_from_config(entry):
+    """
+    Rebuild the parts of a subscription the downloader uses from its config entry.
+    """
+    return {
+        "id": entry["id"],
+        "name_id": entry["name_id"],
+        "modfile": {
+            "filename": entry["file"],
+            "filesize": entry.get("size"),
+            "filehash": {"md5": entry["md5"]},
+            "download": {"binary_url": entry["download"]},
+        },
+    }
+
+
+def _get_changed_subscriptions(config, oauth_token, since):
+    """
+    Work out the current subscriptions from the ones stored in the config and
+    the user and mod events mod.io recorded since the last sync.
+
+    Returns
+    -------
+    tuple
+        The updated list of subscriptions and the number of mods that changed.
+    """
+    known = {
+        entry["id"]: _subscription_from_config(entry)
+        for entry in config["subscribed_mods"].values()
+    }
+
+    # Subscribes and unsubscribes, applied in the order they happened
+    user_events = _iter_paginated(
+        "/me/events",
+        oauth_token,
+        {
+            "game_id": GAME_ID,
+            "date_added-min": since,
+            "event_type-in": ",".join(USER_EVENT_TYPES),
+        },
+        cached=False,
+    )
+    subscribed = {}
+    for event in sorted(user_events, key=lambda e: (e["date_added"], e["id"])):
+        subscribed[event["mod_id"]] = event["event_type"] == "USER_SUBSCRIBE"
+
+    refresh = {mod_id for mod_id, is_sub in subscribed.items() if is_sub}
+    removed = {mod_id for mod_id, is_sub in subscribed.items() if not is_sub}
+
+    # New modfiles and removals of mods we're still subscribed to
+    watched = sorted(set(known) - removed)
+    for start in range(0, len(watched), SUBSCRIPTIONS_PAGE_SIZE):
+        mod_events = _iter_paginated(
+            f"/games/{GAME_ID}/mods/events",
+            oauth_token,
+            {
+                "mod_id-in": ",".join(
+                    str(mod_id)
+                    for mod_id in watched[start : start + SUBSCRIPTIONS_PAGE_SIZE]
+                ),
+                "date_added-min": since,
+                "event_type-in": ",".join(MOD_EVENT_TYPES),
+            },
+            cached=False,
+        )
+        for event in mod_events:
+            if event["event_type"] == "MODFILE_CHANGED":
+                refresh.add(event["mod_id"])
+            else:
+                removed.add(event["mod_id"])
+
+    refresh -= removed
+    for mod_id in removed:
+        known.pop(mod_id, None)
+
+    with ThreadPoolExecutor(max_workers=SUBSCRIPTIONS_PAGE_WORKERS) as executor:
+        mods = executor.map(lambda mod_id: _get_mod(oauth_token, mod_id), refresh)
+        for mod in mods:
+            # Mods without a live modfile can't be downloaded
+            if mod.get("modfile"):
+                known[mod["id"]] = mod
+            else:
+                known.pop(mod["id"], None)
+
+    return list(known.values()), len(refresh) + len(removed)
+
+
+def sync_subscriptions(config, force_full=False):
+    """
+    Retrieves the subscribed mods, only asking mod.io for what changed when
+    possible.
+
+    The time of the last sync is kept in the config. Subsequent runs read the
+    user and mod event feeds since then and update just the affected mods.
+    A full fetch happens on the first run, when forced, when the incremental
+    update fails, and every `FULL_SYNC_INTERVAL_HOURS` as a safety net. If
+    the full fetch fails too, the subscriptions stored in the config are
+    returned unchanged.
+
+    Parameters
+    ----------
+    config : dict
+        The configuration file as a dictionary.
+    force_full : bool
+        Always fetch the complete subscription list.
+
+    Returns
+    -------
+    list of dict
+        A list of dictionaries containing information about the subscribed mods.
+    """
+    started_at = int(time.time())
+    synced_at = config.get("subscriptions_synced_at")
+    full_synced_at = config.get("subscriptions_full_synced_at") or 0
+    interval = config.get("full_sync_interval_hours", FULL_SYNC_INTERVAL_HOURS)
+    stored = config.get("subscribed_mods") or {}
+
+    can_update = (
+        not force_full
+        and synced_at
+        and started_at - full_synced_at < interval * 60 * 60
+        and isinstance(stored, dict)
+        and all("id" in entry and "name_id" in entry for entry in stored.values())
+    )
+
+    if can_update:
+        try:
+            subscriptions, changed = _get_changed_subscriptions(
+                config, get_oauth_token(), synced_at - EVENTS_CLOCK_SKEW
+            )
+        except Exception as err:
+            print(f"Incremental subscription update failed ({err}), fetching all...")
+        else:
+            print(f"{changed} subscription change(s) since the last run.")
+            config["subscriptions_synced_at"] = started_at
+            save_config(config)
+            return subscriptions
+
+    try:
+        subscriptions = get_subscriptions()
+    except requests.exceptions.RequestException as err:
+        # Going on with a partial list would remove the mods that are missing
+        print(f"Failed to fetch subscriptions ({err}), using the last known ones.")
+        if not isinstance(stored, dict):
+            return []
+        return [
+            _subscription_from_config({"id": None, "name_id": name_id, **entry})
+            for name_id, entry in stored.items()
+        ]
+    if subscriptions:
+        config["subscriptions_synced_at"] = started_at
+        config["subscriptions_full_synced_at"] = started_at
+        save_config(config)
+    return subscriptions
+
+
 def update_subscriptions_config(subscriptions):
     """
     Updates the configuration file with the subscribed mods.
 
+    Entries for mods whose modfile hasn't changed are kept as they are.
+
     Parameters
     ----------
     subscriptions : list of dict
@@ -152,14 +622,24 @@ def update_subscriptions_config(subscriptions):
     """
 
     config = read_config()
+    previous = config.get("subscribed_mods")
+    if not isinstance(previous, dict):
+        previous = {}
     config["subscribed_mods"] = {}
 
     for sub in subscriptions:
-        config["subscribed_mods"][sub["name_id"]] = {
+        entry = {
+            "id": sub["id"],
+            "name_id": sub["name_id"],
             "md5": sub["modfile"]["filehash"]["md5"],
             "file": sub["modfile"]["filename"],
+            "size": sub["modfile"].get("filesize"),
             "download": sub["modfile"]["download"]["binary_url"],
         }
+        existing = previous.get(sub["name_id"])
+        if existing and all(existing.get(key) == entry[key] for key in entry):
+            entry = existing
+        config["subscribed_mods"][sub["name_id"]] = entry
 
     save_config(config)
 
@@ -1,106 +1,393 @@
 import os
-from urllib.parse import unquote, urljoin
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import quote, unquote, urljoin
 
-import requests
-from bs4 import BeautifulSoup
-from tqdm import tqdm
+from helpers import transfer
+from helpers.bandwidth import PRIORITY_REQUIRED, download_order
+from helpers.cache import (
+    cache_key,
+    cache_lock,
+    file_signature,
+    get_connection,
+    register_table,
+)
+from helpers.downloader import download_all
+from helpers.hashing import get_md5
+from helpers.http_cache import cached_get
+from helpers.http_client import get_session
+from helpers.store import add_to_store, restore_from_store
+from helpers.trace import span
 
+LISTING_WORKERS = 8
+DOWNLOAD_WORKERS = 4
 
-def download_file(url, save_path):
+# Each row remembers what the listing said about a mod pack file when it was
+# downloaded, and the local stat data it had afterwards
+register_table(
     """
-    Downloads a file from a given URL and saves it to a local path with a progress bar.
+    CREATE TABLE IF NOT EXISTS pack_files (
+        path TEXT PRIMARY KEY,
+        remote_size INTEGER,
+        remote_modified TEXT,
+        local_size INTEGER NOT NULL,
+        local_mtime_ns INTEGER NOT NULL,
+        local_inode INTEGER NOT NULL
+    )
+    """,
+)
+
+
+def _record_state(local_file_path, remote):
+    signature = file_signature(local_file_path)
+    if signature is None:
+        return
+    with cache_lock():
+        connection = get_connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO pack_files VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                cache_key(local_file_path),
+                remote["size"],
+                remote["modified"],
+                *signature,
+            ),
+        )
+        connection.commit()
+
+
+def _forget_state(local_file_path):
+    with cache_lock():
+        connection = get_connection()
+        connection.execute(
+            "DELETE FROM pack_files WHERE path = ?", (cache_key(local_file_path),)
+        )
+        connection.commit()
+
+
+def download_file(
+    url,
+    save_path,
+    position=None,
+    expected_md5=None,
+    priority=PRIORITY_REQUIRED,
+    size=None,
+):
     """
-    if not os.path.exists(save_path):  # Skip if file already exists
-        with requests.get(url, stream=True) as response:
-            response.raise_for_status()
-
-            # Get the total file size (in bytes) from headers
-            total_size = int(response.headers.get("content-length", 0))
-
-            # Open the file and start downloading with a progress bar
-            with open(save_path, "wb") as file, tqdm(
-                desc=f"Downloading {os.path.basename(save_path)}",
-                total=total_size,
-                unit="B",
-                unit_scale=True,
-                unit_divisor=1024,
-                initial=0,
-                miniters=1,
-            ) as progress_bar:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:  # Filter out keep-alive new chunks
-                        file.write(chunk)
-                        progress_bar.update(len(chunk))  # Update progress bar
-
-
-def download_folder(url, local_path):
+    Downloads a file from a given URL and saves it to a local path with a progress bar.
     """
-    Downloads an entire folder recursively from an NGINX directory listing.
+    os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+    transfer.download_file(
+        url,
+        save_path,
+        desc=f"Downloading {os.path.basename(save_path)}",
+        position=position,
+        leave=position is None,
+        expected_md5=expected_md5,
+        priority=priority,
+        size=size,
+    )
+
+
+def _parse_size(text):
+    # Only exact byte counts are usable, "1.2 MiB" style sizes are too coarse
+    text = text.strip()
+    return int(text) if text.isdigit() else None
+
+
+def _fetch_listing(url):
     """
-    # Ensure local path exists
-    if not os.path.exists(local_path):
-        os.makedirs(local_path)
+    Fetch one NGINX directory listing.
 
-    # Fetch the content of the directory
-    response = requests.get(url)
-    response.raise_for_status()
+    Returns
+    -------
+    tuple
+        A list of `(name, href, size, modified)` for the files and a list of
+        `(name, href)` for the folders, where name is URL-decoded.
+    """
+    from bs4 import BeautifulSoup
 
-    # Parse the HTML content of the directory
+    with span("fetch listing", "modpack", url=url) as details:
+        response = cached_get(url)
+        response.raise_for_status()
+        details["bytes"] = len(response.content)
     soup = BeautifulSoup(response.text, "html.parser")
 
-    # Find all links in the directory listing
+    files = []
+    folders = []
     for link in soup.select("tbody a"):
         href = link.get("href")
+        if not href or href in ["../"]:  # Skip parent directory
+            continue
+
+        decoded_href = unquote(href)
+        if decoded_href.startswith("/") or ".." in decoded_href.split("/"):
+            continue  # Never follow links out of the folder
 
-        if href and href not in ["../"]:  # Skip parent directory
-            # Decode URL-encoded characters
-            decoded_href = unquote(href)
+        if href.endswith("/"):
+            folders.append((decoded_href, href))
+            continue
 
-            full_url = urljoin(url, href)
-            local_file_path = os.path.join(local_path, decoded_href)
+        size = modified = None
+        row = link.find_parent("tr")
+        if row is not None:
+            cells = row.find_all("td")
+            size_cell = row.find("td", class_="size") or (
+                cells[1] if len(cells) > 1 else None
+            )
+            date_cell = row.find("td", class_="date") or (
+                cells[2] if len(cells) > 2 else None
+            )
+            if size_cell is not None:
+                size = _parse_size(size_cell.get_text())
+            if date_cell is not None:
+                modified = date_cell.get_text().strip() or None
+        files.append((decoded_href, href, size, modified))
 
-            if href.endswith("/"):
-                # Recursively download the folder
-                download_folder(full_url, local_file_path)
-            else:
-                # Download the file
-                download_file(full_url, local_file_path)
+    return files, folders
 
 
-def list_folder(url, sub_folder):
+def list_remote_tree(url, workers=LISTING_WORKERS):
     """
-    Lists all files and folders in an NGINX directory listing, including subfolders.
+    List every file below an NGINX directory listing, fetching subfolders
+    concurrently.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the folder.
+    workers : int
+        The maximum number of listings fetched at once.
+
+    Returns
+    -------
+    dict
+        Relative path (using "/") -> `{"url", "size", "modified"}`, where size
+        is None unless the listing shows exact byte counts.
     """
+    base_url = url if url.endswith("/") else url + "/"
+    tree = {}
 
-    def fetch_files_and_folders(url):
-        response = requests.get(url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.text, "html.parser")
-        files = []
-        folders = []
-        for link in soup.select("tbody a"):
-            href = link.get("href")
-            if href and href not in ["../"]:  # Skip parent directory
-                decoded_href = unquote(href)
-                if href.endswith("/"):
-                    folders.append(decoded_href)
-                else:
-                    files.append(decoded_href)
-        return files, folders
-
-    def list_all_files(url, base_url, sub_folder):
-        all_files = []
-        files, folders = fetch_files_and_folders(url)
+    with span("crawl", "modpack", url=url):
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {executor.submit(_fetch_listing, base_url): ("", base_url)}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    prefix, folder_url = pending.pop(future)
+                    files, folders = future.result()
+                    for name, href, size, modified in files:
+                        tree[prefix + name] = {
+                            "url": urljoin(folder_url, href),
+                            "size": size,
+                            "modified": modified,
+                        }
+                    for name, href in folders:
+                        subfolder_url = urljoin(folder_url, href)
+                        pending[executor.submit(_fetch_listing, subfolder_url)] = (
+                            prefix + name,
+                            subfolder_url,
+                        )
+
+    return tree
+
+
+def manifest_tree(mod_pack_url, manifest_files, folder):
+    """
+    Build the remote tree of a mod pack folder from the `files` list of a
+    rmd.pack manifest, without crawling any directory listings.
+
+    Parameters
+    ----------
+    mod_pack_url : str
+        The URL of the mod pack.
+    manifest_files : list of dict
+        The manifest entries, each with a `path` relative to the pack root
+        (e.g. "mods/_manual/foo.pak") and optionally `size` and `md5`.
+    folder : str
+        The folder below "mods/" to build the tree for, e.g. "_manual".
+
+    Returns
+    -------
+    dict
+        The same structure as `list_remote_tree`, plus the `md5` of each file.
+    """
+    base_url = mod_pack_url.rstrip("/") + "/"
+    prefix = f"mods/{folder}/"
+    tree = {}
+    for entry in manifest_files:
+        path = entry["path"].replace("\\", "/").lstrip("/")
+        if not path.startswith(prefix) or ".." in path.split("/"):
+            continue
+        tree[path[len(prefix) :]] = {
+            "url": urljoin(base_url, quote(path)),
+            "size": entry.get("size"),
+            "modified": None,
+            "md5": entry.get("md5"),
+        }
+    return tree
+
+
+def _needs_download(local_file_path, remote):
+    """
+    Decide whether a local file is missing or differs from the server's copy.
+    """
+    signature = file_signature(local_file_path)
+    if signature is None:
+        return True
+
+    local_size = signature[0]
+    if remote["size"] is not None and remote["size"] != local_size:
+        return True
+
+    # Manifest entries carry a hash, which is the definitive check
+    if remote.get("md5"):
+        return get_md5(local_file_path) != remote["md5"].lower()
+
+    with cache_lock():
+        row = (
+            get_connection()
+            .execute(
+                "SELECT remote_size, remote_modified, local_size, local_mtime_ns,"
+                " local_inode FROM pack_files WHERE path = ?",
+                (cache_key(local_file_path),),
+            )
+            .fetchone()
+        )
+    if row:
+        # Unchanged on the server since we downloaded it, and untouched locally
+        return tuple(row[:2]) != (remote["size"], remote["modified"]) or tuple(
+            row[2:]
+        ) != tuple(signature)
+
+    # No sync state yet (e.g. downloaded by an older version), fall back to size
+    remote_size = remote["size"]
+    if remote_size is None:
+        try:
+            response = get_session().head(remote["url"], allow_redirects=True)
+        except Exception:
+            return True
+        if response.ok and response.headers.get("content-length", "").isdigit():
+            remote_size = int(response.headers["content-length"])
+    if remote_size != local_size:
+        return True
+
+    _record_state(local_file_path, remote)
+    return False
+
+
+def sync_folder(
+    url,
+    local_path,
+    remote_files=None,
+    on_delete=None,
+    workers=DOWNLOAD_WORKERS,
+    priority=None,
+):
+    """
+    Make a local folder match a mod pack folder.
+
+    New and changed files are downloaded in parallel, or linked from the store
+    when their hash is known and the content is already there. Unchanged files
+    are left alone and local files that are no longer on the server are
+    deleted.
+
+    Parameters
+    ----------
+    url : str
+        The URL of the remote folder.
+    local_path : str
+        The local folder to update.
+    remote_files : dict, optional
+        The remote tree as returned by `list_remote_tree` or `manifest_tree`,
+        crawled from the directory listings if not given.
+    on_delete : callable, optional
+        Called as `on_delete(relative_path, local_file_path)` before a local
+        file that is gone from the server is deleted.
+    workers : int
+        The maximum number of files downloaded at once.
+    priority : callable, optional
+        Called as `priority(relative_path)` to get the file's download
+        priority, `PRIORITY_REQUIRED` if not given. Files are downloaded by
+        priority, then smallest first.
+
+    Returns
+    -------
+    dict
+        Lists of the relative paths that were `downloaded`, `deleted`,
+        `unchanged` and `failed`.
+    """
+    os.makedirs(local_path, exist_ok=True)
+    if remote_files is None:
+        remote_files = list_remote_tree(url)
+
+    def local_file(relative_path):
+        return os.path.join(local_path, *relative_path.split("/"))
+
+    with ThreadPoolExecutor(max_workers=LISTING_WORKERS) as executor:
+        changed = list(
+            executor.map(
+                lambda item: _needs_download(local_file(item[0]), item[1]),
+                remote_files.items(),
+            )
+        )
+    to_download = [
+        relative_path for relative_path, needed in zip(remote_files, changed) if needed
+    ]
+
+    def priority_of(relative_path):
+        return priority(relative_path) if priority else PRIORITY_REQUIRED
+
+    def fetch(relative_path, position):
+        remote = remote_files[relative_path]
+        # Content we already have under another name doesn't need downloading
+        if not restore_from_store(remote.get("md5"), local_file(relative_path)):
+            download_file(
+                remote["url"],
+                local_file(relative_path),
+                position=position,
+                expected_md5=remote.get("md5"),
+                priority=priority_of(relative_path),
+                size=remote["size"],
+            )
+            add_to_store(local_file(relative_path), remote.get("md5"))
+        _record_state(local_file(relative_path), remote)
+
+    results = download_all(
+        to_download,
+        fetch,
+        workers=workers,
+        desc="  Mod pack",
+        unit="file",
+        order=lambda relative_path: download_order(
+            priority_of(relative_path), remote_files[relative_path]["size"]
+        ),
+    )
+
+    deleted = []
+    for root, _, files in os.walk(local_path):
         for file in files:
-            relative_file = os.path.normpath(
-                "mods/" + sub_folder + "/" + url.replace(base_url, "") + file
-            ).replace("\\", "/")
-            all_files.append(relative_file)
-        for folder in folders:
-            folder_url = url + folder
-            all_files.extend(list_all_files(folder_url, base_url, sub_folder))
-        return all_files
+            if ".gitkeep" in file or file.endswith(".part"):
+                continue
 
-    base_url = url if url.endswith("/") else url + "/"
-    all_files = list_all_files(base_url, base_url, sub_folder)
-    return all_files
+            file_path = os.path.join(root, file)
+            relative_path = os.path.relpath(file_path, local_path).replace("\\", "/")
+            if relative_path in remote_files:
+                continue
+
+            if on_delete:
+                on_delete(relative_path, file_path)
+            os.remove(file_path)
+            _forget_state(file_path)
+            deleted.append(relative_path)
+
+    # Drop folders left empty by deletions, e.g. a removed collection
+    for root, dirs, files in os.walk(local_path, topdown=False):
+        if root != local_path and not os.listdir(root):
+            os.rmdir(root)
+
+    return {
+        "downloaded": [p for p, r in results.items() if r["ok"]],
+        "failed": [p for p, r in results.items() if not r["ok"]],
+        "deleted": deleted,
+        "unchanged": [p for p in remote_files if p not in results],
+    }
@@ -0,0 +1,92 @@
+import queue
+import threading
+
+# How many finished items may wait in front of a stage before producers block
+DEFAULT_QUEUE_SIZE = 4
+
+_DONE = object()
+
+
+class Pipeline:
+    """
+    Hand items through a chain of stages as soon as each one is ready.
+
+    Every stage runs in its own worker threads and is connected to the next by
+    a bounded queue, so a slow stage holds back the ones before it instead of
+    letting work pile up, and the total time approaches that of the slowest
+    stage rather than the sum of all of them.
+
+    Parameters
+    ----------
+    stages : list of tuple
+        `(name, fn, workers)` for each stage in order. `fn(item)` returns the
+        item passed to the next stage, or None to drop it. Errors are reported
+        with the item that was put into the pipeline, whichever stage failed.
+    queue_size : int
+        The capacity of the queue in front of each stage.
+    """
+
+    def __init__(self, stages, queue_size=DEFAULT_QUEUE_SIZE):
+        self.errors = []
+        self._errors_lock = threading.Lock()
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+        self._threads = []
+        for index, (name, fn, workers) in enumerate(stages):
+            stage_threads = [
+                threading.Thread(
+                    target=self._run_stage,
+                    args=(name, fn, index),
+                    name=f"pipeline-{name}-{n}",
+                    daemon=True,
+                )
+                for n in range(max(1, workers))
+            ]
+            self._threads.append(stage_threads)
+            for thread in stage_threads:
+                thread.start()
+
+    def _run_stage(self, name, fn, index):
+        source = self._queues[index]
+        target = self._queues[index + 1] if index + 1 < len(self._queues) else None
+        while True:
+            entry = source.get()
+            if entry is _DONE:
+                return
+            original, item = entry
+            try:
+                result = fn(item)
+            except Exception as err:
+                with self._errors_lock:
+                    self.errors.append((original, name, str(err)))
+                continue
+            if result is not None and target is not None:
+                target.put((original, result))
+
+    def put(self, item):
+        """
+        Feed an item to the first stage, blocking while its queue is full.
+        """
+        self._queues[0].put((item, item))
+
+    def close(self):
+        """
+        Wait for every item to pass through all stages and stop the workers.
+
+        Returns
+        -------
+        list of tuple
+            `(item, stage name, error)` for every item a stage failed on, with
+            the item as it was passed to `put`.
+        """
+        for stage_queue, stage_threads in zip(self._queues, self._threads):
+            for _ in stage_threads:
+                stage_queue.put(_DONE)
+            for thread in stage_threads:
+                thread.join()
+        return self.errors
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
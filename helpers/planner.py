@@ -0,0 +1,159 @@
+import os
+import shutil
+from collections import namedtuple
+
+from helpers.cache import cache_key
+from helpers.extract import install_targets, is_target_installed
+from helpers.fastcopy import fast_copy
+from helpers.hashing import get_crc
+from helpers.ledger import forget_install
+from helpers.print_colored import GREEN, RED, YELLOW, print_colored
+
+ADD = "add"
+REPLACE = "replace"
+DELETE = "delete"
+SKIP = "skip"
+
+# Original game files replaced by an override are kept next to them
+BACKUP_SUFFIX = ".ron_mods_backup"
+
+_OperationBase = namedtuple(
+    "Operation", ["action", "path", "source_path", "entry", "override"]
+)
+
+
+class Operation(_OperationBase):
+    """
+    One step needed to bring the game folders to the desired state.
+
+    `action` is one of ADD, REPLACE, DELETE or SKIP, `path` is the file in the
+    game folders, `source_path` the local mod file it comes from and `entry`
+    the archive entry (None for loose files). `override` is True for game
+    files replaced from _overrides.
+    """
+
+    __slots__ = ()
+
+
+def plan_operations(targets, overrides=None, removable=()):
+    """
+    Diff the desired state of the game folders against what is on disk.
+
+    Parameters
+    ----------
+    targets : dict
+        The mod files that should be installed, as returned by `plan_install`.
+    overrides : dict, optional
+        Game file path -> local _overrides file that should replace it.
+    removable : iterable of str
+        Installed files that may be deleted when nothing provides them anymore.
+
+    Returns
+    -------
+    list of Operation
+        Deletions first, then the files to install in plan order.
+    """
+    operations = []
+
+    desired = {cache_key(dst) for dst in targets}
+    for path in sorted({cache_key(path) for path in removable} - desired):
+        if os.path.exists(path):
+            operations.append(Operation(DELETE, path, None, None, False))
+
+    for dst, (source_path, entry) in targets.items():
+        if is_target_installed(dst, source_path, entry):
+            action = SKIP
+        elif os.path.exists(dst):
+            action = REPLACE
+        else:
+            action = ADD
+        operations.append(Operation(action, dst, source_path, entry, False))
+
+    for dst, source_path in (overrides or {}).items():
+        if not os.path.exists(dst):
+            action = ADD
+        elif get_crc(source_path) == get_crc(dst):
+            action = SKIP
+        else:
+            action = REPLACE
+        operations.append(Operation(action, dst, source_path, None, True))
+
+    return operations
+
+
+def print_plan(operations, game_path):
+    """
+    Print the operations of a plan, without applying them.
+
+    Parameters
+    ----------
+    operations : list of Operation
+        The plan returned by `plan_operations`.
+    game_path : str
+        The game folder, overrides are shown relative to it.
+    """
+    symbols = {ADD: ("+", GREEN), REPLACE: ("~", YELLOW), DELETE: ("-", RED)}
+    skipped = 0
+    for operation in operations:
+        if operation.action == SKIP:
+            skipped += 1
+            continue
+
+        symbol, color = symbols[operation.action]
+        if operation.override:
+            name = os.path.relpath(operation.path, start=game_path)
+        else:
+            name = os.path.basename(operation.path)
+        if operation.source_path:
+            name += f" (from {os.path.basename(operation.source_path)})"
+        print_colored(f"  {symbol} {name}", color)
+
+    changes = len(operations) - skipped
+    print(f"  {changes} change(s), {skipped} file(s) already up to date")
+
+
+def apply_plan(operations, workers):
+    """
+    Run the operations of a plan that change something.
+
+    Parameters
+    ----------
+    operations : list of Operation
+        The plan returned by `plan_operations`.
+    workers : int
+        The maximum number of archives extracted at once.
+
+    Returns
+    -------
+    dict
+        The number of files for each action.
+    """
+    counts = {ADD: 0, REPLACE: 0, DELETE: 0, SKIP: 0}
+    targets = {}
+    for operation in operations:
+        counts[operation.action] += 1
+        if operation.action == DELETE:
+            print(f"  Removing {os.path.basename(operation.path)}")
+            os.remove(operation.path)
+            forget_install(operation.path)
+        elif operation.action != SKIP and not operation.override:
+            targets[operation.path] = (operation.source_path, operation.entry)
+
+    if targets:
+        install_targets(targets, workers=workers)
+
+    for operation in operations:
+        if not operation.override or operation.action == SKIP:
+            continue
+
+        dst = operation.path
+        # Back up the original game file, unless it's already backed up
+        if os.path.exists(dst) and not os.path.exists(dst + BACKUP_SUFFIX):
+            print(f"  Backing up {os.path.basename(dst)}")
+            shutil.move(dst, dst + BACKUP_SUFFIX)
+        print(f"  Replacing {os.path.basename(dst)}")
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        # Never hardlink, game updates could write through the link
+        fast_copy(operation.source_path, dst, allow_hardlink=False)
+
+    return counts
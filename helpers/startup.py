@@ -0,0 +1,130 @@
+import importlib.abc
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# --startup-profile fails when getting to the menu's prerequisites takes longer
+STARTUP_BUDGET_SECONDS = 0.5
+
+_started = time.perf_counter()
+_lock = threading.Lock()
+# Module name -> [inclusive seconds, seconds spent importing other modules]
+_imports = {}
+_phases = []
+_stack = threading.local()
+
+
+class _TimedLoader(importlib.abc.Loader):
+    """
+    Wraps a module's loader to time how long executing the module takes.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        parents = getattr(_stack, "names", None)
+        if parents is None:
+            parents = _stack.names = []
+        parents.append(module.__name__)
+        start = time.perf_counter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            elapsed = time.perf_counter() - start
+            parents.pop()
+            with _lock:
+                _imports.setdefault(module.__name__, [0.0, 0.0])[0] += elapsed
+                if parents:
+                    _imports.setdefault(parents[-1], [0.0, 0.0])[1] += elapsed
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    """
+    Finds modules with the other finders and hands back timed loaders.
+    """
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader)
+                return spec
+        return None
+
+
+def enable_import_timing():
+    """
+    Start timing every module imported from now on.
+
+    Has to be called before the modules to measure are imported.
+    """
+    if not any(isinstance(finder, _TimingFinder) for finder in sys.meta_path):
+        sys.meta_path.insert(0, _TimingFinder())
+
+
+@contextmanager
+def phase(name):
+    """
+    Time a step of the startup.
+
+    Parameters
+    ----------
+    name : str
+        The name shown in the startup profile.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, time.perf_counter() - start))
+
+
+def print_startup_profile(top=15, budget=STARTUP_BUDGET_SECONDS):
+    """
+    Print the slowest imports and the time taken by each startup step.
+
+    Parameters
+    ----------
+    top : int
+        How many modules to list.
+    budget : float
+        The time in seconds the startup should fit in.
+
+    Returns
+    -------
+    bool
+        True if the startup fit in the budget.
+    """
+    total = time.perf_counter() - _started
+    with _lock:
+        # Self time, not counting the modules a module imports itself
+        imports = sorted(
+            (
+                (name, inclusive - nested)
+                for name, (inclusive, nested) in _imports.items()
+            ),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+
+    print(f"Imports ({len(imports)} modules, slowest {min(top, len(imports))}):")
+    for name, seconds in imports[:top]:
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+
+    print("Startup steps:")
+    for name, seconds in _phases:
+        print(f"  {seconds * 1000:8.1f} ms  {name}")
+
+    print(f"Total: {total * 1000:.1f} ms (budget {budget * 1000:.0f} ms)")
+    return total <= budget
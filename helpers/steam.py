@@ -1,5 +1,5 @@
 import os
-import winreg as reg
+
 import vdf
 
 
@@ -13,6 +13,9 @@ def get_steam_install_location():
     string.
 
     """
+    # Windows only, imported here so the rest of the app can be imported anywhere
+    import winreg as reg
+
     steam_key = reg.OpenKey(
         reg.HKEY_LOCAL_MACHINE,
         r"SOFTWARE\Wow6432Node\Valve\Steam",
@@ -0,0 +1,183 @@
+import os
+import threading
+
+from helpers.fastcopy import destination_lock, fast_copy, make_temp_path
+from helpers.hashing import get_md5, record_md5
+
+# Blobs live in mods/_store/<first two hex digits>/<md5>
+STORE_FOLDER = "_store"
+
+_lock = threading.Lock()
+# (source device, destination device) pairs hardlinks failed between. Only
+# hardlinks share data and also show up in st_nlink, which is how unused blobs
+# are found, so nothing is stored there
+_unlinkable = set()
+
+_store_path = os.path.join("mods", STORE_FOLDER)
+
+
+def configure_store(mods_down_path):
+    """
+    Set the mods folder the store lives in.
+
+    Parameters
+    ----------
+    mods_down_path : str
+        The local mods folder.
+    """
+    global _store_path
+    _store_path = os.path.join(mods_down_path, STORE_FOLDER)
+
+
+def get_blob_path(md5):
+    """
+    Get the path of the blob holding the content with the given MD5 hash.
+
+    Parameters
+    ----------
+    md5 : str
+        The MD5 hash of the content.
+
+    Returns
+    -------
+    str
+        The path of the blob, which may not exist.
+    """
+    md5 = md5.lower()
+    return os.path.join(_store_path, md5[:2], md5)
+
+
+def has_blob(md5):
+    """
+    Check if the store holds intact content with the given MD5 hash.
+
+    Parameters
+    ----------
+    md5 : str
+        The MD5 hash of the content.
+
+    Returns
+    -------
+    bool
+        True if the blob exists and its hash matches.
+    """
+    if not md5:
+        return False
+    blob_path = get_blob_path(md5)
+    return os.path.exists(blob_path) and get_md5(blob_path) == md5.lower()
+
+
+def _link(src, dst):
+    """
+    Replace `dst` with a hardlink to `src`.
+
+    Returns
+    -------
+    bool
+        False if the filesystem can't link them, `dst` is left untouched.
+    """
+    devices = (os.stat(src).st_dev, os.stat(os.path.dirname(dst) or ".").st_dev)
+    with _lock:
+        if devices in _unlinkable:
+            return False
+
+    with destination_lock(dst):
+        temp_path = make_temp_path(dst)
+        os.remove(temp_path)
+        try:
+            os.link(src, temp_path)
+        except OSError:
+            with _lock:
+                _unlinkable.add(devices)
+            return False
+        os.replace(temp_path, dst)
+    return True
+
+
+def add_to_store(file_path, md5=None):
+    """
+    Add a file to the store so its content can be reused under another name.
+
+    If the store already holds the same content, the file is replaced with a
+    link to the blob so the content is only on disk once. Nothing is stored or
+    copied on filesystems that can't hardlink, and linking isn't tried there
+    again.
+
+    Parameters
+    ----------
+    file_path : str
+        The file to add.
+    md5 : str, optional
+        The verified MD5 hash of the file, hashed (or read from the cache) if
+        not given.
+
+    Returns
+    -------
+    bool
+        True if the file's content is in the store.
+    """
+    md5 = (md5 or get_md5(file_path)).lower()
+    blob_path = get_blob_path(md5)
+
+    if has_blob(md5):
+        if os.path.samefile(blob_path, file_path):
+            return True
+        if not _link(blob_path, file_path):
+            return False
+        record_md5(file_path, md5)
+        return True
+
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    if not _link(file_path, blob_path):
+        return False
+    record_md5(blob_path, md5)
+    return True
+
+
+def restore_from_store(md5, save_path):
+    """
+    Put the stored content with the given MD5 hash at `save_path`.
+
+    Parameters
+    ----------
+    md5 : str
+        The MD5 hash of the content.
+    save_path : str
+        Where to put the file.
+
+    Returns
+    -------
+    bool
+        True if the content was in the store and has been placed.
+    """
+    if not has_blob(md5):
+        return False
+    os.makedirs(os.path.dirname(save_path) or ".", exist_ok=True)
+    fast_copy(get_blob_path(md5), save_path)
+    record_md5(save_path, md5.lower())
+    return True
+
+
+def prune_store():
+    """
+    Remove blobs that no file in the mods folder links to anymore.
+
+    Returns
+    -------
+    int
+        The number of blobs removed.
+    """
+    removed = 0
+    if not os.path.exists(_store_path):
+        return removed
+
+    for root, _, files in os.walk(_store_path, topdown=False):
+        for file in files:
+            blob_path = os.path.join(root, file)
+            # The store's own name is the only link left
+            if os.stat(blob_path).st_nlink <= 1:
+                os.remove(blob_path)
+                removed += 1
+        if not os.listdir(root):
+            os.rmdir(root)
+    return removed
@@ -0,0 +1,158 @@
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+SUMMARY_TOP = 10
+
+_started = time.perf_counter()
+_lock = threading.Lock()
+_trace_path = None
+_events = []
+_threads = {}
+
+
+def enable_tracing(path):
+    """
+    Record timed spans from now on and write them to `path` at exit.
+
+    The file uses the Chrome trace event format, open it in
+    chrome://tracing or https://ui.perfetto.dev. A summary of the slowest
+    operations is printed at exit as well.
+
+    Parameters
+    ----------
+    path : str
+        The file to write the trace to.
+    """
+    global _trace_path
+    if _trace_path is None:
+        atexit.register(_finish)
+    _trace_path = path
+
+
+@contextmanager
+def span(name, category="run", **args):
+    """
+    Time an operation when tracing is enabled, otherwise do nothing.
+
+    Yields a dictionary of the span's arguments, set `bytes` in it to record
+    how much data the operation handled and its throughput.
+
+    Parameters
+    ----------
+    name : str
+        The name of the operation, e.g. "md5" or "extract".
+    category : str
+        The group the operation belongs to, e.g. "hash" or "install".
+    **args
+        Extra details shown with the span, e.g. the file path.
+    """
+    if _trace_path is None:
+        yield args
+        return
+
+    start = time.perf_counter()
+    try:
+        yield args
+    finally:
+        end = time.perf_counter()
+        if args.get("bytes") and end > start:
+            args["MiB/s"] = round(args["bytes"] / (end - start) / 1024**2, 2)
+        thread = threading.current_thread()
+        with _lock:
+            _threads[thread.ident] = thread.name
+            _events.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    "ts": round((start - _started) * 1e6, 1),
+                    "dur": round((end - start) * 1e6, 1),
+                    "pid": os.getpid(),
+                    "tid": thread.ident,
+                    "args": args,
+                }
+            )
+
+
+def write_trace(path):
+    """
+    Write the recorded spans in the Chrome trace event format.
+
+    Parameters
+    ----------
+    path : str
+        The file to write.
+    """
+    with _lock:
+        events = list(_events)
+        threads = dict(_threads)
+    metadata = [
+        {
+            "name": "thread_name",
+            "ph": "M",
+            "pid": os.getpid(),
+            "tid": ident,
+            "args": {"name": name},
+        }
+        for ident, name in threads.items()
+    ]
+    with open(path, "w") as f:
+        json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+
+
+def print_trace_summary(top=SUMMARY_TOP):
+    """
+    Print the total time of each kind of operation and the slowest ones.
+
+    Parameters
+    ----------
+    top : int
+        How many of the slowest operations to list.
+    """
+    with _lock:
+        events = list(_events)
+
+    totals = {}
+    for event in events:
+        total = totals.setdefault((event["cat"], event["name"]), [0, 0.0, 0])
+        total[0] += 1
+        total[1] += event["dur"]
+        total[2] += event["args"].get("bytes") or 0
+
+    print("Time per operation:")
+    for (category, name), (count, dur, size) in sorted(
+        totals.items(), key=lambda item: item[1][1], reverse=True
+    ):
+        line = f"  {dur / 1000:10.1f} ms  {category}/{name} x{count}"
+        if size:
+            line += f", {_format_size(size)}"
+        print(line)
+
+    print(f"Slowest {min(top, len(events))} operations:")
+    for event in sorted(events, key=lambda e: e["dur"], reverse=True)[:top]:
+        detail = event["args"].get("path") or event["args"].get("url") or ""
+        line = f"  {event['dur'] / 1000:10.1f} ms  {event['cat']}/{event['name']}"
+        if detail:
+            line += f" {os.path.basename(str(detail).rstrip('/')) or detail}"
+        if "MiB/s" in event["args"]:
+            line += f" ({event['args']['MiB/s']} MiB/s)"
+        print(line)
+
+
+def _format_size(size):
+    for unit in ("B", "KiB", "MiB"):
+        if size < 1024:
+            return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GiB"
+
+
+def _finish():
+    write_trace(_trace_path)
+    print("")
+    print_trace_summary()
+    print(f"Trace written to {_trace_path}")
@@ -0,0 +1,269 @@
+import hashlib
+import os
+import re
+import time
+
+import requests
+
+from helpers.bandwidth import PRIORITY_REQUIRED, download_slot, throttle
+from helpers.cache import cache_key, cache_lock, get_connection, register_table
+from helpers.hashing import record_md5
+from helpers.http_client import get_session
+from helpers.trace import span
+
+CHUNK_SIZE = 64 * 1024
+MAX_ATTEMPTS = 5
+
+# Errors that mean the connection dropped, the .part file is kept and resumed
+RESUMABLE_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.Timeout,
+)
+
+
+class IncompleteDownloadError(requests.exceptions.RequestException):
+    """The server closed the response before the whole file was received."""
+
+
+class ChecksumMismatchError(requests.exceptions.RequestException):
+    """The downloaded file does not match the expected MD5 hash."""
+
+
+register_table(
+    """
+    CREATE TABLE IF NOT EXISTS partial_downloads (
+        path TEXT PRIMARY KEY,
+        url TEXT NOT NULL,
+        validator TEXT NOT NULL
+    )
+    """,
+)
+
+
+def _get_validator(response):
+    """
+    Get what identifies the version of the file a response holds, for If-Range.
+    """
+    etag = response.headers.get("etag")
+    # If-Range only accepts strong ETags
+    if etag and not etag.startswith("W/"):
+        return etag
+    return response.headers.get("last-modified")
+
+
+def _record_part(part_path, url, validator):
+    """
+    Remember which version of the file a .part file holds, or forget it.
+    """
+    with cache_lock():
+        connection = get_connection()
+        if validator:
+            connection.execute(
+                "INSERT OR REPLACE INTO partial_downloads VALUES (?, ?, ?)",
+                (cache_key(part_path), url, validator),
+            )
+        else:
+            connection.execute(
+                "DELETE FROM partial_downloads WHERE path = ?", (cache_key(part_path),)
+            )
+        connection.commit()
+
+
+def _part_validator(part_path, url):
+    with cache_lock():
+        row = (
+            get_connection()
+            .execute(
+                "SELECT validator FROM partial_downloads WHERE path = ? AND url = ?",
+                (cache_key(part_path), url),
+            )
+            .fetchone()
+        )
+    return row[0] if row else None
+
+
+def _discard_part(part_path):
+    os.remove(part_path)
+    _record_part(part_path, None, None)
+
+
+def _hash_part(part_path):
+    """
+    Hash the bytes already in a .part file so a resumed download can carry on
+    hashing from where it left off.
+    """
+    md5 = hashlib.md5()
+    with open(part_path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            md5.update(chunk)
+    return md5
+
+
+def _commit(part_path, save_path, md5, expected_md5):
+    """
+    Verify a finished .part file and move it into place.
+
+    The verified hash is recorded in the hash cache so the file is never
+    re-read just to check it on the next run.
+    """
+    digest = md5.hexdigest()
+    if expected_md5 and digest.lower() != expected_md5.lower():
+        _discard_part(part_path)
+        raise ChecksumMismatchError(
+            f"MD5 mismatch for {os.path.basename(save_path)}: "
+            f"expected {expected_md5}, got {digest}"
+        )
+
+    os.replace(part_path, save_path)
+    _record_part(part_path, None, None)
+    record_md5(save_path, digest)
+
+
+def _resume_offset(response, offset):
+    """
+    Work out where the response body starts in the file.
+
+    Returns the requested offset if the server honoured the Range header,
+    otherwise 0 so the transfer restarts from the beginning.
+    """
+    if not offset or response.status_code != 206:
+        return 0
+
+    match = re.match(r"bytes (\d+)-", response.headers.get("content-range", ""))
+    if match and int(match.group(1)) == offset:
+        return offset
+    return 0
+
+
+def download_file(
+    url,
+    save_path,
+    desc=None,
+    position=None,
+    leave=True,
+    expected_md5=None,
+    priority=PRIORITY_REQUIRED,
+    size=None,
+):
+    """
+    Download a file, resuming after dropped connections.
+
+    The file is streamed into `save_path + ".part"` and hashed as it arrives.
+    If the transfer is interrupted it is resumed with a `Range` request, or
+    restarted from zero if the server doesn't support ranges. Resuming sends
+    the ETag or Last-Modified of the first response as `If-Range`, so a file
+    that changed on the server in the meantime is downloaded again from the
+    start. A .part file without either is never resumed. `save_path` is
+    only replaced once the whole file has been received and, if
+    `expected_md5` is given, its hash matches. A mismatch discards the file
+    and retries the download.
+
+    Every download goes through the bandwidth scheduler: it waits for a free
+    slot on the host, by priority, and shares the global rate limit.
+
+    Parameters
+    ----------
+    url : str
+        The URL to download.
+    save_path : str
+        The final path of the file.
+    desc : str, optional
+        The progress bar label, defaults to the file name.
+    position : int, optional
+        The line to draw the progress bar on.
+    leave : bool
+        Whether to keep the progress bar once the download finishes.
+    expected_md5 : str, optional
+        The MD5 hash the finished file must have.
+    priority : int
+        One of the `PRIORITY_*` values from helpers.bandwidth.
+    size : int, optional
+        The expected size in bytes, smaller files are started first.
+
+    Raises
+    ------
+    requests.exceptions.RequestException
+        If the download fails, or keeps dropping or failing verification after
+        `MAX_ATTEMPTS` tries.
+    """
+    with span("download", "download", path=save_path) as details, download_slot(
+        url, priority, size
+    ):
+        _download_file(url, save_path, desc, position, leave, expected_md5)
+        details["bytes"] = os.path.getsize(save_path)
+
+
+def _download_file(url, save_path, desc, position, leave, expected_md5):
+    from tqdm import tqdm
+
+    part_path = save_path + ".part"
+    if desc is None:
+        desc = os.path.basename(save_path)
+
+    last_error = None
+    for attempt in range(MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(min(2**attempt, 10))
+
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        validator = _part_validator(part_path, url) if offset else None
+        if offset and validator is None:
+            # No telling whether the server's file changed since, start over
+            _discard_part(part_path)
+            offset = 0
+        headers = {"Range": f"bytes={offset}-", "If-Range": validator} if offset else {}
+
+        try:
+            with get_session().get(url, stream=True, headers=headers) as response:
+                # The .part file already holds the whole file
+                if offset and response.status_code == 416:
+                    total = response.headers.get("content-range", "").split("/")[-1]
+                    if total.isdigit() and int(total) == offset:
+                        md5 = _hash_part(part_path)
+                        _commit(part_path, save_path, md5, expected_md5)
+                        return
+                    _discard_part(part_path)
+                    last_error = IncompleteDownloadError(
+                        f"Server rejected resuming at byte {offset}"
+                    )
+                    continue
+
+                response.raise_for_status()
+                offset = _resume_offset(response, offset)
+                if not offset:
+                    _record_part(part_path, url, _get_validator(response))
+                total_size = offset + int(response.headers.get("content-length", 0))
+                md5 = _hash_part(part_path) if offset else hashlib.md5()
+
+                with open(part_path, "ab" if offset else "wb") as f, tqdm(
+                    desc=desc,
+                    total=total_size,
+                    initial=offset,
+                    unit="iB",
+                    unit_scale=True,
+                    unit_divisor=1024,
+                    position=position,
+                    leave=leave,
+                ) as bar:
+                    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                        if chunk:  # Filter out keep-alive new chunks
+                            md5.update(chunk)
+                            bar.update(f.write(chunk))
+                            throttle(len(chunk))
+
+            received = os.path.getsize(part_path)
+            if total_size and received < total_size:
+                raise IncompleteDownloadError(
+                    f"Received {received} of {total_size} bytes"
+                )
+
+            _commit(part_path, save_path, md5, expected_md5)
+            return
+        except RESUMABLE_ERRORS + (
+            IncompleteDownloadError,
+            ChecksumMismatchError,
+        ) as err:
+            last_error = err
+
+    raise last_error
@@ -0,0 +1,197 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+from helpers.print_colored import RED, print_colored
+
+# Wait for this long without new events before applying a burst of changes
+DEBOUNCE_SECONDS = 1.0
+POLL_INTERVAL = 2.0
+
+# inotify event masks, see inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _InotifyWatcher:
+    """
+    Report changed paths below a set of folders using Linux inotify.
+    """
+
+    def __init__(self, paths):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        self._libc = libc
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._roots = list(paths)
+        self._folders = {}
+        for path in self._roots:
+            self._add_tree(path)
+
+    def _add_tree(self, path):
+        for root, _, _ in os.walk(path):
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(root), _WATCH_MASK)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"Can't watch {root}")
+            self._folders[wd] = root
+
+    def read(self, timeout):
+        """
+        Wait up to `timeout` seconds for changes.
+
+        Returns
+        -------
+        set of str
+            The changed files and folders.
+        """
+        changed = set()
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return changed
+
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost, treat everything as changed
+                changed.update(self._roots)
+                continue
+            if mask & IN_IGNORED:
+                self._folders.pop(wd, None)
+                continue
+
+            folder = self._folders.get(wd)
+            if folder is None:
+                continue
+            path = os.path.join(folder, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    # Watch new folders too, files may already be in them
+                    self._add_tree(path)
+            elif mask & IN_CREATE:
+                # Still being written, it's reported once it is closed
+                continue
+            changed.add(path)
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class _PollingWatcher:
+    """
+    Report changed files below a set of folders by comparing stat snapshots.
+
+    A file is only reported once its size and mtime stayed the same for a
+    whole interval, so files that are still being written are left alone.
+    """
+
+    def __init__(self, paths, interval=POLL_INTERVAL):
+        self._roots = list(paths)
+        self._interval = interval
+        self._snapshot = self._scan()
+        # The stat data of every file as it was last reported
+        self._settled = dict(self._snapshot)
+
+    def _scan(self):
+        snapshot = {}
+        for path in self._roots:
+            for root, _, files in os.walk(path):
+                for file in files:
+                    file_path = os.path.join(root, file)
+                    try:
+                        st = os.stat(file_path)
+                    except OSError:
+                        continue
+                    snapshot[file_path] = (st.st_size, st.st_mtime_ns)
+        return snapshot
+
+    def read(self, timeout):
+        time.sleep(min(timeout, self._interval))
+        snapshot = self._scan()
+        changed = set()
+        for path in snapshot.keys() | self._settled.keys():
+            stat = snapshot.get(path)
+            if stat == self._settled.get(path):
+                continue
+            if stat is not None and stat != self._snapshot.get(path):
+                continue  # Changed since the last scan, may still be written
+            changed.add(path)
+            if stat is None:
+                del self._settled[path]
+            else:
+                self._settled[path] = stat
+        self._snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def _create_watcher(paths):
+    if sys.platform.startswith("linux"):
+        try:
+            return _InotifyWatcher(paths)
+        except (OSError, AttributeError):
+            pass  # e.g. out of watches, fall back to polling
+    return _PollingWatcher(paths)
+
+
+def watch(paths, on_change, debounce=DEBOUNCE_SECONDS):
+    """
+    Watch folders and report changes in bursts until interrupted.
+
+    inotify is used on Linux, other platforms compare stat snapshots every
+    few seconds. Files are reported once they are completely written. If
+    `on_change` fails, the error is printed and watching goes on.
+
+    Parameters
+    ----------
+    paths : list of str
+        The folders to watch, including their subfolders.
+    on_change : callable
+        Called as `on_change(paths)` with the set of changed files and folders
+        once no new changes arrived for `debounce` seconds.
+    debounce : float
+        How long to wait for a burst of changes to settle.
+    """
+    watcher = _create_watcher(paths)
+    pending = set()
+    try:
+        while True:
+            changed = watcher.read(debounce if pending else POLL_INTERVAL)
+            if changed:
+                pending |= changed
+            elif pending:
+                try:
+                    on_change(pending)
+                except Exception as err:
+                    print_colored(f"Failed to apply changes: {err}", RED)
+                pending = set()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
@@ -0,0 +1,64 @@
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fixtures import generate_fixtures  # noqa: E402
+from benchmarks.servers import start_servers  # noqa: E402
+from helpers import archive_index, cache, config, modio, store  # noqa: E402
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """
+    Run a test in an empty folder with fresh caches, config and .auth file.
+
+    The helpers keep cache.db, config.json and .http_cache relative to the
+    working directory and remember them per process, so that state is reset.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(cache, "_connection", None)
+    monkeypatch.setattr(config, "_config", None)
+    monkeypatch.setattr(config, "_dirty", False)
+    monkeypatch.setattr(archive_index, "_memory", {})
+    monkeypatch.setattr(modio, "_limiter", modio._RateLimiter())
+    monkeypatch.setattr(store, "_unlinkable", set())
+    monkeypatch.setattr(store, "_store_path", os.path.join("mods", store.STORE_FOLDER))
+    with open(".auth", "w") as f:
+        f.write("test-token")
+
+    yield tmp_path
+
+    if cache._connection is not None:
+        cache._connection.close()
+
+
+@pytest.fixture
+def stand_in(workdir, monkeypatch):
+    """
+    Start the benchmark stand-ins for mod.io and a mod pack, with the mod.io
+    client pointed at them.
+
+    Called as `stand_in(mods=3, paks_per_mod=1, pak_size=1024, **kwargs)`,
+    extra arguments go to `start_servers`. Returns the server, its base URL
+    and the generated fixtures.
+    """
+    servers = []
+
+    def start(mods=3, paks_per_mod=1, pak_size=1024, **kwargs):
+        fixtures = generate_fixtures(
+            str(workdir / "fixtures"), mods, paks_per_mod, pak_size
+        )
+        server, base_url = start_servers(fixtures, **kwargs)
+        servers.append(server)
+        monkeypatch.setattr(modio, "MODIO_API_URL", f"{base_url}/v1")
+        return server, base_url, fixtures
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
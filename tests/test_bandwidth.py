@@ -0,0 +1,50 @@
+import threading
+import time
+
+from helpers.bandwidth import (
+    PRIORITY_OPTIONAL,
+    PRIORITY_REQUIRED,
+    PRIORITY_UPDATE,
+    _HostSlots,
+    download_order,
+)
+
+
+def _wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_free_slots_go_to_the_most_urgent_download_first():
+    slots = _HostSlots()
+    slots.set_per_host(1)
+    started = []
+    waiters = {
+        "optional": download_order(PRIORITY_OPTIONAL, 10),
+        "large": download_order(PRIORITY_REQUIRED, 1000),
+        "unknown size": download_order(PRIORITY_REQUIRED),
+        "small": download_order(PRIORITY_REQUIRED, 10),
+        "update": download_order(PRIORITY_UPDATE, 5000),
+    }
+
+    def download(name):
+        with slots.slot("mod.io", waiters[name]):
+            started.append(name)
+
+    threads = []
+    with slots.slot("mod.io", download_order(PRIORITY_REQUIRED, 1)):
+        for name in waiters:
+            threads.append(threading.Thread(target=download, args=(name,)))
+            threads[-1].start()
+        _wait_for(lambda: len(slots._waiting["mod.io"]) == len(waiters))
+
+        # Other hosts have their own slots
+        with slots.slot("pack.example", download_order(PRIORITY_OPTIONAL)):
+            pass
+        assert started == []
+
+    for thread in threads:
+        thread.join(5)
+    assert started == ["update", "small", "large", "unknown size", "optional"]
@@ -0,0 +1,21 @@
+from helpers import cache, hashing, ledger, transfer  # noqa: F401, register tables
+
+
+def _tables():
+    rows = cache.get_connection().execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'"
+    )
+    return {name for (name,) in rows}
+
+
+def test_registered_tables_exist_on_every_new_connection(workdir, monkeypatch):
+    monkeypatch.setattr(cache, "_schema", list(cache._schema))
+    assert {"file_hashes", "installed_files", "partial_downloads"} <= _tables()
+
+    # Registered once a connection is already open
+    cache.register_table("CREATE TABLE IF NOT EXISTS late (id INTEGER PRIMARY KEY)")
+    assert "late" in _tables()
+
+    cache.get_connection().close()
+    monkeypatch.setattr(cache, "_connection", None)
+    assert "late" in _tables()
@@ -0,0 +1,98 @@
+import os
+import sys
+import zipfile
+
+import pytest
+
+import download_mods
+from helpers import config
+from helpers.extract import install_targets, plan_install
+
+
+@pytest.fixture
+def game(workdir, monkeypatch):
+    folders = {
+        "down": str(workdir / "mods"),
+        "mods_dest": str(workdir / "~mods"),
+        "saves": str(workdir / "SaveGames"),
+    }
+    for folder in folders.values():
+        os.makedirs(folder)
+    monkeypatch.setattr(download_mods, "mods_dest_path", folders["mods_dest"])
+    monkeypatch.setattr(download_mods, "savegames_dest_path", folders["saves"])
+
+    mod_path = os.path.join(folders["down"], "map.zip")
+    with zipfile.ZipFile(mod_path, "w") as zf:
+        zf.writestr("Paks/map.pak", b"pak")
+        zf.writestr("SaveGames/untouched.sav", b"sav")
+        zf.writestr("SaveGames/played.sav", b"sav")
+    folders["mod"] = mod_path
+    return folders
+
+
+def _install(game):
+    targets = plan_install(["map.zip"], game["down"], game["mods_dest"], game["saves"])
+    install_targets(targets, workers=1, show_progress=False)
+
+
+def test_removing_a_mod_keeps_played_save_games(game):
+    _install(game)
+    with open(os.path.join(game["saves"], "played.sav"), "wb") as f:
+        f.write(b"progress")
+
+    download_mods.remove_installed_mod(game["mod"])
+
+    assert os.listdir(game["mods_dest"]) == []
+    assert os.listdir(game["saves"]) == ["played.sav"]
+
+
+def test_removing_a_mod_without_the_ledger_keeps_save_games(game):
+    for folder, name in (
+        ("mods_dest", "map.pak"),
+        ("saves", "untouched.sav"),
+        ("saves", "played.sav"),
+    ):
+        with open(os.path.join(game[folder], name), "wb") as f:
+            f.write(b"installed")
+
+    download_mods.remove_installed_mod(game["mod"])
+
+    assert os.listdir(game["mods_dest"]) == []
+    assert sorted(os.listdir(game["saves"])) == ["played.sav", "untouched.sav"]
+
+
+def test_plan_changes_nothing(workdir, monkeypatch, capsys):
+    game_path = workdir / "game"
+    game_path.mkdir()
+    os.makedirs("mods")
+    with zipfile.ZipFile(os.path.join("mods", "gone.zip"), "w") as zf:
+        zf.writestr("Paks/gone.pak", b"pak")
+    # Unsubscribed from on mod.io, and the pack host is unreachable
+    config.save_config(
+        {
+            "mod_pack_url": "http://127.0.0.1:9",
+            "subscribed_mods": {"gone": {"file": "gone.zip", "md5": "old"}},
+        }
+    )
+    config.flush_config()
+    for name in (
+        "args",
+        "config",
+        "game_path",
+        "mods_dest_path",
+        "mods_down_path",
+        "savegames_dest_path",
+    ):
+        monkeypatch.setattr(download_mods, name, None)
+    monkeypatch.setattr(
+        download_mods, "get_game_install_path", lambda app_id: str(game_path)
+    )
+    monkeypatch.setattr(sys, "argv", ["download_mods.py", "--plan"])
+    monkeypatch.setenv("LOCALAPPDATA", str(workdir / "appdata"))
+
+    with pytest.raises(SystemExit):
+        download_mods.main()
+
+    assert "+ gone.pak (from gone.zip)" in capsys.readouterr().out
+    assert os.listdir("mods") == ["gone.zip"]
+    assert not os.listdir(download_mods.mods_dest_path)
@@ -0,0 +1,78 @@
+import os
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from helpers.extract import install_targets, plan_install
+
+
+def test_unfinished_downloads_are_not_planned(workdir):
+    mods_down_path = workdir / "mods"
+    (mods_down_path / "_manual").mkdir(parents=True)
+    for name in (
+        "done.pak",
+        "half.pak.part",
+        "_manual/copying.pak.ron_mods_tmp",
+        ".gitkeep",
+    ):
+        (mods_down_path / name).write_bytes(b"pak")
+
+    targets = plan_install(
+        ["done.pak", "half.pak.part", "_manual/copying.pak.ron_mods_tmp", ".gitkeep"],
+        str(mods_down_path),
+        str(workdir / "~mods"),
+        str(workdir / "SaveGames"),
+    )
+
+    assert list(targets) == [os.path.join(str(workdir / "~mods"), "done.pak")]
+
+
+def test_concurrent_installs_of_the_same_file(workdir):
+    mods_dest_path = str(workdir / "~mods")
+    os.makedirs(mods_dest_path)
+    plans = []
+    for index, compression in enumerate([zipfile.ZIP_DEFLATED, zipfile.ZIP_STORED] * 4):
+        archive = str(workdir / f"mod_{index}.zip")
+        with zipfile.ZipFile(archive, "w", compression) as zf:
+            zf.writestr("Paks/shared.pak", bytes([index]) * 512 * 1024)
+        plans.append(
+            plan_install(
+                [archive], str(workdir), mods_dest_path, str(workdir / "SaveGames")
+            )
+        )
+
+    barrier = threading.Barrier(len(plans))
+
+    def install(targets):
+        barrier.wait()
+        return install_targets(targets, workers=1, show_progress=False)
+
+    with ThreadPoolExecutor(max_workers=len(plans)) as executor:
+        for counts in executor.map(install, plans):
+            assert counts["extracted"] == 1
+
+    assert os.listdir(mods_dest_path) == ["shared.pak"]
+    with open(os.path.join(mods_dest_path, "shared.pak"), "rb") as f:
+        data = f.read()
+    assert len(data) == 512 * 1024 and len(set(data)) == 1
+
+
+def test_corrupt_entries_leave_nothing_behind(workdir):
+    mods_dest_path = str(workdir / "~mods")
+    os.makedirs(mods_dest_path)
+    archive = str(workdir / "broken.zip")
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("Paks/broken.pak", b"pak" * 1024)
+    # Flip the CRC32 in the central directory, reading the entry then fails
+    with open(archive, "r+b") as f:
+        data = f.read()
+        f.seek(data.index(b"PK\x01\x02") + 16)
+        f.write(b"\x00\x00\x00\x00")
+    targets = plan_install([archive], str(workdir), mods_dest_path, str(workdir))
+
+    with pytest.raises(zipfile.BadZipFile):
+        install_targets(targets, workers=1, show_progress=False)
+
+    assert os.listdir(mods_dest_path) == []
@@ -0,0 +1,39 @@
+import json
+import os
+
+from helpers.http_cache import cached_get
+
+
+def test_unchanged_responses_are_served_from_disk(stand_in):
+    server, base_url, fixtures = stand_in()
+    url = f"{base_url}/pack/rmd.pack"
+    pack_path = os.path.join(fixtures["paths"]["pack"], "rmd.pack")
+
+    first = cached_get(url)
+    second = cached_get(url)
+
+    assert first.from_cache is False
+    assert second.from_cache is True
+    assert second.json() == first.json()
+    # Still revalidated, the server answered 304
+    assert len(server.file_requests) == 2
+
+    with open(pack_path) as f:
+        pack = json.load(f)
+    pack["version"] = "9.9.9"
+    with open(pack_path, "w") as f:
+        json.dump(pack, f)
+
+    third = cached_get(url)
+    assert third.from_cache is False
+    assert third.json()["version"] == "9.9.9"
+    assert cached_get(url).from_cache is True
+
+
+def test_api_pages_are_cached_per_token(stand_in):
+    _, base_url, _ = stand_in()
+    url = f"{base_url}/v1/me/subscribed"
+
+    assert cached_get(url, headers={"Authorization": "Bearer a"}).from_cache is False
+    assert cached_get(url, headers={"Authorization": "Bearer a"}).from_cache is True
+    assert cached_get(url, headers={"Authorization": "Bearer b"}).from_cache is False
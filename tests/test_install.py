@@ -0,0 +1,80 @@
+import os
+import zipfile
+
+import pytest
+
+from helpers.install import gather_mods, plan_mods, uninstall_mods
+from helpers.planner import ADD, DELETE, apply_plan
+
+
+@pytest.fixture
+def folders(workdir):
+    folders = {
+        "down": str(workdir / "mods"),
+        "game": str(workdir / "game"),
+        "mods_dest": str(
+            workdir / "game" / "ReadyOrNot" / "Content" / "Paks" / "~mods"
+        ),
+        "saves": str(workdir / "saves"),
+    }
+    for folder in folders.values():
+        os.makedirs(folder, exist_ok=True)
+    collection = os.path.join(folders["down"], "_collections", "Maps")
+    os.makedirs(collection)
+    with zipfile.ZipFile(os.path.join(collection, "map.zip"), "w") as zf:
+        zf.writestr("Paks/map.pak", b"pak")
+        zf.writestr("SaveGames/map.sav", b"sav")
+    return folders
+
+
+def _plan(folders, collections, mod_files=()):
+    return plan_mods(
+        list(mod_files),
+        collections,
+        folders["down"],
+        folders["game"],
+        folders["mods_dest"],
+        folders["saves"],
+    )
+
+
+def test_disabled_collection_keeps_its_save_games(folders):
+    # Installed by a version without the ledger
+    for folder, name in (("mods_dest", "map.pak"), ("saves", "map.sav")):
+        with open(os.path.join(folders[folder], name), "wb") as f:
+            f.write(b"installed")
+
+    operations = _plan(folders, {"Maps": {"enabled": False, "mods": ["map.zip"]}})
+
+    deleted = [op.path for op in operations if op.action == DELETE]
+    assert deleted == [os.path.join(folders["mods_dest"], "map.pak")]
+
+
+def test_uninstall_keeps_save_games(folders):
+    collections = {"Maps": {"enabled": True, "mods": ["map.zip"]}}
+    operations = _plan(folders, collections)
+    assert {op.action for op in operations} == {ADD}
+    apply_plan(operations, workers=1)
+
+    uninstall_mods(folders["mods_dest"], folders["down"], folders["game"])
+
+    assert os.listdir(folders["mods_dest"]) == []
+    assert os.listdir(folders["saves"]) == ["map.sav"]
+
+
+def test_unfinished_downloads_are_not_gathered(folders):
+    manual = os.path.join(folders["down"], "_manual", "Nested")
+    os.makedirs(manual)
+    for path in (
+        os.path.join(folders["down"], "sub.zip"),
+        os.path.join(folders["down"], "next.zip.part"),
+        os.path.join(manual, "manual.pak"),
+        os.path.join(manual, "copying.pak.ron_mods_tmp"),
+    ):
+        with open(path, "wb") as f:
+            f.write(b"mod")
+
+    assert sorted(gather_mods(folders["down"])) == [
+        os.path.join("_manual", "Nested", "manual.pak"),
+        "sub.zip",
+    ]
@@ -0,0 +1,175 @@
+import time
+
+import pytest
+
+from helpers import config, modio
+from helpers.cache import get_connection
+
+
+def _subscribed_requests(server):
+    return [query for path, query in server.api_requests if path == "/me/subscribed"]
+
+
+def test_subscriptions_are_fetched_page_by_page(stand_in, monkeypatch):
+    monkeypatch.setattr(modio, "SUBSCRIPTIONS_PAGE_SIZE", 2)
+    server, _, _ = stand_in(mods=7)
+
+    subscriptions = modio.get_subscriptions()
+
+    assert [sub["id"] for sub in subscriptions] == [1, 2, 3, 4, 5, 6, 7]
+    offsets = sorted(int(query["_offset"][0]) for query in _subscribed_requests(server))
+    assert offsets == [0, 2, 4, 6]
+
+
+def test_single_page_needs_a_single_request(stand_in):
+    server, _, _ = stand_in(mods=3)
+
+    subscriptions = modio.get_subscriptions()
+
+    assert len(subscriptions) == 3
+    assert len(_subscribed_requests(server)) == 1
+
+
+def test_page_size_is_taken_from_the_server(stand_in, monkeypatch):
+    # mod.io caps pages at 100 results whatever _limit asks for
+    monkeypatch.setattr(modio, "SUBSCRIPTIONS_PAGE_SIZE", 500)
+    server, _, _ = stand_in(mods=205, pak_size=16)
+
+    subscriptions = modio.get_subscriptions()
+
+    assert len({sub["id"] for sub in subscriptions}) == 205
+    offsets = sorted(int(query["_offset"][0]) for query in _subscribed_requests(server))
+    assert offsets == [0, 100, 200]
+
+
+def _synced_config(server):
+    # A first run: the full fetch, then the subscriptions stored in the config
+    config.save_config({"subscribed_mods": {}})
+    modio.update_subscriptions_config(modio.sync_subscriptions(config.read_config()))
+    server.api_requests.clear()
+    return config.read_config()
+
+
+def _event(event_id, mod_id, event_type, date_added=None):
+    return {
+        "id": event_id,
+        "mod_id": mod_id,
+        "event_type": event_type,
+        "date_added": int(time.time()) if date_added is None else date_added,
+    }
+
+
+def test_sync_applies_subscribes_and_unsubscribes(stand_in):
+    server, _, _ = stand_in(mods=4)
+    server.subscriptions = server.subscriptions[:3]
+    synced = _synced_config(server)
+
+    server.user_events = [
+        _event(1, 4, "USER_SUBSCRIBE"),
+        _event(2, 1, "USER_UNSUBSCRIBE"),
+        # Unsubscribed and subscribed again, the last event wins
+        _event(3, 3, "USER_UNSUBSCRIBE"),
+        _event(4, 3, "USER_SUBSCRIBE"),
+    ]
+    subscriptions = modio.sync_subscriptions(synced)
+
+    assert sorted(sub["id"] for sub in subscriptions) == [2, 3, 4]
+    assert not _subscribed_requests(server)
+
+
+def test_sync_refreshes_mods_with_a_new_modfile(stand_in):
+    server, _, _ = stand_in(mods=3)
+    synced = _synced_config(server)
+
+    new_modfile = {**server.mods[2]["modfile"], "filehash": {"md5": "new"}}
+    server.mods[2] = {**server.mods[2], "modfile": new_modfile}
+    server.mods[3] = {**server.mods[3], "modfile": new_modfile}
+    server.mod_events = [
+        _event(1, 2, "MODFILE_CHANGED"),
+        # Already seen by the previous sync
+        _event(2, 3, "MODFILE_CHANGED", date_added=0),
+    ]
+    subscriptions = modio.sync_subscriptions(synced)
+
+    md5s = {sub["id"]: sub["modfile"]["filehash"]["md5"] for sub in subscriptions}
+    assert md5s[2] == "new"
+    assert md5s[3] == synced["subscribed_mods"]["bench-mod-2"]["md5"]
+    mod_requests = [path for path, _ in server.api_requests if "/mods/" in path]
+    assert mod_requests == ["/games/3791/mods/events", "/games/3791/mods/2"]
+    assert not _subscribed_requests(server)
+
+
+def test_event_feeds_are_not_cached(stand_in):
+    server, _, _ = stand_in(mods=3)
+    synced = _synced_config(server)
+    rows = _http_cache_rows()
+
+    # Every run asks for the events since a different time
+    for _ in range(3):
+        synced["subscriptions_synced_at"] -= 60
+        modio.sync_subscriptions(synced)
+
+    assert len(server.api_requests) == 6
+    assert _http_cache_rows() == rows
+
+
+def _http_cache_rows():
+    return get_connection().execute("SELECT COUNT(*) FROM http_cache").fetchone()[0]
+
+
+def _exhaust_rate_limit(server):
+    # As if other requests had used up the current window
+    with server.rate_lock:
+        server.window_start = time.monotonic()
+        server.window_requests = server.api_rate_limit
+
+
+def test_rate_limited_requests_wait_for_retry_after(stand_in, monkeypatch):
+    monkeypatch.setattr(modio, "RATE_LIMIT_WINDOW", 1)
+    server, _, _ = stand_in(mods=3, api_rate_limit=5, api_rate_window=1)
+    _exhaust_rate_limit(server)
+
+    started = time.monotonic()
+    subscriptions = modio.get_subscriptions()
+
+    assert len(subscriptions) == 3
+    assert server.rate_limited == 1
+    # The 429 said to come back once the window resets, about a second later
+    assert time.monotonic() - started >= 0.5
+
+
+def test_paged_fetch_stays_within_the_rate_limit(stand_in, monkeypatch):
+    monkeypatch.setattr(modio, "RATE_LIMIT_WINDOW", 1)
+    monkeypatch.setattr(modio, "SUBSCRIPTIONS_PAGE_SIZE", 1)
+    server, _, _ = stand_in(mods=8, api_rate_limit=3, api_rate_window=1)
+
+    subscriptions = modio.get_subscriptions()
+
+    assert sorted(sub["id"] for sub in subscriptions) == list(range(1, 9))
+    assert len(_subscribed_requests(server)) >= 8
+
+
+def test_long_retry_after_raises_without_waiting(stand_in):
+    server, _, _ = stand_in(mods=3, api_rate_limit=5, api_rate_window=600)
+    _exhaust_rate_limit(server)
+
+    with pytest.raises(modio.ModioRateLimitError):
+        modio.get_subscriptions()
+    assert len(server.api_requests) == 1
+
+    # Still paused, so the next request fails straight away
+    started = time.monotonic()
+    with pytest.raises(modio.ModioRateLimitError):
+        modio.get_subscriptions()
+    assert time.monotonic() - started < 1
+    assert len(server.api_requests) == 1
+
+
+def test_paused_limiter_fails_subscription_changes(stand_in, capsys):
+    stand_in(mods=3)
+    # As if mod.io had asked to wait far longer than MAX_RETRY_AFTER
+    modio._limiter._resume_at = time.monotonic() + 1000
+
+    assert modio.subscribe_to_mod("bench-mod-1") is False
+    assert modio.unsubscribe_from_mod("bench-mod-1") is False
+    assert "HTTP error occurred" in capsys.readouterr().out
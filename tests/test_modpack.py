@@ -0,0 +1,45 @@
+import os
+
+from helpers.modpack import sync_folder
+
+
+def _sync(base_url, workdir, **kwargs):
+    return sync_folder(
+        f"{base_url}/pack/mods/_manual/",
+        str(workdir / "mods" / "_manual"),
+        workers=2,
+        **kwargs,
+    )
+
+
+def test_only_new_and_changed_files_are_downloaded(stand_in, workdir):
+    server, base_url, fixtures = stand_in(mods=8)
+    remote = os.path.join(fixtures["paths"]["pack"], "mods", "_manual", "Nested Folder")
+
+    first = _sync(base_url, workdir)
+    assert sorted(first["downloaded"]) == [
+        "Nested Folder/manual 0.pak",
+        "Nested Folder/manual 1.pak",
+    ]
+
+    server.file_requests.clear()
+    second = _sync(base_url, workdir)
+    assert second["downloaded"] == [] and len(second["unchanged"]) == 2
+    assert server.file_requests == []
+
+    # One file grows on the server, the other one is removed
+    with open(os.path.join(remote, "manual 0.pak"), "ab") as f:
+        f.write(b"update")
+    os.remove(os.path.join(remote, "manual 1.pak"))
+    deleted = []
+
+    third = _sync(
+        base_url, workdir, on_delete=lambda relative, local: deleted.append(relative)
+    )
+
+    assert third["downloaded"] == ["Nested Folder/manual 0.pak"]
+    assert third["deleted"] == deleted == ["Nested Folder/manual 1.pak"]
+    local = workdir / "mods" / "_manual" / "Nested Folder"
+    assert os.listdir(local) == ["manual 0.pak"]
+    with open(os.path.join(remote, "manual 0.pak"), "rb") as f:
+        assert (local / "manual 0.pak").read_bytes() == f.read()
@@ -0,0 +1,23 @@
+from helpers.pipeline import Pipeline
+
+
+def test_errors_report_the_item_that_was_put():
+    def verify(download):
+        mod_file, md5 = download
+        return {f"~mods/{mod_file}.pak": (mod_file, None)}
+
+    def install(targets):
+        if "broken.zip.pak" in next(iter(targets)):
+            raise OSError("disk full")
+        return len(targets)
+
+    pipeline = Pipeline([("verify", verify, 1), ("install", install, 2)])
+    for mod_file in ("first.zip", "broken.zip", "last.zip"):
+        pipeline.put((mod_file, "md5"))
+
+    errors = pipeline.close()
+
+    # Unpacked like download_mods does
+    assert [(mod_file, stage, error) for (mod_file, _), stage, error in errors] == [
+        ("broken.zip", "install", "disk full")
+    ]
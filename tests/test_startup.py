@@ -0,0 +1,57 @@
+import json
+import os
+import re
+import subprocess
+import sys
+
+from helpers.startup import STARTUP_BUDGET_SECONDS
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed once something is downloaded, installed, logged in to, checked
+# for updates or shown in the collections menu
+LAZY_MODULES = ("tqdm", "selenium", "bs4", "packaging", "curses")
+
+# Runs the real startup up to the first network call, with the Steam lookup
+# pointed at a fake game folder
+STARTUP_SCRIPT = """
+import sys
+
+sys.argv = ["download_mods.py", "--startup-profile"]
+import download_mods
+
+download_mods.get_game_install_path = lambda app_id: {game_path!r}
+try:
+    download_mods.main()
+finally:
+    print("Loaded:", ",".join(m for m in {lazy!r} if m in sys.modules))
+"""
+
+
+def test_startup_fits_the_budget(tmp_path):
+    game_path = tmp_path / "game"
+    game_path.mkdir()
+    (tmp_path / "config.json").write_text(json.dumps({"subscribed_mods": {}}))
+    env = {
+        **os.environ,
+        "PYTHONPATH": REPO_ROOT,
+        "LOCALAPPDATA": str(tmp_path / "appdata"),
+    }
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            STARTUP_SCRIPT.format(game_path=str(game_path), lazy=LAZY_MODULES),
+        ],
+        cwd=tmp_path,
+        env=env,
+        capture_output=True,
+        text=True,
+        timeout=60,
+    )
+
+    assert result.returncode == 0, result.stdout + result.stderr
+    total = re.search(r"Total: ([\d.]+) ms", result.stdout)
+    assert float(total.group(1)) / 1000 <= STARTUP_BUDGET_SECONDS
+    assert "Loaded: \n" in result.stdout
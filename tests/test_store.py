@@ -0,0 +1,56 @@
+import os
+
+from helpers import fastcopy, store
+from helpers.store import add_to_store, get_blob_path, prune_store, restore_from_store
+
+MD5 = "5d41402abc4b2a76b9719d911017c592"  # of b"hello"
+
+
+def _write(path, data=b"hello"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return str(path)
+
+
+def test_same_content_is_on_disk_once(workdir):
+    first = _write(workdir / "mods" / "_pack" / "a.pak")
+    second = _write(workdir / "mods" / "_pack" / "b.pak")
+
+    assert add_to_store(first, MD5)
+    assert add_to_store(second, MD5)
+
+    blob = os.stat(get_blob_path(MD5))
+    assert blob.st_nlink == 3
+    assert os.stat(second).st_ino == blob.st_ino
+    assert prune_store() == 0
+
+    os.remove(first)
+    os.remove(second)
+    assert prune_store() == 1
+    assert not os.path.exists(get_blob_path(MD5))
+
+
+def test_nothing_is_stored_or_copied_without_hardlinks(workdir, monkeypatch):
+    links = []
+
+    def no_link(src, dst):
+        links.append(dst)
+        raise OSError("hardlinks are not supported")
+
+    def no_copy(*args, **kwargs):
+        raise AssertionError("the store must never copy")
+
+    monkeypatch.setattr(os, "link", no_link)
+    monkeypatch.setattr(store, "fast_copy", no_copy)
+    monkeypatch.setattr(fastcopy, "fast_copy", no_copy)
+    first = _write(workdir / "mods" / "_pack" / "a.pak")
+    second = _write(workdir / "mods" / "_pack" / "b.pak")
+
+    assert not add_to_store(first, MD5)
+    assert not add_to_store(second, MD5)
+
+    # Tried once, then remembered for the filesystem
+    assert len(links) == 1
+    assert not os.listdir(os.path.dirname(get_blob_path(MD5)))
+    assert not restore_from_store(MD5, str(workdir / "mods" / "_pack" / "c.pak"))
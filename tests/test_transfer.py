@@ -0,0 +1,75 @@
+import hashlib
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from helpers import transfer
+
+
+@pytest.fixture
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(transfer, "time", SimpleNamespace(sleep=lambda seconds: None))
+
+
+def _served_file(stand_in, **kwargs):
+    server, base_url, fixtures = stand_in(mods=1, pak_size=512 * 1024, **kwargs)
+    path = os.path.join(fixtures["paths"]["files"], "bench_mod_0.zip")
+    return server, f"{base_url}/files/bench_mod_0.zip", path
+
+
+def _md5(path):
+    with open(path, "rb") as f:
+        return hashlib.md5(f.read()).hexdigest()
+
+
+def test_dropped_connections_are_resumed(stand_in, workdir, no_backoff):
+    server, url, served_path = _served_file(stand_in, drop_after=100 * 1024)
+    assert os.path.getsize(served_path) > 2 * server.drop_after
+    save_path = str(workdir / "mod.zip")
+
+    transfer.download_file(url, save_path, expected_md5=_md5(served_path))
+
+    assert _md5(save_path) == _md5(served_path)
+    assert not os.path.exists(save_path + ".part")
+    # Every retry carried on from further into the file
+    ranges = [range_header for range_header, _ in server.file_requests]
+    offsets = [int(header[len("bytes=") : -1]) for header in ranges[1:]]
+    assert ranges[0] == ""
+    assert len(offsets) >= 2
+    assert offsets == sorted(set(offsets)) and offsets[0] > 0
+
+
+def test_stale_part_is_not_resumed_after_the_file_changed(
+    stand_in, workdir, no_backoff, monkeypatch
+):
+    server, url, served_path = _served_file(stand_in, drop_after=100 * 1024)
+    save_path = str(workdir / "mod.zip")
+    monkeypatch.setattr(transfer, "MAX_ATTEMPTS", 1)
+    with pytest.raises(transfer.RESUMABLE_ERRORS + (transfer.IncompleteDownloadError,)):
+        transfer.download_file(url, save_path)
+    assert 0 < os.path.getsize(save_path + ".part") < os.path.getsize(served_path)
+
+    # The mod gets a new release under the same URL
+    with open(served_path, "r+b") as f:
+        f.write(b"new release" * 100)
+    server.drop_after = None
+    monkeypatch.setattr(transfer, "MAX_ATTEMPTS", 5)
+
+    # Without a hash to check against, only If-Range keeps the old bytes out
+    transfer.download_file(url, save_path)
+
+    assert _md5(save_path) == _md5(served_path)
+    assert server.file_requests[-1][1] is not None  # Resumed with If-Range
+
+
+def test_part_without_validator_is_downloaded_again(stand_in, workdir):
+    server, url, served_path = _served_file(stand_in)
+    save_path = str(workdir / "mod.zip")
+    with open(save_path + ".part", "wb") as f:
+        f.write(b"left over by an older version")
+
+    transfer.download_file(url, save_path)
+
+    assert _md5(save_path) == _md5(served_path)
+    assert server.file_requests == [("", None)]
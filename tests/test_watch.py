@@ -0,0 +1,71 @@
+import os
+import sys
+
+import pytest
+
+from helpers import watch as watch_module
+from helpers.watch import _InotifyWatcher, _PollingWatcher, watch
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify")
+def test_inotify_reports_files_once_they_are_closed(workdir):
+    watcher = _InotifyWatcher([str(workdir)])
+    path = str(workdir / "mod.pak")
+    try:
+        with open(path, "wb") as f:
+            f.write(b"half")
+            f.flush()
+            assert watcher.read(0.1) == set()
+            f.write(b" of it")
+        assert watcher.read(0.1) == {path}
+
+        os.replace(path, str(workdir / "renamed.pak"))
+        assert watcher.read(0.1) == {path, str(workdir / "renamed.pak")}
+    finally:
+        watcher.close()
+
+
+def test_polling_waits_for_files_to_settle(workdir):
+    watcher = _PollingWatcher([str(workdir)], interval=0)
+    path = str(workdir / "mod.pak")
+
+    with open(path, "wb") as f:
+        f.write(b"half")
+    assert watcher.read(0) == set()
+    with open(path, "ab") as f:
+        f.write(b" of it")
+    assert watcher.read(0) == set()
+    assert watcher.read(0) == {path}
+    assert watcher.read(0) == set()
+
+    os.remove(path)
+    assert watcher.read(0) == {path}
+
+
+class _ScriptedWatcher:
+    def __init__(self, batches):
+        self._batches = list(batches)
+
+    def read(self, timeout):
+        if not self._batches:
+            raise KeyboardInterrupt
+        return self._batches.pop(0)
+
+    def close(self):
+        pass
+
+
+def test_failing_batches_are_reported_and_watching_goes_on(monkeypatch, capsys):
+    watcher = _ScriptedWatcher([{"a.pak"}, set(), {"b.pak"}, set()])
+    monkeypatch.setattr(watch_module, "_create_watcher", lambda paths: watcher)
+    batches = []
+
+    def on_change(paths):
+        batches.append(paths)
+        if "a.pak" in paths:
+            raise OSError("a.pak is in use")
+
+    watch(["mods"], on_change)
+
+    assert batches == [{"a.pak"}, {"b.pak"}]
+    assert "a.pak is in use" in capsys.readouterr().out